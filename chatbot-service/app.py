@@ -1,12 +1,29 @@
+import asyncio
+import json
+import time
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from utils.schemas import PredictNLRequest, PredictNLResponse, Passenger
 from utils.client import predict_with_backend
-from chains.prediction_chain import extract_passenger_from_message
+from utils.deadline import deadline_middleware
+from utils.render import build_response, response_json
+from utils.log import get_logger, log_fields, request_context_middleware, setup_logging
+from utils.singleflight import SingleFlight, normalize_message
+from utils.names import NameMatch, load_name_index, stated_attributes
+from chains.prediction_chain import (
+    extract_passenger_from_message,
+    extraction_hedge,
+    extraction_stats,
+    parse_extraction,
+    stream_extraction_tokens,
+)
 
 load_dotenv()
+setup_logging("chatbot-service")
+logger = get_logger(__name__)
 
 app = FastAPI(title="Chatbot Service", version="0.1.0")
 
@@ -18,14 +35,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add request logging middleware
-@app.middleware("http")
-async def log_requests(request, call_next):
-    print(f"Request: {request.method} {request.url}")
-    print(f"Headers: {dict(request.headers)}")
-    response = await call_next(request)
-    print(f"Response: {response.status_code}")
-    return response
+# Give every request a deadline (X-Request-Timeout-Ms) that LLM and backend calls respect
+app.middleware("http")(deadline_middleware)
+
+# Assign request IDs and log one structured access line per request
+app.middleware("http")(request_context_middleware)
+
+# Concurrent identical messages share one LLM extraction, and concurrent
+# requests for the same passenger share one backend prediction
+extraction_flight = SingleFlight("extraction")
+prediction_flight = SingleFlight("prediction")
+
+# Real passengers named in a message are answered from the passenger records
+# without calling the LLM, unless the message states details of its own
+_started = time.perf_counter()
+name_index = load_name_index()
+if name_index is None:
+    logger.warning("Passenger records not found; name lookups are disabled")
+else:
+    logger.info("Name index loaded", extra=log_fields(
+        passengers=len(name_index), load_ms=round((time.perf_counter() - _started) * 1000, 1),
+    ))
 
 class Health(BaseModel):
     status: str
@@ -34,58 +64,166 @@ class Health(BaseModel):
 async def health():
     return Health(status="ok")
 
+@app.get("/stats")
+async def stats():
+    """Request coalescing counters, hedged LLM calls, LLM output parsing and tokens, and name lookups"""
+    return {
+        "extraction": extraction_flight.stats(),
+        "llm_hedge": extraction_hedge.stats(),
+        "llm_output": extraction_stats.stats(),
+        "prediction": prediction_flight.stats(),
+        "name_index": name_index.stats() if name_index is not None else None,
+    }
+
 @app.get("/test")
 async def test_endpoint():
-    print("Test endpoint called")
+    logger.debug("Test endpoint called")
     return {"status": "ok", "message": "Chatbot service is running"}
 
-@app.post("/predict-nl", response_model=PredictNLResponse)
-async def predict_nl(req: PredictNLRequest):
-    print(f"Received request: {req}")
-    print(f"Message: {req.message}")
-    print(f"Request type: {type(req)}")
-    try:
-        extraction = await extract_passenger_from_message(req.message)
-        passenger = Passenger(**extraction.passenger.model_dump())
-        backend_result = await predict_with_backend(passenger)
-        # Generate discussion text
-        survived_text = "survived" if int(backend_result["survived"]) else "did not survive"
-        survival_pct = float(backend_result["survival_probability"]) * 100
-        death_pct = float(backend_result["death_probability"]) * 100
-        
-        discussion = f"""Based on your description, I've analyzed the passenger information:
+def passenger_key(passenger: Passenger) -> tuple:
+    return tuple(passenger.model_dump().values())
 
-**Passenger Details:**
-- Name: {passenger.name}
-- Class: {passenger.pclass} ({"First" if passenger.pclass == 1 else "Second" if passenger.pclass == 2 else "Third"} class)
-- Gender: {passenger.sex.title()}
-- Age: {passenger.age if passenger.age else "Unknown"}
-- Fare: £{passenger.fare if passenger.fare else "Unknown"}
-- Embarked: {passenger.embarked} ({"Cherbourg" if passenger.embarked == "C" else "Queenstown" if passenger.embarked == "Q" else "Southampton"})
+def match_passenger(message: str) -> NameMatch | None:
+    if name_index is None:
+        return None
+    stated = stated_attributes(message)
+    if stated:
+        # "What if <passenger> was in first class?" is not about the recorded passenger
+        logger.debug("Message states passenger details, skipping the records", extra=log_fields(stated=stated))
+        return None
+    match = name_index.match(message)
+    if match is not None:
+        logger.debug("Matched passenger record", extra=log_fields(
+            passenger_id=match.record.passenger_id, score=round(match.score, 2), tokens=match.matched,
+        ))
+    return match
 
-**Prediction:**
-This passenger {survived_text} the Titanic disaster.
+def match_reasoning(match: NameMatch) -> str:
+    outcome = "survived" if match.record.survived else "did not survive"
+    return (
+        f"Found {match.record.name} (passenger {match.record.passenger_id}) in the passenger records, "
+        f"so the recorded details were used. According to the records this passenger {outcome}."
+    )
 
-**Confidence:**
-- Survival probability: {survival_pct:.1f}%
-- Death probability: {death_pct:.1f}%
+async def coalesced_prediction(passenger: Passenger) -> dict:
+    """Backend prediction shared by concurrent requests for the same passenger"""
+    return await prediction_flight.do(
+        passenger_key(passenger), lambda: predict_with_backend(passenger)
+    )
 
-**Analysis:**
-{extraction.reasoning}
+@app.post("/predict-nl", response_model=PredictNLResponse)
+async def predict_nl(req: PredictNLRequest, compact: bool = False):
+    """
+    Predict survival for a passenger described in natural language.
 
-The prediction is based on historical data patterns from the Titanic disaster, considering factors like passenger class, age, gender, and fare paid."""
+    With ``compact=true`` the response omits ``discussion``, for machine clients
+    that only need the structured fields.
+    """
+    logger.debug("predict-nl request", extra=log_fields(message=req.message))
+    try:
+        match = match_passenger(req.message)
+        if match is not None:
+            passenger = match.record.passenger
+            backend_result = await coalesced_prediction(passenger)
+            response = build_response(
+                passenger, backend_result, match_reasoning(match), compact,
+                matched_passenger_id=match.record.passenger_id,
+                actual_survived=match.record.survived,
+            )
+            return Response(content=response_json(response, compact), media_type="application/json")
         
-        return PredictNLResponse(
-            passenger=passenger,
-            survived=int(backend_result["survived"]),
-            survival_probability=float(backend_result["survival_probability"]),
-            death_probability=float(backend_result["death_probability"]),
-            reasoning=extraction.reasoning,
-            discussion=discussion,
+        extraction = await extraction_flight.do(
+            normalize_message(req.message),
+            lambda: extract_passenger_from_message(req.message),
         )
+        passenger = extraction.passenger
+        backend_result = await coalesced_prediction(passenger)
+        response = build_response(passenger, backend_result, extraction.reasoning, compact)
+        return Response(content=response_json(response, compact), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
 
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/predict-nl/stream")
+async def predict_nl_stream(req: PredictNLRequest):
+    """
+    Streaming variant of /predict-nl using server-sent events.
+
+    Events are emitted in this order as soon as each piece is ready:
+
+    - **token**: a chunk of raw LLM output (``{"text": ...}``); none are sent
+      when the message names a passenger found in the records
+    - **passenger**: the extracted (or recorded) passenger and the reasoning
+    - **prediction**: the backend prediction
+    - **result**: the full PredictNLResponse, including the discussion
+    - **done**: timings in milliseconds, including ``ttfb_ms`` (time to the first token)
+
+    An **error** event is emitted instead if anything fails along the way,
+    including the LLM stream running past the request's deadline.
+    """
+    async def event_stream():
+        started = time.perf_counter()
+        timings = {}
+
+        def elapsed_ms() -> float:
+            return round((time.perf_counter() - started) * 1000, 1)
+
+        try:
+            match = match_passenger(req.message)
+            record = {}
+            if match is not None:
+                passenger = match.record.passenger
+                reasoning = match_reasoning(match)
+                record = {
+                    "matched_passenger_id": match.record.passenger_id,
+                    "actual_survived": match.record.survived,
+                }
+                timings["lookup_ms"] = elapsed_ms()
+            else:
+                chunks = []
+                async for token in stream_extraction_tokens(req.message):
+                    if not chunks:
+                        timings["ttfb_ms"] = elapsed_ms()
+                    chunks.append(token)
+                    yield sse_event("token", {"text": token})
+                timings["llm_ms"] = elapsed_ms()
+
+                extraction = parse_extraction(req.message, "".join(chunks))
+                passenger = extraction.passenger
+                reasoning = extraction.reasoning
+            yield sse_event("passenger", {
+                "passenger": passenger.model_dump(),
+                "reasoning": reasoning,
+                **record,
+            })
+
+            backend_result = await coalesced_prediction(passenger)
+            timings["prediction_ms"] = elapsed_ms()
+            yield sse_event("prediction", {
+                "survived": int(backend_result["survived"]),
+                "survival_probability": float(backend_result["survival_probability"]),
+                "death_probability": float(backend_result["death_probability"]),
+            })
+
+            response = build_response(passenger, backend_result, reasoning, **record)
+            yield sse_event("result", response.model_dump())
+        except asyncio.TimeoutError as e:
+            # The LLM stream or the backend call ran past the request's deadline
+            yield sse_event("error", {"detail": str(e)})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Prediction failed: {e}"})
+        timings["total_ms"] = elapsed_ms()
+        yield sse_event("done", timings)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8010)
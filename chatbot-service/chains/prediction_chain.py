@@ -1,18 +1,34 @@
-import os
-from dotenv import load_dotenv
+import asyncio
+from typing import AsyncIterator
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
+from utils.deadline import remaining
+from utils.hedge import HedgedCall
+from utils.llm import (
+    LLM_DEADLINE_RESERVE,
+    LLM_EXTRACTION_MODE,
+    LLM_HEDGE,
+    LLM_HEDGE_INITIAL_DELAY,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_PERCENTILE,
+    create_llm,
+)
+from utils.schemas import Passenger
+from utils.log import get_logger, log_fields
 
-load_dotenv()
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+logger = get_logger(__name__)
 
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
+# A second extraction request is sent when the first is slower than usual
+extraction_hedge = HedgedCall(
+    "LLM extraction",
+    percentile=LLM_HEDGE_PERCENTILE,
+    initial_delay=LLM_HEDGE_INITIAL_DELAY,
+    min_delay=LLM_HEDGE_MIN_DELAY,
+)
 
-class ExtractedPassenger(BaseModel):
-    pclass: int = Field(..., description="1, 2, or 3")
+class ExtractedPassenger(Passenger):
+    """Passenger as extracted from a message; validated once, used as-is downstream"""
+    pclass: int = Field(..., ge=1, le=3, description="1, 2, or 3")
     name: str = Field(..., description="Passenger name")
     sex: str = Field(..., description="male or female")
     age: float | None = None
@@ -117,25 +133,165 @@ def apply_manual_extraction_rules(message: str, passenger_data: dict) -> dict:
     
     return result
 
-async def extract_passenger_from_message(message: str) -> ExtractionResult:
-    llm = ChatOpenAI(
-        model=OPENAI_MODEL, 
-        temperature=0.2,
-        api_key=OPENAI_API_KEY
+# Structured mode: the answer is constrained to this schema, so the prompt only
+# states the extraction rules, and the message is sent as it is
+COMPACT_SYSTEM_PROMPT = (
+    "Extract the Titanic passenger in the message (is_relevant=false if none). "
+    "Infer pclass and sex if unstated. 1st/first class=1, 2nd=2, 3rd=3. "
+    "sibsp: siblings+spouses, parch: parents+children aboard. "
+    "Cherbourg=C, Queenstown=Q, else S. Unknown age/fare: null; no name: 'Unknown Passenger'. "
+    "reasoning: one short sentence."
+)
+
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "is_relevant": {"type": "boolean"},
+        "passenger": {
+            "type": "object",
+            "properties": {
+                "pclass": {"type": "integer", "enum": [1, 2, 3]},
+                "name": {"type": "string"},
+                "sex": {"type": "string", "enum": ["male", "female"]},
+                "age": {"type": ["number", "null"]},
+                "sibsp": {"type": "integer"},
+                "parch": {"type": "integer"},
+                "fare": {"type": ["number", "null"]},
+                "embarked": {"type": "string", "enum": ["C", "Q", "S"]},
+            },
+            "required": ["pclass", "name", "sex", "age", "sibsp", "parch", "fare", "embarked"],
+            "additionalProperties": False,
+        },
+        "reasoning": {"type": "string"},
+    },
+    "required": ["is_relevant", "passenger", "reasoning"],
+    "additionalProperties": False,
+}
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "extraction", "strict": True, "schema": EXTRACTION_SCHEMA},
+}
+
+EXTRACTION_MODES = ("structured", "json")
+if LLM_EXTRACTION_MODE not in EXTRACTION_MODES:
+    raise ValueError(
+        f"Unknown LLM_EXTRACTION_MODE '{LLM_EXTRACTION_MODE}', expected one of: {', '.join(EXTRACTION_MODES)}"
     )
-    prompt = [
+extraction_mode = LLM_EXTRACTION_MODE
+
+class ExtractionStats:
+    """Parse failures and token usage of LLM extractions"""
+
+    def __init__(self):
+        self.responses = 0
+        self.parse_failures = 0
+        self.metered = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def record_usage(self, usage: dict | None) -> None:
+        if usage:
+            self.metered += 1
+            self.input_tokens += usage.get("input_tokens", 0)
+            self.output_tokens += usage.get("output_tokens", 0)
+
+    def stats(self) -> dict:
+        return {
+            "mode": extraction_mode,
+            "responses": self.responses,
+            "parse_failures": self.parse_failures,
+            "parse_failure_rate": self.parse_failures / self.responses if self.responses else None,
+            "input_tokens_per_response": self.input_tokens / self.metered if self.metered else None,
+            "output_tokens_per_response": self.output_tokens / self.metered if self.metered else None,
+        }
+
+extraction_stats = ExtractionStats()
+
+def build_prompt(message: str) -> list[dict]:
+    """Build the chat messages sent to the LLM for a user message"""
+    if extraction_mode == "structured":
+        return [
+            {"role": "system", "content": COMPACT_SYSTEM_PROMPT},
+            {"role": "user", "content": message},
+        ]
+    return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": USER_TEMPLATE.format(message=message)},
     ]
-    resp = await llm.ainvoke(prompt)
-    content = resp.content
-    
-    print(f"LLM Response: {content}")
+
+def get_llm() -> ChatOpenAI:
+    llm = create_llm(temperature=0.2)
+    if extraction_mode == "structured":
+        return llm.bind(response_format=RESPONSE_FORMAT)
+    return llm
+
+async def extract_passenger_from_message(message: str) -> ExtractionResult:
+    """Extract the passenger with the LLM, falling back to the manual rules at the request's deadline
+
+    The LLM may use the time left before the deadline, less
+    ``LLM_DEADLINE_RESERVE`` kept for the backend prediction. A slow LLM
+    call is hedged with a second one; the loser is cancelled.
+    """
+    llm = get_llm()
+    prompt = build_prompt(message)
+    timeout = remaining()
+    if timeout is not None:
+        timeout = max(0.0, timeout - LLM_DEADLINE_RESERVE)
+    try:
+        resp = await extraction_hedge.call(lambda: llm.ainvoke(prompt), timeout, hedge=LLM_HEDGE)
+    except asyncio.TimeoutError:
+        logger.warning("LLM extraction timed out", extra=log_fields(timeout_ms=round(timeout * 1000)))
+        fallback_passenger = apply_manual_extraction_rules(message, {})
+        return ExtractionResult(
+            passenger=ExtractedPassenger(**fallback_passenger),
+            reasoning="The language model did not answer in time, using manual extraction."
+        )
+    extraction_stats.record_usage(resp.usage_metadata)
+    return parse_extraction(message, resp.content)
+
+async def stream_extraction_tokens(message: str) -> AsyncIterator[str]:
+    """Yield the raw LLM output for a message chunk by chunk as it is generated.
+
+    The caller accumulates the chunks and hands the full text to
+    ``parse_extraction`` once the stream is exhausted. The whole stream must
+    finish within the request's deadline less ``LLM_DEADLINE_RESERVE``, or
+    ``asyncio.TimeoutError`` is raised. Unlike ``extract_passenger_from_message``
+    the stream is not hedged, as its tokens are already sent to the client.
+    """
+    llm = get_llm()
+    timeout = remaining()
+    deadline = None
+    if timeout is not None:
+        timeout = max(0.0, timeout - LLM_DEADLINE_RESERVE)
+        deadline = asyncio.get_running_loop().time() + timeout
+    stream = llm.astream(build_prompt(message))
+    try:
+        while True:
+            # Only the wait for the next chunk is timed: a timeout spanning the
+            # yield would cancel the caller while it sends the chunk
+            try:
+                async with asyncio.timeout_at(deadline):
+                    chunk = await anext(stream)
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                logger.warning("LLM extraction stream timed out", extra=log_fields(timeout_ms=round(timeout * 1000)))
+                raise asyncio.TimeoutError("The language model did not answer before the request deadline") from None
+            extraction_stats.record_usage(chunk.usage_metadata)
+            if chunk.content:
+                yield chunk.content
+    finally:
+        await stream.aclose()
+
+def parse_extraction(message: str, content: str) -> ExtractionResult:
+    """Turn the raw LLM output for a message into an ExtractionResult"""
+    logger.debug("LLM response", extra=log_fields(content=content))
+    extraction_stats.responses += 1
     
     import json
     try:
         data = json.loads(content)
-        print(f"Parsed JSON: {data}")
         
         # Check if the message is relevant to Titanic passengers
         is_relevant = data.get("is_relevant", True)
@@ -143,11 +299,11 @@ async def extract_passenger_from_message(message: str) -> ExtractionResult:
             raise ValueError("Message is not about a Titanic passenger")
         
         passenger_data = data["passenger"]
-        print(f"Passenger data from LLM: {passenger_data}")
+        logger.debug("Passenger data from LLM", extra=log_fields(passenger=passenger_data))
         
         # Apply manual extraction rules as fallback
         passenger_data = apply_manual_extraction_rules(message, passenger_data)
-        print(f"Passenger data after manual rules: {passenger_data}")
+        logger.debug("Passenger data after manual rules", extra=log_fields(passenger=passenger_data))
         
         # Ensure required fields have defaults
         if not passenger_data.get("name"):
@@ -161,10 +317,11 @@ async def extract_passenger_from_message(message: str) -> ExtractionResult:
         reasoning = data.get("reasoning", "Extracted passenger information from natural language")
         return ExtractionResult(passenger=passenger, reasoning=reasoning)
     except (json.JSONDecodeError, KeyError, ValueError) as e:
-        print(f"LLM parsing error: {e}")
+        logger.warning("LLM parsing error", extra=log_fields(error=str(e)))
         # Check if it's a relevance error
         if "not about a Titanic passenger" in str(e):
             raise ValueError("This message is not about a Titanic passenger. Please ask about a specific passenger on the Titanic.")
+        extraction_stats.parse_failures += 1
         
         # Fallback: create a basic passenger with manual extraction
         fallback_passenger = apply_manual_extraction_rules(message, {})
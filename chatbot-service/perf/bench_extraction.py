@@ -0,0 +1,98 @@
+"""
+Compare the structured and free-form (json) extraction modes on tokens, parse failures and latency.
+
+Replays perf/requests.jsonl in-process against /predict-nl once per
+extraction mode (see ``LLM_EXTRACTION_MODE`` in utils/llm.py). Every
+replayed message is made unique, so request coalescing does not merge them.
+For each mode it reports latency percentiles, input and output tokens per
+LLM response and the share of responses that failed to parse and were
+answered by the manual rules instead.
+
+By default the stub LLM stands in for OpenAI. Its latency grows with the
+prompt and completion tokens, and ``--malformed-rate`` of its free-form
+answers come wrapped in prose and a code fence, as real models' sometimes
+do; schema-constrained answers are always valid. ``--no-stub`` measures the
+configured LLM backend instead (network access and an API key needed).
+
+Usage:
+    python perf/bench_extraction.py --repeat 20
+    LLM_BACKEND=openai python perf/bench_extraction.py --no-stub --repeat 2 --concurrency 2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from replay import PERF_DIR, load_prompts, make_client, run_replay, start_stub, use_stub
+
+MODES = ("json", "structured")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare structured and free-form LLM extraction")
+    parser.add_argument("--prompts", default=os.path.join(PERF_DIR, "requests.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=150, help="Stub latency before the first token")
+    parser.add_argument("--ms-per-prompt-token", type=float, default=0.2)
+    parser.add_argument("--ms-per-completion-token", type=float, default=5)
+    parser.add_argument("--malformed-rate", type=float, default=0.02,
+                        help="Share of the stub's free-form answers that do not parse")
+    parser.add_argument("--no-stub", action="store_true", help="Use the configured LLM backend")
+    parser.add_argument("--stub-port", type=int, default=8020)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    prompts = [f"{prompt} (request {i})" for i in range(args.repeat) for prompt in load_prompts(args.prompts)]
+    stub = None
+    if not args.no_stub:
+        stub = start_stub(args.stub_port, [
+            "--latency-ms", str(args.latency_ms), "--seed", "0",
+            "--ms-per-prompt-token", str(args.ms_per_prompt_token),
+            "--ms-per-completion-token", str(args.ms_per_completion_token),
+            "--malformed-rate", str(args.malformed_rate),
+        ])
+        use_stub(args.stub_port)
+
+    from chains import prediction_chain
+
+    async def run(client):
+        # Warm up connections and lazy imports before measuring
+        await run_replay(client, [f"{p} (warm-up)" for p in prompts[:args.concurrency]], args.concurrency, 1)
+        results = {}
+        for mode in MODES:
+            prediction_chain.extraction_mode = mode
+            prediction_chain.extraction_stats = stats = prediction_chain.ExtractionStats()
+            results[mode] = await run_replay(client, prompts, args.concurrency, 1)
+            results[mode]["llm"] = stats.stats()
+        return results
+
+    async def main_async():
+        async with make_client(None) as client:
+            return await run(client)
+
+    try:
+        results = asyncio.run(main_async())
+    finally:
+        if stub:
+            stub.terminate()
+            stub.wait()
+
+    print(f"{len(prompts)} requests, {args.concurrency} concurrent")
+    print(f"{'mode':<12}{'p50 ms':>8}{'p99 ms':>8}{'rps':>7}{'in tok':>8}{'out tok':>9}{'parse fail':>12}")
+    for mode, result in results.items():
+        llm = result["llm"]
+        print(
+            f"{mode:<12}{result['p50_ms']:>8.0f}{result['p99_ms']:>8.0f}{result['throughput_rps']:>7.1f}"
+            f"{llm['input_tokens_per_response'] or 0:>8.0f}{llm['output_tokens_per_response'] or 0:>9.0f}"
+            f"{llm['parse_failure_rate'] or 0:>12.1%}"
+        )
+    structured, free_form = results["structured"]["llm"], results["json"]["llm"]
+    if structured["parse_failures"] or (structured["input_tokens_per_response"] or 0) >= (free_form["input_tokens_per_response"] or 1):
+        print("FAIL structured extraction did not parse every response with fewer input tokens")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
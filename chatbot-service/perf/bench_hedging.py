@@ -0,0 +1,129 @@
+"""
+Benchmark hedged LLM calls and request deadlines on /predict-nl tail latency.
+
+Replays perf/requests.jsonl in-process against the stub LLM with a long
+tail: every completion takes about ``--latency-ms``, and ``--slow-rate`` of
+them take ``--slow-ms`` longer. Every replayed message is made unique, so
+request coalescing does not hide slow calls. Four configurations are run,
+each after ``--warmup`` requests that let the hedge delay settle:
+
+- ``single``: one LLM call per extraction, no deadline (the old behaviour)
+- ``hedged``: a second call after the hedge delay, the loser cancelled
+- ``deadline``: one call, manual extraction once ``--deadline-ms`` is near
+- ``hedged+deadline``: both
+
+For each it reports latency percentiles, the share of extractions hedged,
+the extractions answered by the manual rules at the deadline, and the LLM
+requests sent per extraction. Exits with code 1 if hedging does not lower
+the p99 latency or a request outlives its deadline by more than 25%.
+
+Usage:
+    python perf/bench_hedging.py --repeat 50 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from replay import PERF_DIR, load_prompts, make_client, run_replay, start_stub, use_stub
+
+MODES = {
+    "single": {"hedge": False, "deadline": False},
+    "hedged": {"hedge": True, "deadline": False},
+    "deadline": {"hedge": False, "deadline": True},
+    "hedged+deadline": {"hedge": True, "deadline": True},
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hedged LLM calls and deadlines")
+    parser.add_argument("--prompts", default=os.path.join(PERF_DIR, "requests.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=3000)
+    parser.add_argument("--deadline-ms", type=float, default=1000)
+    parser.add_argument("--warmup", type=int, default=40, help="Requests per mode before measuring")
+    parser.add_argument("--stub-port", type=int, default=8020)
+    args = parser.parse_args()
+
+    # The stub answers /predict at once; keep little of the deadline back for it
+    os.environ.setdefault("LLM_DEADLINE_RESERVE_MS", "100")
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    prompts = [f"{prompt} (request {i})" for i in range(args.repeat) for prompt in load_prompts(args.prompts)]
+    warmup = [f"{prompt} (warm-up)" for prompt in prompts[:args.warmup]]
+    stub = start_stub(args.stub_port, [
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--slow-rate", str(args.slow_rate), "--slow-ms", str(args.slow_ms), "--seed", "0",
+    ])
+    use_stub(args.stub_port)
+
+    from chains import prediction_chain
+    from utils.deadline import TIMEOUT_HEADER
+    from utils.hedge import HedgedCall
+
+    stub_stats = f"http://127.0.0.1:{args.stub_port}/stats"
+
+    async def run(client):
+        results = {}
+        for mode, options in MODES.items():
+            prediction_chain.LLM_HEDGE = options["hedge"]
+            prediction_chain.extraction_hedge = hedge = HedgedCall(
+                "LLM extraction",
+                percentile=prediction_chain.LLM_HEDGE_PERCENTILE,
+                initial_delay=prediction_chain.LLM_HEDGE_INITIAL_DELAY,
+                min_delay=prediction_chain.LLM_HEDGE_MIN_DELAY,
+            )
+            headers = {TIMEOUT_HEADER: str(args.deadline_ms)} if options["deadline"] else None
+            # Let the hedge delay settle on the observed latencies before measuring
+            await run_replay(client, warmup, args.concurrency, 1, headers=headers)
+            before = hedge.stats()
+            llm_requests = httpx.get(stub_stats).json()["requests"]
+            results[mode] = await run_replay(client, prompts, args.concurrency, 1, headers=headers)
+            results[mode]["hedge"] = {
+                key: value - before[key] for key, value in hedge.stats().items() if key != "hedge_delay_ms"
+            }
+            results[mode]["llm_requests"] = httpx.get(stub_stats).json()["requests"] - llm_requests
+        return results
+
+    async def main_async():
+        async with make_client(None) as client:
+            return await run(client)
+
+    try:
+        results = asyncio.run(main_async())
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(f"{len(prompts)} requests, {args.concurrency} concurrent; LLM {args.latency_ms:g} ms, "
+          f"{args.slow_rate:.0%} of calls {args.slow_ms:g} ms slower; deadline {args.deadline_ms:g} ms")
+    print(f"{'mode':<17}{'p50 ms':>8}{'p90 ms':>8}{'p99 ms':>8}{'max ms':>8}{'errors':>8}"
+          f"{'hedged':>8}{'fallback':>10}{'LLM calls':>11}")
+    for mode, result in results.items():
+        hedge = result["hedge"]
+        calls = max(hedge["calls"], 1)
+        print(
+            f"{mode:<17}{result['p50_ms']:>8.0f}{result['p90_ms']:>8.0f}{result['p99_ms']:>8.0f}"
+            f"{result['max_ms']:>8.0f}{result['errors']:>8}{hedge['hedged'] / calls:>8.1%}"
+            f"{hedge['timeouts']:>10}{result['llm_requests'] / calls:>11.2f}"
+        )
+
+    failed = False
+    if results["hedged"]["p99_ms"] >= results["single"]["p99_ms"]:
+        print("FAIL hedging does not lower the p99 latency")
+        failed = True
+    for mode in ("deadline", "hedged+deadline"):
+        if results[mode]["max_ms"] > args.deadline_ms * 1.25 or results[mode]["errors"]:
+            print(f"FAIL {mode}: requests failed or outlived the deadline")
+            failed = True
+    sys.exit(int(failed))
+
+if __name__ == "__main__":
+    main()
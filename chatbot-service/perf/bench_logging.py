@@ -0,0 +1,82 @@
+"""
+Benchmark the cost of request logging on /predict-nl throughput.
+
+Replays perf/requests.jsonl in-process against the stub LLM (zero latency, so
+the service's own overhead dominates) under several logging configurations:
+
+- ``sync-debug``: every record, written synchronously from the event loop,
+  which matches the old print-everything behaviour
+- ``queue-debug``: every record, written by the background listener
+- ``queue-info``: access lines only (the default configuration)
+- ``queue-sampled``: access lines, 10% sampled
+
+Log output goes to stdout (point it at a terminal or a file to compare), the
+summary table goes to stderr.
+
+Usage:
+    python perf/bench_logging.py --repeat 50 --concurrency 16
+    python perf/bench_logging.py > /dev/null
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from replay import PERF_DIR, load_prompts, make_client, run_replay, start_stub, use_stub
+
+MODES = {
+    "sync-debug": {"level": "DEBUG", "use_queue": False, "sample_rate": 1.0},
+    "queue-debug": {"level": "DEBUG", "use_queue": True, "sample_rate": 1.0},
+    "queue-info": {"level": "INFO", "use_queue": True, "sample_rate": 1.0},
+    "queue-sampled": {"level": "INFO", "use_queue": True, "sample_rate": 0.1},
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chatbot-service logging overhead")
+    parser.add_argument("--prompts", default=os.path.join(PERF_DIR, "requests.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=25)
+    parser.add_argument("--stub-port", type=int, default=8020)
+    args = parser.parse_args()
+
+    prompts = load_prompts(args.prompts)
+    stub = start_stub(args.stub_port, [])
+    use_stub(args.stub_port)
+
+    from utils.log import setup_logging, shutdown_logging
+
+    async def run(client):
+        # Warm up connections and lazy imports before measuring
+        await run_replay(client, prompts, args.concurrency, 1)
+        results = {}
+        for mode, options in MODES.items():
+            setup_logging("chatbot-service", **options)
+            results[mode] = await run_replay(client, prompts, args.concurrency, args.repeat)
+            shutdown_logging()
+        return results
+
+    async def main_async():
+        async with make_client(None) as client:
+            return await run(client)
+
+    try:
+        results = asyncio.run(main_async())
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    baseline = results["sync-debug"]["throughput_rps"]
+    print(f"{'mode':<15}{'rps':>8}{'p50 ms':>9}{'p99 ms':>9}{'vs sync':>9}", file=sys.stderr)
+    for mode, result in results.items():
+        speedup = result["throughput_rps"] / baseline if baseline else 0.0
+        print(
+            f"{mode:<15}{result['throughput_rps']:>8.1f}{result['p50_ms']:>9.1f}"
+            f"{result['p99_ms']:>9.1f}{speedup:>8.2f}x",
+            file=sys.stderr,
+        )
+
+if __name__ == "__main__":
+    main()
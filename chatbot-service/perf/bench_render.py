@@ -0,0 +1,104 @@
+"""
+Benchmark the per-response rendering and serialization cost of /predict-nl.
+
+Compares:
+
+- ``legacy``: the previous path, which re-validated the extracted passenger
+  with ``Passenger(**passenger.model_dump())``, built the discussion with an
+  inline f-string and nested conditionals, validated ``PredictNLResponse``,
+  and let FastAPI dump, re-validate and JSON-encode it via ``response_model``
+- ``compiled``: the compiled template, ``model_construct`` and direct JSON
+- ``compact``: like ``compiled`` but without the discussion
+
+Usage:
+    python perf/bench_render.py --number 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chains.prediction_chain import ExtractedPassenger
+from utils.render import build_response, response_json
+from utils.schemas import Passenger, PredictNLResponse
+
+PASSENGER = ExtractedPassenger(
+    pclass=2, name="Mrs. Anna Nilsson", sex="female", age=30.0,
+    sibsp=1, parch=2, fare=15.0, embarked="Q",
+)
+BACKEND_RESULT = {"survived": 1, "survival_probability": 0.6812, "death_probability": 0.3188}
+REASONING = "Extracted passenger information from natural language"
+
+def legacy(passenger: ExtractedPassenger) -> str:
+    passenger = Passenger(**passenger.model_dump())
+    backend_result = BACKEND_RESULT
+    survived_text = "survived" if int(backend_result["survived"]) else "did not survive"
+    survival_pct = float(backend_result["survival_probability"]) * 100
+    death_pct = float(backend_result["death_probability"]) * 100
+
+    discussion = f"""Based on your description, I've analyzed the passenger information:
+
+**Passenger Details:**
+- Name: {passenger.name}
+- Class: {passenger.pclass} ({"First" if passenger.pclass == 1 else "Second" if passenger.pclass == 2 else "Third"} class)
+- Gender: {passenger.sex.title()}
+- Age: {passenger.age if passenger.age else "Unknown"}
+- Fare: £{passenger.fare if passenger.fare else "Unknown"}
+- Embarked: {passenger.embarked} ({"Cherbourg" if passenger.embarked == "C" else "Queenstown" if passenger.embarked == "Q" else "Southampton"})
+
+**Prediction:**
+This passenger {survived_text} the Titanic disaster.
+
+**Confidence:**
+- Survival probability: {survival_pct:.1f}%
+- Death probability: {death_pct:.1f}%
+
+**Analysis:**
+{REASONING}
+
+The prediction is based on historical data patterns from the Titanic disaster, considering factors like passenger class, age, gender, and fare paid."""
+
+    response = PredictNLResponse(
+        passenger=passenger,
+        survived=int(backend_result["survived"]),
+        survival_probability=float(backend_result["survival_probability"]),
+        death_probability=float(backend_result["death_probability"]),
+        reasoning=REASONING,
+        discussion=discussion,
+    )
+    # What FastAPI's response_model handling does with a returned model
+    validated = PredictNLResponse.model_validate(response.model_dump())
+    return json.dumps(validated.model_dump(mode="json"))
+
+def compiled(passenger: ExtractedPassenger) -> str:
+    return response_json(build_response(passenger, BACKEND_RESULT, REASONING))
+
+def compact(passenger: ExtractedPassenger) -> str:
+    return response_json(build_response(passenger, BACKEND_RESULT, REASONING, compact=True), compact=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /predict-nl response rendering")
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    assert json.loads(legacy(PASSENGER)) == json.loads(compiled(PASSENGER))
+
+    results = {}
+    for name, fn in (("legacy", legacy), ("compiled", compiled), ("compact", compact)):
+        fn(PASSENGER)
+        seconds = min(timeit.repeat(lambda: fn(PASSENGER), number=args.number, repeat=3))
+        results[name] = seconds / args.number * 1e6
+
+    print(f"{'mode':<10}{'us/response':>13}{'bytes':>8}{'speedup':>9}")
+    for name, fn in (("legacy", legacy), ("compiled", compiled), ("compact", compact)):
+        print(
+            f"{name:<10}{results[name]:>13.1f}{len(fn(PASSENGER).encode()):>8}"
+            f"{results['legacy'] / results[name]:>8.1f}x"
+        )
+
+if __name__ == "__main__":
+    main()
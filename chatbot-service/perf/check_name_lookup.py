@@ -0,0 +1,121 @@
+"""
+Name lookup check: records answer only questions about the passenger as they were.
+
+Writes a small passenger file, points ``PASSENGER_DATA_PATH`` at it and
+sends messages in-process to /predict-nl and /predict-nl/stream, with the
+stub LLM standing in for OpenAI and the backend:
+
+- a plain question about a recorded passenger must be answered from the
+  record (``matched_passenger_id`` set, recorded class)
+- a message that states details of its own ("What if Owen Braund was in
+  first class?") must go to the LLM extraction and keep the stated details
+- a married woman's record must not answer for her husband ("What about
+  John Jacob Astor?" against "Astor, Mrs. John Jacob (...)")
+
+Exits with code 1 on any mismatch.
+
+Usage:
+    python perf/check_name_lookup.py
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from replay import make_client, start_stub, use_stub
+
+RECORDS = [
+    # PassengerId, Survived, Pclass, Name, Sex, Age, SibSp, Parch, Ticket, Fare, Cabin, Embarked
+    (1, 0, 3, "Braund, Mr. Owen Harris", "male", 22, 1, 0, "A/5 21171", 7.25, "", "S"),
+    (2, 1, 1, "Cumings, Mrs. John Bradley (Florence Briggs Thayer)", "female", 38, 1, 0, "PC 17599", 71.2833, "C85", "C"),
+    (3, 1, 3, "Heikkinen, Miss. Laina", "female", 26, 0, 0, "STON/O2. 3101282", 7.925, "", "S"),
+    (4, 0, 3, "Smith, Mr. John", "male", 50, 0, 0, "A/5 1", 8.05, "", "S"),
+    (5, 1, 1, "Astor, Mrs. John Jacob (Madeleine Talmadge Force)", "female", 18, 1, 0, "PC 17757", 227.525, "C62 C64", "C"),
+]
+
+# message, expected matched_passenger_id, expected passenger fields
+CASES = [
+    ("Did Mr. Owen Braund survive?", 1, {"pclass": 3, "age": 22.0}),
+    ("What if Owen Braund was in first class?", None, {"pclass": 1}),
+    ("What if Mr. Owen Braund was a woman?", None, {"sex": "female"}),
+    ("Mr. John Smith, a 35-year-old male passenger in first class", None, {"pclass": 1, "sex": "male"}),
+    ("Did Mrs. Astor survive?", 5, {"pclass": 1, "sex": "female"}),
+    ("Did Madeleine Astor survive?", 5, {"pclass": 1, "sex": "female"}),
+    # John Jacob are her husband's given names; he is not in the records
+    ("What about John Jacob Astor?", None, {}),
+]
+
+def check(name: str, matched_id, passenger: dict, expected_id, expected: dict) -> list[str]:
+    failures = []
+    if matched_id != expected_id:
+        failures.append(f"{name}: matched passenger {matched_id}, expected {expected_id}")
+    for field, value in expected.items():
+        if passenger.get(field) != value:
+            failures.append(f"{name}: {field} is {passenger.get(field)!r}, expected {value!r}")
+    return failures
+
+async def run(client) -> list[str]:
+    failures = []
+    for message, expected_id, expected in CASES:
+        resp = await client.post("/predict-nl", json={"message": message})
+        resp.raise_for_status()
+        body = resp.json()
+        print(f"{message!r}: matched {body.get('matched_passenger_id')}, {body['passenger']}")
+        failures += check(f"/predict-nl {message!r}", body.get("matched_passenger_id"), body["passenger"],
+                          expected_id, expected)
+
+        resp = await client.post("/predict-nl/stream", json={"message": message})
+        resp.raise_for_status()
+        events = {}
+        for block in resp.text.strip().split("\n\n"):
+            event, data = block.split("\n", 1)
+            events[event.removeprefix("event: ")] = json.loads(data.removeprefix("data: "))
+        if "passenger" not in events:
+            failures.append(f"/predict-nl/stream {message!r}: no passenger event ({events.get('error')})")
+            continue
+        failures += check(f"/predict-nl/stream {message!r}", events["passenger"].get("matched_passenger_id"),
+                          events["passenger"]["passenger"], expected_id, expected)
+    return failures
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check when name lookups answer from the passenger records")
+    parser.add_argument("--stub-port", type=int, default=8020)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="titanic-names-")
+    path = os.path.join(workdir, "train.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["PassengerId", "Survived", "Pclass", "Name", "Sex", "Age", "SibSp", "Parch",
+                         "Ticket", "Fare", "Cabin", "Embarked"])
+        writer.writerows(RECORDS)
+    os.environ["PASSENGER_DATA_PATH"] = path
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+    stub = start_stub(args.stub_port, ["--seed", "0"])
+    use_stub(args.stub_port)
+
+    async def main_async():
+        async with make_client(None) as client:
+            return await run(client)
+
+    try:
+        failures = asyncio.run(main_async())
+    finally:
+        stub.terminate()
+        stub.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
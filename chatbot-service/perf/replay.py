@@ -0,0 +1,186 @@
+"""
+Replay harness for chatbot-service throughput and latency measurements.
+
+Replays the prompts from a JSONL file (``{"message": ...}`` per line, default
+``perf/requests.jsonl``) against ``/predict-nl`` with a fixed concurrency and
+reports throughput and latency percentiles.
+
+By default the chatbot app runs in-process and a local stub server
+(``stub_llm.py``) is started to stand in for both OpenAI and fastapi-backend,
+so no network access is needed. ``--url`` targets an already running service
+instead.
+
+``--record`` sends every prompt once to the configured LLM backend and writes
+the raw responses to a JSONL file that ``stub_llm.py --replay`` can serve.
+
+Usage:
+    python perf/replay.py --concurrency 16 --repeat 20 --stub-latency-ms 300
+    python perf/replay.py --url http://127.0.0.1:8010 --concurrency 4
+    python perf/replay.py --stub-latency-ms 300 --stub-slow-rate 0.05 --stub-slow-ms 5000 --deadline-ms 2000
+    LLM_BACKEND=openai python perf/replay.py --record perf/recordings.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+PERF_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(PERF_DIR)
+sys.path.insert(0, SERVICE_DIR)
+
+from utils.deadline import TIMEOUT_HEADER
+
+def load_prompts(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["message"] for line in f if line.strip()]
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(latencies: list[float], errors: int, wall_s: float) -> dict:
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(latencies) / wall_s, 1) if wall_s else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p90_ms": round(percentile(latencies, 90), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(max(latencies), 1) if latencies else 0.0,
+    }
+
+def start_stub(port: int, extra_args: list[str]) -> subprocess.Popen:
+    """Start stub_llm.py in a subprocess and wait until it accepts requests"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(PERF_DIR, "stub_llm.py"), "--port", str(port), *extra_args],
+    )
+    url = f"http://127.0.0.1:{port}/stats"
+    for _ in range(100):
+        try:
+            httpx.get(url, timeout=0.5)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Stub LLM server did not start")
+
+def use_stub(port: int) -> None:
+    """Point the in-process chatbot app at the stub server"""
+    os.environ["LLM_BACKEND"] = "stub"
+    os.environ["STUB_LLM_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ["FASTAPI_BASE_URL"] = f"http://127.0.0.1:{port}"
+
+def make_client(url: str | None) -> httpx.AsyncClient:
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=120.0)
+    from app import app
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://chatbot", timeout=120.0
+    )
+
+async def run_replay(
+    client: httpx.AsyncClient,
+    prompts: list[str],
+    concurrency: int = 8,
+    repeat: int = 1,
+    endpoint: str = "/predict-nl",
+    headers: dict | None = None,
+) -> dict:
+    """Replay every prompt ``repeat`` times with ``concurrency`` requests in flight"""
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for _ in range(repeat):
+        for prompt in prompts:
+            queue.put_nowait(prompt)
+
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            message = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                resp = await client.post(endpoint, json={"message": message}, headers=headers)
+                resp.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+            except httpx.HTTPError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+async def record(prompts: list[str], path: str) -> None:
+    from chains.prediction_chain import build_prompt, get_llm
+
+    llm = get_llm()
+    with open(path, "w", encoding="utf-8") as f:
+        for message in prompts:
+            resp = await llm.ainvoke(build_prompt(message))
+            f.write(json.dumps({"message": message, "content": resp.content}) + "\n")
+    print(f"Recorded {len(prompts)} responses to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay prompts against chatbot-service")
+    parser.add_argument("--prompts", default=os.path.join(PERF_DIR, "requests.jsonl"))
+    parser.add_argument("--url", help="Base URL of a running chatbot-service (default: in-process)")
+    parser.add_argument("--endpoint", default="/predict-nl")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--stub-port", type=int, default=8020)
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--stub-slow-rate", type=float, default=0.0,
+                        help="Fraction of stub completions that get --stub-slow-ms of extra latency")
+    parser.add_argument("--stub-slow-ms", type=float, default=0.0)
+    parser.add_argument("--deadline-ms", type=float,
+                        help="Send this timeout with every request (X-Request-Timeout-Ms)")
+    parser.add_argument("--stub-replay", help="Recorded responses for the stub to replay")
+    parser.add_argument("--no-stub", action="store_true",
+                        help="Use the configured LLM backend and FASTAPI_BASE_URL as they are")
+    parser.add_argument("--record", help="Record raw LLM responses to this JSONL file and exit")
+    args = parser.parse_args()
+
+    prompts = load_prompts(args.prompts)
+
+    if args.record:
+        asyncio.run(record(prompts, args.record))
+        return
+
+    stub = None
+    if not args.url and not args.no_stub:
+        stub_args = ["--latency-ms", str(args.stub_latency_ms), "--jitter-ms", str(args.stub_jitter_ms),
+                     "--slow-rate", str(args.stub_slow_rate), "--slow-ms", str(args.stub_slow_ms)]
+        if args.stub_replay:
+            stub_args += ["--replay", args.stub_replay]
+        stub = start_stub(args.stub_port, stub_args)
+        use_stub(args.stub_port)
+
+    async def run():
+        async with make_client(args.url) as client:
+            headers = {TIMEOUT_HEADER: str(args.deadline_ms)} if args.deadline_ms else None
+            return await run_replay(client, prompts, args.concurrency, args.repeat, args.endpoint, headers)
+
+    try:
+        result = asyncio.run(run())
+    finally:
+        if stub:
+            stub.terminate()
+            stub.wait()
+
+    print(json.dumps({"prompts": len(prompts), "concurrency": args.concurrency, **result}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Local OpenAI-compatible stub server for offline testing and benchmarking.
+
+Serves ``POST /v1/chat/completions`` (plain and streaming) with a configurable
+latency, so chatbot-service can run without network access by setting
+``LLM_BACKEND=stub``. Answers are either synthesized from the user message with
+the manual extraction rules, or replayed from a JSONL file of recorded
+responses (``{"message": ..., "content": ...}`` per line, see ``replay.py
+--record``). Messages missing from the recordings fall back to synthesis.
+
+Latency can grow with the prompt and completion lengths (``--ms-per-prompt-token``,
+``--ms-per-completion-token``). A JSON-schema ``response_format`` counts towards
+the prompt tokens, as the schema is part of what the model reads. Free-form
+answers (no ``response_format``) can be made unparseable at
+``--malformed-rate``, as real models sometimes wrap JSON in prose or code
+fences; schema-constrained answers are always valid.
+
+The server also answers ``POST /predict`` with a simple heuristic so the whole
+chatbot pipeline can be exercised without fastapi-backend
+(``FASTAPI_BASE_URL=http://127.0.0.1:8020``).
+
+Usage:
+    python perf/stub_llm.py --port 8020 --latency-ms 400 --jitter-ms 100
+    python perf/stub_llm.py --replay perf/recordings.jsonl --token-delay-ms 5
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from chains.prediction_chain import apply_manual_extraction_rules
+
+app = FastAPI(title="Stub LLM", version="0.1.0")
+
+# Latency model, overridden from the command line
+config = {
+    "latency_ms": float(os.getenv("STUB_LLM_LATENCY_MS", "0")),
+    "jitter_ms": float(os.getenv("STUB_LLM_JITTER_MS", "0")),
+    "slow_rate": float(os.getenv("STUB_LLM_SLOW_RATE", "0")),
+    "slow_ms": float(os.getenv("STUB_LLM_SLOW_MS", "0")),
+    "token_delay_ms": float(os.getenv("STUB_LLM_TOKEN_DELAY_MS", "0")),
+    "ms_per_prompt_token": float(os.getenv("STUB_LLM_MS_PER_PROMPT_TOKEN", "0")),
+    "ms_per_completion_token": float(os.getenv("STUB_LLM_MS_PER_COMPLETION_TOKEN", "0")),
+    "malformed_rate": float(os.getenv("STUB_LLM_MALFORMED_RATE", "0")),
+    "chunk_chars": 8,
+}
+recordings: dict[str, str] = {}
+stats = {"requests": 0, "replayed": 0, "synthesized": 0, "structured": 0, "malformed": 0,
+         "prompt_tokens": 0, "completion_tokens": 0}
+
+MESSAGE_PATTERN = re.compile(r"^Message: (.*?)\nOutput", re.DOTALL)
+
+def load_recordings(path: str) -> None:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                recordings[record["message"].strip()] = record["content"]
+    print(f"Loaded {len(recordings)} recorded responses from {path}")
+
+def user_message(messages: list[dict]) -> str:
+    """Recover the original user message from the chat prompt"""
+    content = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    match = MESSAGE_PATTERN.search(content)
+    return (match.group(1) if match else content).strip()
+
+def synthesize(message: str) -> str:
+    passenger = apply_manual_extraction_rules(message, {})
+    if passenger["sex"] == "unknown":
+        passenger["sex"] = "male"
+    return json.dumps({
+        "is_relevant": True,
+        "passenger": passenger,
+        "reasoning": "Extracted passenger information from natural language",
+    })
+
+def completion_content(messages: list[dict]) -> str:
+    message = user_message(messages)
+    if message in recordings:
+        stats["replayed"] += 1
+        return recordings[message]
+    stats["synthesized"] += 1
+    return synthesize(message)
+
+def count_tokens(text: str) -> int:
+    # Rough approximation of BPE token counts, good enough for relative comparisons
+    return max(1, math.ceil(len(text) / 4))
+
+def malformed(content: str) -> str:
+    """Free-form output a parser expecting bare JSON cannot read"""
+    return f"Here is the extracted passenger:\n```json\n{content}\n```"
+
+def usage(messages: list[dict], content: str, response_format: dict | None = None) -> dict:
+    prompt_tokens = sum(count_tokens(m.get("content") or "") for m in messages)
+    if response_format:
+        prompt_tokens += count_tokens(json.dumps(response_format, separators=(",", ":")))
+    completion_tokens = count_tokens(content)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+async def simulate_latency(tokens: dict) -> None:
+    delay = config["latency_ms"]
+    delay += config["ms_per_prompt_token"] * tokens["prompt_tokens"]
+    delay += config["ms_per_completion_token"] * tokens["completion_tokens"]
+    if config["jitter_ms"]:
+        delay = random.gauss(delay, config["jitter_ms"])
+    if config["slow_rate"] and random.random() < config["slow_rate"]:
+        delay += config["slow_ms"]
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    messages = body.get("messages", [])
+    model = body.get("model", "stub")
+    content = completion_content(messages)
+    response_format = body.get("response_format")
+    if response_format and response_format.get("type") == "json_schema":
+        stats["structured"] += 1
+    elif config["malformed_rate"] and random.random() < config["malformed_rate"]:
+        stats["malformed"] += 1
+        content = malformed(content)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    tokens = usage(messages, content, response_format)
+    stats["prompt_tokens"] += tokens["prompt_tokens"]
+    stats["completion_tokens"] += tokens["completion_tokens"]
+
+    await simulate_latency(tokens)
+
+    if not body.get("stream"):
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": tokens,
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def chunk(delta: dict, finish_reason=None, **extra) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def event_stream():
+        yield chunk({"role": "assistant", "content": ""})
+        size = config["chunk_chars"]
+        for i in range(0, len(content), size):
+            if i and config["token_delay_ms"]:
+                await asyncio.sleep(config["token_delay_ms"] / 1000)
+            yield chunk({"content": content[i:i + size]})
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": tokens,
+            }
+            yield f"data: {json.dumps(payload)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/predict")
+async def predict(passenger: dict):
+    """Heuristic stand-in for the fastapi-backend /predict endpoint"""
+    score = -1.0 + (2.5 if passenger.get("sex") == "female" else 0.0)
+    score += {1: 1.0, 2: 0.3, 3: -0.7}.get(passenger.get("pclass"), 0.0)
+    age = passenger.get("age")
+    if age is not None and age < 12:
+        score += 1.0
+    probability = 1 / (1 + math.exp(-score))
+    return {
+        "survived": int(probability > 0.5),
+        "survival_probability": probability,
+        "death_probability": 1 - probability,
+    }
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "recordings": len(recordings), "config": config}
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"],
+                        help="Mean delay before the first byte of every completion")
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"],
+                        help="Standard deviation of the latency")
+    parser.add_argument("--slow-rate", type=float, default=config["slow_rate"],
+                        help="Fraction of requests that get --slow-ms of extra latency")
+    parser.add_argument("--slow-ms", type=float, default=config["slow_ms"])
+    parser.add_argument("--token-delay-ms", type=float, default=config["token_delay_ms"],
+                        help="Delay between streamed chunks")
+    parser.add_argument("--ms-per-prompt-token", type=float, default=config["ms_per_prompt_token"],
+                        help="Extra latency per prompt token (prefill)")
+    parser.add_argument("--ms-per-completion-token", type=float, default=config["ms_per_completion_token"],
+                        help="Extra latency per completion token (decoding)")
+    parser.add_argument("--malformed-rate", type=float, default=config["malformed_rate"],
+                        help="Fraction of free-form answers wrapped in prose and a code fence")
+    parser.add_argument("--replay", help="JSONL file of recorded responses to replay")
+    parser.add_argument("--seed", type=int, help="Seed for the latency model")
+    args = parser.parse_args()
+
+    config.update(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        token_delay_ms=args.token_delay_ms,
+        ms_per_prompt_token=args.ms_per_prompt_token,
+        ms_per_completion_token=args.ms_per_completion_token,
+        malformed_rate=args.malformed_rate,
+    )
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.replay:
+        load_recordings(args.replay)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
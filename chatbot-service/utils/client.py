@@ -1,7 +1,30 @@
+import asyncio
+import os
 import httpx
+from dotenv import load_dotenv
 from .schemas import Passenger
+from .deadline import remaining
+from .log import REQUEST_ID_HEADER, get_logger, log_fields, request_id_var
 
-FASTAPI_BASE_URL = "http://fastapi-backend:8000"
+load_dotenv()
+
+logger = get_logger(__name__)
+
+FASTAPI_BASE_URL = os.getenv("FASTAPI_BASE_URL", "http://fastapi-backend:8000")
+BACKEND_TIMEOUT = 30.0
+
+# One pooled client per event loop; building a client loads the TLS trust
+# store, which blocks the loop for tens of milliseconds.
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+
+def get_client() -> httpx.AsyncClient:
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = httpx.AsyncClient(timeout=BACKEND_TIMEOUT)
+        _client_loop = loop
+    return _client
 
 async def predict_with_backend(passenger: Passenger) -> dict:
     url = f"{FASTAPI_BASE_URL}/predict"
@@ -15,10 +38,13 @@ async def predict_with_backend(passenger: Passenger) -> dict:
         "fare": passenger.fare,
         "embarked": passenger.embarked,
     }
-    print(f"Sending to backend: {payload}")
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.post(url, json=payload)
-        print(f"Backend response status: {resp.status_code}")
-        print(f"Backend response body: {resp.text}")
-        resp.raise_for_status()
-        return resp.json()
+    logger.debug("Sending to backend", extra=log_fields(payload=payload))
+    headers = {REQUEST_ID_HEADER: request_id_var.get()}
+    # The backend gets whatever is left of the request's deadline
+    timeout = min(BACKEND_TIMEOUT, remaining(BACKEND_TIMEOUT))
+    if not timeout:
+        raise TimeoutError("Request deadline passed before the backend prediction")
+    resp = await get_client().post(url, json=payload, headers=headers, timeout=timeout)
+    logger.debug("Backend response", extra=log_fields(status=resp.status_code, body=resp.text))
+    resp.raise_for_status()
+    return resp.json()
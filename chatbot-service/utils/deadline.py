@@ -0,0 +1,46 @@
+"""
+Request deadlines, propagated to every call made while serving a request.
+
+A caller may send ``X-Request-Timeout-Ms`` with the time it is prepared to
+wait; otherwise, or if it asks for more, ``REQUEST_TIMEOUT_SECONDS`` (default
+15) applies. The timeout is relative, not a wall-clock time, so the clocks of
+the two hosts need not agree. The middleware turns it into an absolute
+deadline on this host's monotonic clock and keeps it in ``deadline_var``;
+LLM and backend calls ask ``remaining()`` how long they may still take.
+
+Coroutines started with ``asyncio.create_task`` copy the context, so work
+spawned for a request (hedged LLM calls, coalesced extractions) sees the
+deadline of the request that started it.
+"""
+
+import os
+import time
+from contextvars import ContextVar
+
+TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "15"))
+
+deadline_var: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+def remaining(default: float | None = None) -> float | None:
+    """Seconds left before the current request's deadline (at least 0), or ``default`` outside a request"""
+    deadline = deadline_var.get()
+    if deadline is None:
+        return default
+    return max(0.0, deadline - time.monotonic())
+
+def request_timeout(header_value: str | None) -> float:
+    """Timeout for a request: the caller's, capped at ``REQUEST_TIMEOUT_SECONDS``"""
+    try:
+        requested = float(header_value) / 1000 if header_value else REQUEST_TIMEOUT_SECONDS
+    except ValueError:
+        requested = REQUEST_TIMEOUT_SECONDS
+    return min(max(requested, 0.0), REQUEST_TIMEOUT_SECONDS)
+
+async def deadline_middleware(request, call_next):
+    """Set the deadline of the request from its timeout header"""
+    token = deadline_var.set(time.monotonic() + request_timeout(request.headers.get(TIMEOUT_HEADER)))
+    try:
+        return await call_next(request)
+    finally:
+        deadline_var.reset(token)
@@ -0,0 +1,101 @@
+"""
+Hedged calls: a second attempt when the first is slower than usual.
+
+A call starts one attempt. If it has not finished after the hedge delay (or
+has already failed), a second, identical attempt starts, and the first of
+the two to succeed wins; the other is cancelled. The delay is a percentile (default the 95th) of
+the latencies of recent successful attempts, so only the slowest few
+percent of calls are hedged and the extra load stays near that share.
+Cancelled attempts are left out: their elapsed time follows the delay
+itself, and counting it would push the delay up on every hedge. Until enough latencies
+have been seen, a fixed initial delay is used.
+
+Every call has a deadline. When it passes, all attempts are cancelled and
+``asyncio.TimeoutError`` is raised, so the caller can fall back to a cheaper
+answer. If both attempts fail, the last error is raised.
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+class HedgedCall:
+    """Run a coroutine with a hedged second attempt and a deadline"""
+
+    def __init__(self, name: str, percentile: float = 95, initial_delay: float = 2.0,
+                 min_delay: float = 0.05, min_samples: int = 20, window: int = 1000):
+        self.name = name
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies: deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the first attempt before starting the second"""
+        if len(self._latencies) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.percentile / 100 * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], timeout: float | None, hedge: bool = True) -> Any:
+        """Await ``fn()`` for at most ``timeout`` seconds (``None``: no limit), hedging it once"""
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        def left() -> float | None:
+            return None if deadline is None else max(0.0, deadline - loop.time())
+
+        started = {}
+
+        def attempt() -> asyncio.Task:
+            task = asyncio.ensure_future(fn())
+            started[task] = loop.time()
+            return task
+
+        first = attempt()
+        pending = {first}
+        # Until the hedge starts, wake up after the hedge delay as well as at the deadline
+        delay = self.hedge_delay() if hedge else None
+        try:
+            while pending:
+                wait = left()
+                if delay is not None:
+                    wait = delay if wait is None else min(wait, delay)
+                done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._latencies.append(loop.time() - started[task])
+                        self.hedge_wins += task is not first
+                        return task.result()
+                    error = task.exception()
+                if left() == 0:
+                    self.timeouts += 1
+                    raise asyncio.TimeoutError(f"{self.name} did not finish within {timeout:.3f}s")
+                # The first attempt is slow, or failed early: try once more
+                if delay is not None:
+                    delay = None
+                    self.hedged += 1
+                    pending.add(attempt())
+            self.errors += 1
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+        }
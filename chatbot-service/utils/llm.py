@@ -0,0 +1,87 @@
+"""
+Pluggable LLM backends for the chatbot service.
+
+The backend is picked with the ``LLM_BACKEND`` environment variable:
+
+- ``openai`` (default): the OpenAI API, requires ``OPENAI_API_KEY``
+- ``stub``: a local OpenAI-compatible server such as ``perf/stub_llm.py``,
+  reached at ``STUB_LLM_URL`` (default ``http://127.0.0.1:8020/v1``)
+
+Both backends speak the OpenAI chat completions protocol, so the rest of the
+service uses the same ``ChatOpenAI`` client regardless of where requests go.
+
+``LLM_EXTRACTION_MODE`` selects how the passenger is asked for:
+``structured`` (default) sends a compact prompt and constrains the answer to
+a JSON schema (OpenAI structured outputs), so it always parses; ``json``
+sends the longer free-form prompt and parses whatever comes back.
+
+Extraction calls are hedged (see ``utils/hedge.py``): ``LLM_HEDGE=0`` turns
+hedging off, ``LLM_HEDGE_PERCENTILE`` (default 95) sets the latency
+percentile after which a second request is sent, ``LLM_HEDGE_INITIAL_DELAY_MS``
+(default 2000) the delay used until enough latencies have been seen, and
+``LLM_HEDGE_MIN_DELAY_MS`` (default 50) a floor for the delay.
+``LLM_DEADLINE_RESERVE_MS`` (default 1000) is the part of the request's
+deadline kept for the backend prediction after extraction.
+"""
+
+import os
+from functools import lru_cache
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+STUB_LLM_URL = os.getenv("STUB_LLM_URL", "http://127.0.0.1:8020/v1")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_EXTRACTION_MODE = os.getenv("LLM_EXTRACTION_MODE", "structured").lower()
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") != "0"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_INITIAL_DELAY = float(os.getenv("LLM_HEDGE_INITIAL_DELAY_MS", "2000")) / 1000
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "50")) / 1000
+LLM_DEADLINE_RESERVE = float(os.getenv("LLM_DEADLINE_RESERVE_MS", "1000")) / 1000
+
+def _openai_llm(temperature: float) -> ChatOpenAI:
+    if not OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY not found in environment variables")
+    return ChatOpenAI(
+        model=OPENAI_MODEL,
+        temperature=temperature,
+        api_key=OPENAI_API_KEY,
+        timeout=LLM_TIMEOUT,
+        # Token usage on the last chunk of a stream, for the /stats token counters
+        stream_usage=True,
+    )
+
+def _stub_llm(temperature: float) -> ChatOpenAI:
+    return ChatOpenAI(
+        model=OPENAI_MODEL,
+        temperature=temperature,
+        api_key=OPENAI_API_KEY or "stub",
+        base_url=STUB_LLM_URL,
+        timeout=LLM_TIMEOUT,
+        max_retries=0,
+        stream_usage=True,
+    )
+
+LLM_BACKENDS = {
+    "openai": _openai_llm,
+    "stub": _stub_llm,
+}
+
+@lru_cache(maxsize=None)
+def create_llm(temperature: float = 0.2) -> ChatOpenAI:
+    """Create a chat model for the configured backend.
+
+    Models are cached per temperature; the client is safe to share between
+    concurrent requests and reuses its connection pool.
+    """
+    try:
+        factory = LLM_BACKENDS[LLM_BACKEND]
+    except KeyError:
+        raise ValueError(
+            f"Unknown LLM_BACKEND '{LLM_BACKEND}', expected one of: {', '.join(LLM_BACKENDS)}"
+        )
+    return factory(temperature)
@@ -0,0 +1,255 @@
+"""
+Passenger name index.
+
+Questions about real passengers ("Did Mrs. Astor survive?") are answered from
+the recorded passenger data instead of asking the LLM to invent features.
+The index is built once at start-up from the Kaggle-style ``train.csv``:
+
+- names are normalized (accents stripped, case folded, punctuation removed)
+  and split into surname tokens (before the comma), the title and the other
+  name tokens. A married woman is recorded under her husband's given names
+  ("Astor, Mrs. John Jacob (Madeleine Talmadge Force)"), so only her own
+  name in parentheses is indexed besides the surname
+- an inverted index maps every token to the passengers whose name has it
+- a character trigram index over the token vocabulary resolves misspelled
+  surnames ("Asstor") to known tokens
+
+A message is matched by looking up its candidate name words: capitalized
+words, and any word following a title ("mrs astor"). Each passenger is
+scored by the IDF of the tokens it matched; a match is only used when it
+includes the surname, is backed by a title or a second name token ("Astor"
+alone is not enough), agrees with the title if one was given, and clearly
+beats the runner-up.
+
+Records answer questions about the passenger as they were. A message that
+also states details of its own ("What if Owen Braund was in first class?",
+"Mr. John Smith, 35, first class") describes a different passenger, so
+``stated_attributes`` finds the class, age, sex, fare, port or family
+details it mentions and such messages are left to the LLM extraction.
+"""
+
+import csv
+import math
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+from .schemas import Passenger
+
+TITLES = {
+    "mr", "mrs", "miss", "master", "ms", "mlle", "mme", "dr", "rev", "col", "major",
+    "capt", "sir", "lady", "countess", "don", "dona", "jonkheer",
+}
+# Titles of married women, recorded under their husband's given names
+MARRIED_TITLES = {"mrs", "mme"}
+TITLE_ALIASES = {
+    "mister": "mr", "missus": "mrs", "doctor": "dr", "reverend": "rev",
+    "colonel": "col", "captain": "capt", "madame": "mme", "mademoiselle": "mlle",
+}
+WORD_PATTERN = re.compile(r"[A-Za-zÀ-ɏ']+")
+MIN_FUZZY_LENGTH = 4
+MIN_FUZZY_SIMILARITY = 0.45
+# The best match must score at least this much more IDF than the runner-up
+MIN_MARGIN = 1.0
+# Passenger details a message may state besides a name
+ATTRIBUTE_PATTERNS = {
+    "pclass": re.compile(
+        r"\b(?:first|second|third|1st|2nd|3rd|upper|middle|lower)[- ]class\b|\bclass\s*[123]\b|\bsteerage\b",
+        re.IGNORECASE,
+    ),
+    "age": re.compile(
+        r"\b\d{1,3}\s*-?\s*(?:years?|yrs?|y/?o)\b|\baged?\s*(?:of\s*)?\d|\b(?:baby|infant|toddler|teen(?:ager)?|elderly)\b",
+        re.IGNORECASE,
+    ),
+    "sex": re.compile(r"\b(?:male|female|man|woman|men|women|boy|girl|gentleman)\b", re.IGNORECASE),
+    "fare": re.compile(
+        r"\bfare\b|\bpaid\b|\bticket (?:cost|price|worth)|[$£]\s*\d|\b\d+(?:\.\d+)?\s*(?:pounds?|dollars?|shillings?)\b",
+        re.IGNORECASE,
+    ),
+    "embarked": re.compile(r"\b(?:embarked|boarded)\b|\b(?:southampton|cherbourg|queenstown)\b", re.IGNORECASE),
+    "family": re.compile(
+        r"\b(?:alone|family|husband|wife|spouse|siblings?|brothers?|sisters?|parents?|children|kids?|sons?"
+        r"|daughters?|mother|father)\b",
+        re.IGNORECASE,
+    ),
+}
+
+def normalize(word: str) -> str:
+    word = unicodedata.normalize("NFKD", word)
+    word = "".join(c for c in word if not unicodedata.combining(c))
+    return word.casefold().replace("'", "")
+
+def trigrams(token: str) -> set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+@dataclass
+class PassengerRecord:
+    passenger_id: int
+    name: str
+    surname: frozenset
+    title: Optional[str]
+    tokens: frozenset
+    passenger: Passenger
+    survived: int
+
+@dataclass
+class NameMatch:
+    record: PassengerRecord
+    score: float
+    matched: tuple
+
+def _optional_float(value: str) -> Optional[float]:
+    return float(value) if value not in ("", None) else None
+
+class NameIndex:
+    """Inverted index with fuzzy trigram lookups over passenger names"""
+
+    def __init__(self, records: list[PassengerRecord]):
+        self.records = records
+        self.postings: dict[str, list[int]] = defaultdict(list)
+        for i, record in enumerate(records):
+            for token in record.tokens:
+                self.postings[token].append(i)
+        n = len(records)
+        self.idf = {token: math.log(1 + n / len(ids)) for token, ids in self.postings.items()}
+        self.trigram_postings: dict[str, list[str]] = defaultdict(list)
+        for token in self.postings:
+            for gram in trigrams(token):
+                self.trigram_postings[gram].append(token)
+        self.lookups = 0
+        self.matches = 0
+
+    @classmethod
+    def from_csv(cls, path: str) -> "NameIndex":
+        records = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                name = row["Name"]
+                surname_part, _, rest = name.partition(",")
+                surname = frozenset(normalize(w) for w in WORD_PATTERN.findall(surname_part))
+                words = [normalize(w) for w in WORD_PATTERN.findall(rest)]
+                title = next((w for w in words if w in TITLES), None)
+                if title in MARRIED_TITLES:
+                    # "Mrs. John Jacob (Madeleine Talmadge Force)": the given names are
+                    # her husband's; only her own name in parentheses refers to her
+                    _, _, own = rest.partition("(")
+                    words = [normalize(w) for w in WORD_PATTERN.findall(own)]
+                tokens = surname | {w for w in words if w not in TITLES and len(w) > 1}
+                records.append(PassengerRecord(
+                    passenger_id=int(row["PassengerId"]),
+                    name=name,
+                    surname=surname,
+                    title=title,
+                    tokens=frozenset(tokens),
+                    passenger=Passenger(
+                        pclass=int(row["Pclass"]),
+                        name=name,
+                        sex=row["Sex"],
+                        age=_optional_float(row["Age"]),
+                        sibsp=int(row["SibSp"]),
+                        parch=int(row["Parch"]),
+                        fare=_optional_float(row["Fare"]),
+                        embarked=row["Embarked"] or "S",
+                    ),
+                    survived=int(row["Survived"]),
+                ))
+        return cls(records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def resolve(self, word: str) -> list[tuple[str, float]]:
+        """Known tokens for a query word with a similarity weight"""
+        if word in self.postings:
+            return [(word, 1.0)]
+        if len(word) < MIN_FUZZY_LENGTH:
+            return []
+        grams = trigrams(word)
+        overlap: dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for token in self.trigram_postings.get(gram, ()):
+                overlap[token] += 1
+        best = []
+        for token, shared in overlap.items():
+            similarity = shared / (len(grams) + len(trigrams(token)) - shared)
+            if similarity >= MIN_FUZZY_SIMILARITY:
+                best.append((token, similarity))
+        best.sort(key=lambda item: (-item[1], item[0]))
+        return best[:3]
+
+    @staticmethod
+    def query_words(message: str) -> tuple[list[str], Optional[str]]:
+        """Candidate name words of a message, and the title it mentions"""
+        words = WORD_PATTERN.findall(message)
+        candidates, title = [], None
+        for i, word in enumerate(words):
+            normalized = normalize(word)
+            normalized = TITLE_ALIASES.get(normalized, normalized)
+            if normalized in TITLES:
+                title = title or normalized
+                continue
+            previous = normalize(words[i - 1]) if i > 0 else ""
+            after_title = TITLE_ALIASES.get(previous, previous) in TITLES
+            if word[0].isupper() or after_title:
+                candidates.append(normalized)
+        return candidates, title
+
+    def match(self, message: str) -> Optional[NameMatch]:
+        """The passenger a message confidently refers to, if any"""
+        self.lookups += 1
+        words, title = self.query_words(message)
+        scores: dict[int, float] = defaultdict(float)
+        matched: dict[int, list[str]] = defaultdict(list)
+        has_surname: set[int] = set()
+        for word in words:
+            seen = set()
+            for token, weight in self.resolve(word):
+                for i in self.postings[token]:
+                    # Count each query word once per passenger
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    scores[i] += self.idf[token] * weight
+                    matched[i].append(token)
+                    if token in self.records[i].surname:
+                        has_surname.add(i)
+        candidates = [
+            i for i in has_surname
+            if title is None or self.records[i].title == title or _compatible_titles(title, self.records[i].title)
+        ]
+        if not candidates:
+            return None
+        candidates.sort(key=lambda i: (-scores[i], self.records[i].passenger_id))
+        best = candidates[0]
+        if title is None and len(matched[best]) < 2:
+            return None
+        runner_up = scores[candidates[1]] if len(candidates) > 1 else 0.0
+        if scores[best] - runner_up < MIN_MARGIN:
+            return None
+        self.matches += 1
+        return NameMatch(self.records[best], scores[best], tuple(matched[best]))
+
+    def stats(self) -> dict:
+        return {"passengers": len(self.records), "lookups": self.lookups, "matches": self.matches}
+
+def stated_attributes(message: str) -> list[str]:
+    """Passenger details (class, age, sex, fare, port, family) a message states besides a name"""
+    return [field for field, pattern in ATTRIBUTE_PATTERNS.items() if pattern.search(message)]
+
+def _compatible_titles(asked: str, recorded: Optional[str]) -> bool:
+    equivalent = ({"miss", "ms", "mlle"}, {"mrs", "mme"})
+    return any(asked in group and recorded in group for group in equivalent)
+
+def load_name_index(path: Optional[str] = None) -> Optional[NameIndex]:
+    """Build the index from ``PASSENGER_DATA_PATH`` (default: ml-model/data/train.csv)"""
+    path = path or os.getenv(
+        "PASSENGER_DATA_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "..", "ml-model", "data", "train.csv"),
+    )
+    if not os.path.exists(path):
+        return None
+    return NameIndex.from_csv(path)
@@ -0,0 +1,119 @@
+"""
+Response rendering for /predict-nl.
+
+The discussion text is a module-level template whose field names are parsed
+once, leaving a positional format string and a getter for its values, and the
+class and port names come from static lookup tables, so rendering a response
+does no template parsing and no branching.
+Responses are built from already validated data with ``model_construct`` and
+serialized directly to JSON.
+"""
+
+import string
+from operator import itemgetter
+from typing import Mapping, Optional
+
+from .schemas import Passenger, PredictNLResponse
+
+CLASS_NAMES = {1: "First", 2: "Second", 3: "Third"}
+PORT_NAMES = {"C": "Cherbourg", "Q": "Queenstown", "S": "Southampton"}
+SURVIVED_TEXT = {0: "did not survive", 1: "survived"}
+
+DISCUSSION_TEMPLATE = """Based on your description, I've analyzed the passenger information:
+
+**Passenger Details:**
+- Name: {name}
+- Class: {pclass} ({class_name} class)
+- Gender: {sex}
+- Age: {age}
+- Fare: £{fare}
+- Embarked: {embarked} ({port_name})
+
+**Prediction:**
+This passenger {survived_text} the Titanic disaster.
+
+**Confidence:**
+- Survival probability: {survival_pct:.1f}%
+- Death probability: {death_pct:.1f}%
+
+**Analysis:**
+{reasoning}
+
+The prediction is based on historical data patterns from the Titanic disaster, considering factors like passenger class, age, gender, and fare paid."""
+
+class CompiledTemplate:
+    """A ``str.format`` template with its field names resolved once
+
+    The named fields are replaced by positional ones, so rendering is one
+    ``str.format`` call on values fetched with a single ``itemgetter``.
+    """
+
+    def __init__(self, template: str):
+        fields = []
+        body = []
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            body.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is not None:
+                replacement = f"!{conversion}" if conversion else ""
+                if spec:
+                    replacement += f":{spec}"
+                body.append("{" + replacement + "}")
+                fields.append(field)
+        self.fields = tuple(fields)
+        self._format = "".join(body).format
+        self._getter = itemgetter(*fields) if len(fields) > 1 else (lambda v: (v[fields[0]],))
+
+    def render(self, values: Mapping) -> str:
+        return self._format(*self._getter(values))
+
+DISCUSSION = CompiledTemplate(DISCUSSION_TEMPLATE)
+
+def render_discussion(passenger: Passenger, survived: int, survival_probability: float,
+                      death_probability: float, reasoning: str) -> str:
+    return DISCUSSION.render({
+        "name": passenger.name,
+        "pclass": passenger.pclass,
+        "class_name": CLASS_NAMES.get(passenger.pclass, "Third"),
+        "sex": passenger.sex.title(),
+        "age": passenger.age if passenger.age else "Unknown",
+        "fare": passenger.fare if passenger.fare else "Unknown",
+        "embarked": passenger.embarked,
+        "port_name": PORT_NAMES.get(passenger.embarked, "Southampton"),
+        # Any truthy backend value (1, True, 1.0) reads as survived
+        "survived_text": SURVIVED_TEXT[bool(survived)],
+        "survival_pct": survival_probability * 100,
+        "death_pct": death_probability * 100,
+        "reasoning": reasoning,
+    })
+
+def build_response(passenger: Passenger, backend_result: dict, reasoning: str,
+                   compact: bool = False, matched_passenger_id: Optional[int] = None,
+                   actual_survived: Optional[int] = None) -> PredictNLResponse:
+    """Combine the extracted passenger and the backend prediction into a response.
+
+    In compact mode the discussion is not rendered. ``matched_passenger_id``
+    and ``actual_survived`` are set for passengers found in the records.
+    """
+    survived = int(backend_result["survived"])
+    survival_probability = float(backend_result["survival_probability"])
+    death_probability = float(backend_result["death_probability"])
+    discussion = "" if compact else render_discussion(
+        passenger, survived, survival_probability, death_probability, reasoning
+    )
+    # Every field is already validated, so skip a second validation pass
+    return PredictNLResponse.model_construct(
+        passenger=passenger,
+        survived=survived,
+        survival_probability=survival_probability,
+        death_probability=death_probability,
+        reasoning=reasoning,
+        discussion=discussion,
+        matched_passenger_id=matched_passenger_id,
+        actual_survived=actual_survived,
+    )
+
+COMPACT_EXCLUDE = {"discussion"}
+
+def response_json(response: PredictNLResponse, compact: bool = False) -> str:
+    """Serialize a response; compact responses omit the discussion"""
+    return response.model_dump_json(exclude=COMPACT_EXCLUDE if compact else None)
@@ -24,3 +24,6 @@ class PredictNLResponse(BaseModel):
     death_probability: float
     reasoning: str
     discussion: str = ""  # Make it optional with default empty string
+    # Set when the message named a real passenger found in the passenger records
+    matched_passenger_id: Optional[int] = None
+    actual_survived: Optional[int] = None
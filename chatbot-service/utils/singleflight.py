@@ -0,0 +1,47 @@
+"""
+Single-flight request coalescing.
+
+Concurrent calls that share a key are served by one in-flight execution: the
+first caller starts the work as a task and later callers await the same task
+until it finishes. Nothing is cached once the task is done, so a new call
+after completion runs the work again.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+class SingleFlight:
+    """Deduplicate concurrent executions of the same keyed coroutine"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn()`` for ``key`` unless a run for the same key is already in flight"""
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shield the shared task so one cancelled caller does not cancel the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
+
+def normalize_message(message: str) -> str:
+    """Key for a chat message: case-folded with whitespace collapsed"""
+    return " ".join(message.casefold().split())
@@ -2,15 +2,38 @@
 Clean FastAPI application for Titanic survival prediction
 """
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, List, Optional
 import pickle
 import os
 import sys
+import tempfile
+import time
 import pandas as pd
 import numpy as np
+from utils.counterfactual import CounterfactualSearch
+from utils.explain import TreePathExplainer
+from utils.forest import load_model, model_files
+from utils.admission import BULK, INTERACTIVE, AdmissionController
+from utils.cohorts import CohortCube, CohortQueryError
+from utils.drift import DriftMonitor
+from utils.similar import SimilarPassengers
+from utils.features import FeatureEncoder, FeatureEncodingError, batch_length, records_to_columns, score_matrix as score_features
+from utils.sweep import SweepError, range_values, run_sweep
+from utils.log import get_logger, log_fields, request_context_middleware, request_id_var, setup_logging
+from utils.prediction_cache import SharedPredictionCache, fingerprint
+from utils.prediction_log import PredictionLog
+from utils.registry import CURRENT_VERSION, ModelRegistry, ModelVersion, UnknownModelVersion
+from utils import wire
+from utils.jobs import ACTIVE_STATES, JobManager, JobNotFound, JobNotReady
+
+setup_logging("fastapi-backend")
+logger = get_logger(__name__)
 
 # Load the trained model and encoders
 # For local development, models are in ../ml-model/models/
@@ -24,8 +47,8 @@ else:
     models_path = os.path.join(current_dir, '..', 'ml-model', 'models')
 
 try:
-    with open(os.path.join(models_path, 'titanic_model.pkl'), 'rb') as f:
-        model = pickle.load(f)
+    # MODEL_FORMAT=compact serves the memory-mapped export of ml-model/compact_forest.py
+    model = load_model(models_path)
     
     with open(os.path.join(models_path, 'encoders.pkl'), 'rb') as f:
         encoders = pickle.load(f)
@@ -33,7 +56,7 @@ try:
     with open(os.path.join(models_path, 'feature_columns.pkl'), 'rb') as f:
         feature_columns = pickle.load(f)
     
-    print("✅ Model loaded successfully!")
+    print(f"✅ Model loaded successfully! ({os.getenv('MODEL_FORMAT', 'sklearn')} format)")
     model_loaded = True
     
 except Exception as e:
@@ -45,14 +68,168 @@ except Exception as e:
     feature_columns = None
     model_loaded = False
 
+# Vectorized encoder for batch endpoints
+feature_encoder = FeatureEncoder(encoders, feature_columns) if model_loaded else None
+
+# Per-node path contributions, precomputed once so ?explain=true costs about a prediction
+explainer = TreePathExplainer(model, feature_columns) if model_loaded else None
+
+# Candidate values are pruned to one per distinct routing through the forest's splits
+counterfactual_search = CounterfactualSearch(model, feature_encoder) if model_loaded else None
+MAX_COUNTERFACTUAL_CANDIDATES = int(os.getenv("MAX_COUNTERFACTUAL_CANDIDATES", "20000"))
+
+# Nearest historical passengers (optional; built by ml-model/train.py)
+similar_passengers = None
+if model_loaded:
+    try:
+        similar_passengers = SimilarPassengers.load(os.path.join(models_path, 'similarity_index.pkl'), feature_columns)
+        print(f"✅ Similarity index loaded ({len(similar_passengers)} passengers)")
+    except Exception as e:
+        print(f"⚠️ Similarity index not available: {e}")
+MAX_SIMILAR = 50
+
+# Cohort survival statistics (optional; built by ml-model/train.py)
+try:
+    cohort_cube = CohortCube.load(os.path.join(models_path, 'cohort_cube.pkl'))
+    print(f"✅ Cohort cube loaded ({cohort_cube.counts.size} cells)")
+except Exception as e:
+    print(f"⚠️ Cohort cube not available: {e}")
+    cohort_cube = None
+
+# Input drift against the training data (optional; reference built by ml-model/train.py)
+drift_monitor = None
+if model_loaded and os.getenv("DRIFT_MONITOR", "1") != "0":
+    try:
+        drift_monitor = DriftMonitor.load(
+            os.path.join(models_path, 'drift_reference.pkl'), feature_encoder,
+            window_seconds=float(os.getenv("DRIFT_WINDOW_SECONDS", "3600")),
+            min_rows=int(os.getenv("DRIFT_MIN_ROWS", "100")),
+        )
+        print("✅ Drift reference loaded")
+    except Exception as e:
+        print(f"⚠️ Drift monitor not available: {e}")
+
+# Model versions for A/B tests and shadow scoring; the model above is version "current"
+model_registry = None
+if model_loaded:
+    model_registry = ModelRegistry(
+        models_path, ModelVersion(CURRENT_VERSION, model, feature_encoder),
+        max_resident=int(os.getenv("MAX_RESIDENT_MODELS", "3")),
+        shadow_queue_size=int(os.getenv("SHADOW_QUEUE_SIZE", "1000")),
+    )
+    try:
+        model_registry.set_routing(
+            candidate=os.getenv("CANDIDATE_MODEL") or None,
+            candidate_percent=float(os.getenv("CANDIDATE_PERCENT", "0")),
+            shadow=os.getenv("SHADOW_MODEL") or None,
+        )
+    except (ValueError, UnknownModelVersion) as e:
+        print(f"⚠️ Model routing not applied: {e}")
+
+# /predict results shared by every worker on the host, keyed by the encoded features
+prediction_cache = None
+if model_loaded and int(os.getenv("PREDICTION_CACHE_SLOTS", "65536")) > 0:
+    try:
+        prediction_cache = SharedPredictionCache(
+            name=os.getenv("PREDICTION_CACHE_NAME", "titanic-predictions"),
+            slots=int(os.getenv("PREDICTION_CACHE_SLOTS", "65536")),
+            n_features=len(feature_columns),
+            model_fingerprint=fingerprint(model_files(models_path) + [
+                os.path.join(models_path, 'encoders.pkl'), os.path.join(models_path, 'feature_columns.pkl'),
+            ]),
+        )
+        print(f"✅ Prediction cache attached ({prediction_cache.slots} slots, {prediction_cache.nbytes / 2**20:.1f} MiB)")
+    except (ValueError, OSError) as e:
+        print(f"⚠️ Prediction cache not available: {e}")
+
+# Every prediction is buffered in memory and written to rotating files in the background
+prediction_log = None
+if os.getenv("PREDICTION_LOG", "1") != "0":
+    try:
+        prediction_log = PredictionLog(
+            log_dir=os.getenv("PREDICTION_LOG_DIR", os.path.join(current_dir, "prediction_logs")),
+            file_format=os.getenv("PREDICTION_LOG_FORMAT", "parquet"),
+            capacity=int(os.getenv("PREDICTION_LOG_BUFFER_ROWS", "65536")),
+            flush_rows=int(os.getenv("PREDICTION_LOG_FLUSH_ROWS", "8192")),
+            flush_seconds=float(os.getenv("PREDICTION_LOG_FLUSH_SECONDS", "1")),
+            sample_rate=float(os.getenv("PREDICTION_LOG_SAMPLE_RATE", "1.0")),
+            rotate_rows=int(os.getenv("PREDICTION_LOG_ROTATE_ROWS", "1000000")),
+            rotate_seconds=float(os.getenv("PREDICTION_LOG_ROTATE_SECONDS", "3600")),
+            max_files=int(os.getenv("PREDICTION_LOG_MAX_FILES", "100")),
+        )
+    except (ValueError, OSError) as e:
+        print(f"⚠️ Prediction log not available: {e}")
+
+MAX_BATCH_ROWS = int(os.getenv("MAX_BATCH_ROWS", "100000"))
+SWEEP_MAX_CELLS = int(os.getenv("SWEEP_MAX_CELLS", "1000000"))
+SWEEP_MAX_AXIS_POINTS = int(os.getenv("SWEEP_MAX_AXIS_POINTS", "10000"))
+SWEEP_CHUNK_ROWS = int(os.getenv("SWEEP_CHUNK_ROWS", "65536"))
+
+# Background scoring jobs for datasets too large for one request
+job_manager = JobManager(
+    models_path=models_path,
+    jobs_dir=os.getenv("JOBS_DIR", os.path.join(current_dir, "jobs")),
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    chunk_rows=int(os.getenv("JOB_CHUNK_ROWS", "50000")),
+    max_rows=int(os.getenv("JOB_MAX_ROWS", "10000000")),
+    max_bytes=int(os.getenv("JOB_MAX_BYTES", str(2 * 2**30))),
+    max_document_bytes=int(os.getenv("JOB_MAX_DOCUMENT_BYTES", str(256 * 2**20))),
+    retention_seconds=float(os.getenv("JOB_RETENTION_HOURS", "24")) * 3600,
+)
+# Upload bytes collected before each disk write
+JOB_UPLOAD_WRITE_BYTES = 1 << 20
+
+# Per-client rate limits and load shedding for prediction endpoints. Off by default:
+# behind nginx or the chatbot every user shares one address, so clients are only told
+# apart once ADMISSION_TRUSTED_PROXIES or ADMISSION_API_KEYS is set
+admission_controller = None
+if os.getenv("ADMISSION_CONTROL", "0") == "1":
+    admission_controller = AdmissionController(
+        rates={
+            INTERACTIVE: float(os.getenv("ADMISSION_INTERACTIVE_RATE", "50")),
+            BULK: float(os.getenv("ADMISSION_BULK_RATE", "2")),
+        },
+        bursts={
+            INTERACTIVE: float(os.getenv("ADMISSION_INTERACTIVE_BURST", "100")),
+            BULK: float(os.getenv("ADMISSION_BULK_BURST", "5")),
+        },
+        max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64")),
+        max_bulk=int(os.getenv("ADMISSION_MAX_BULK", "4")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "0.25")),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "256")),
+        max_clients=int(os.getenv("ADMISSION_MAX_CLIENTS", "10000")),
+        trusted_proxies=os.getenv("ADMISSION_TRUSTED_PROXIES", ""),
+        api_keys=os.getenv("ADMISSION_API_KEYS", ""),
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the worker pool and resume jobs interrupted by a restart
+    if model_loaded:
+        await run_in_threadpool(job_manager.start)
+        model_registry.start()
+    if prediction_log is not None:
+        prediction_log.start()
+    yield
+    await run_in_threadpool(job_manager.shutdown)
+    if model_loaded:
+        model_registry.shutdown()
+    if prediction_log is not None:
+        await run_in_threadpool(prediction_log.shutdown)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Titanic Survival Prediction API",
     description="A machine learning API for predicting Titanic passenger survival",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Add CORS middleware
+# Rate limits and concurrency limits; added first so rejected requests still get a request ID and an access line
+if admission_controller is not None:
+    app.middleware("http")(admission_controller)
+
+# Add CORS middleware; added after admission control so its 429 and 503 responses carry CORS headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -61,6 +238,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Assign request IDs (shared with chatbot-service) and log one access line per request
+app.middleware("http")(request_context_middleware)
+
 # Pydantic models
 class PassengerData(BaseModel):
     pclass: int
@@ -72,16 +252,117 @@ class PassengerData(BaseModel):
     fare: Optional[float] = None
     embarked: str = "S"
 
+class Explanation(BaseModel):
+    base_value: float
+    contributions: Dict[str, float]
+
 class PredictionResult(BaseModel):
     survived: int
     survival_probability: float
     death_probability: float
+    explanation: Optional[Explanation] = None
+
+class BatchPrediction(BaseModel):
+    survived: int
+    survival_probability: float
+    death_probability: float
+    contributions: Optional[Dict[str, float]] = None
+
+class BatchPredictionResult(BaseModel):
+    predictions: List[BatchPrediction]
+    total_passengers: int
+    base_value: Optional[float] = None
+
+class SweepRange(BaseModel):
+    start: float
+    stop: float
+    step: float
+
+class SweepRequest(BaseModel):
+    passenger: PassengerData
+    pclass: Optional[List[int]] = None
+    age: Optional[SweepRange] = None
+    fare: Optional[SweepRange] = None
+    family_size: Optional[List[int]] = None
+
+class SweepResult(BaseModel):
+    base: PredictionResult
+    axes: Dict[str, List[float]]
+    shape: List[int]
+    total_points: int
+    survival_probability: list
+
+class CounterfactualResult(BaseModel):
+    status: str
+    original_survival_probability: float
+    survival_probability: Optional[float] = None
+    changes: Dict[str, Dict[str, Any]]
+    passenger: Optional[PassengerData] = None
+    candidates_evaluated: int
+
+class SimilarPassenger(BaseModel):
+    passenger_id: int
+    name: str
+    pclass: int
+    sex: str
+    age: Optional[float] = None
+    sibsp: int
+    parch: int
+    fare: Optional[float] = None
+    embarked: Optional[str] = None
+    survived: int
+    distance: float
+
+class SimilarResult(BaseModel):
+    neighbors: List[SimilarPassenger]
+    survival_rate: float
+
+class CohortResult(BaseModel):
+    filters: Dict[str, List[str]]
+    group_by: List[str]
+    count: int
+    survivors: int
+    survival_rate: Optional[float] = None
+    groups: List[Dict[str, Any]]
+
+class RoutingConfig(BaseModel):
+    candidate: Optional[str] = None
+    candidate_percent: float = 0
+    shadow: Optional[str] = None
+
+class ModelVersionInfo(BaseModel):
+    name: str
+    resident: bool
+    served: Dict[str, Any]
+    shadow: Dict[str, Any]
+    errors: int
+
+class ModelsResult(BaseModel):
+    primary: str
+    candidate: Optional[str] = None
+    candidate_percent: float
+    shadow: Optional[str] = None
+    max_resident: int
+    versions: List[ModelVersionInfo]
 
 class HealthResponse(BaseModel):
     status: str
     message: str
     model_loaded: bool
 
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    total_rows: Optional[int] = None
+    rows_done: int
+    chunks_done: int
+    total_chunks: Optional[int] = None
+    progress: float
+    cancel_requested: bool
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
 # Helper functions
 def preprocess_passenger(passenger_data: dict) -> pd.DataFrame:
     """Preprocess passenger data for prediction"""
@@ -136,6 +417,89 @@ def encode_features(df: pd.DataFrame) -> pd.DataFrame:
     
     return df_encoded
 
+def score_matrix(X: np.ndarray):
+    """Score an encoded feature matrix; returns (survived, P(survived), P(died))"""
+    return score_features(model, feature_columns, X)
+
+def score_batch_body(body: bytes, content_type: str, accept_type: str, explain: bool = False) -> bytes:
+    """Decode, encode, score and serialize one batch request"""
+    columns = wire.decode_batch(body, content_type)
+    n_rows = batch_length(columns)
+    if n_rows > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ROWS} passengers")
+    X = feature_encoder.encode(columns)
+    if not len(X):
+        # predict_proba rejects an empty matrix; an empty batch has an empty result
+        empty = np.empty(0)
+        return wire.encode_batch_result(
+            empty.astype(np.int64), empty, empty, accept_type,
+            contributions=np.empty((0, len(feature_columns))) if explain else None,
+            feature_names=feature_columns,
+            base_value=explainer.base_value if explain else None,
+        )
+    survived, survival_probability, death_probability = score_matrix(X)
+    if drift_monitor is not None:
+        drift_monitor.observe_batch(columns, X)
+    if prediction_log is not None:
+        prediction_log.log_batch(
+            columns, survived, survival_probability,
+            "/predict/batch", model_registry.primary.name, request_id_var.get(),
+        )
+    if not explain:
+        return wire.encode_batch_result(survived, survival_probability, death_probability, accept_type)
+    return wire.encode_batch_result(
+        survived, survival_probability, death_probability, accept_type,
+        contributions=explainer.contributions(X),
+        feature_names=feature_columns,
+        base_value=explainer.base_value,
+    )
+
+def record_prediction(passenger_fields: dict, result: dict, version: str) -> None:
+    """Count the passenger for the drift monitor and append the prediction to the log"""
+    if drift_monitor is not None:
+        drift_monitor.observe(passenger_fields)
+    if prediction_log is not None:
+        prediction_log.log(passenger_fields, result["survived"], result["survival_probability"],
+                           "/predict", version, request_id_var.get())
+
+def passenger_matrix(passenger: PassengerData) -> np.ndarray:
+    """Encode one passenger with the vectorized encoder"""
+    return feature_encoder.encode(records_to_columns([passenger.model_dump()]))
+
+def run_sweep_request(request: SweepRequest) -> dict:
+    axes = []
+    for axis in ("pclass", "age", "fare", "family_size"):
+        spec = getattr(request, axis)
+        if spec is None:
+            continue
+        if isinstance(spec, SweepRange):
+            values = range_values(spec.start, spec.stop, spec.step, SWEEP_MAX_AXIS_POINTS)
+        else:
+            values = np.array(sorted(set(spec)), dtype=np.float64)
+            if not len(values):
+                raise SweepError(f"{axis} needs at least one value")
+        axes.append((axis, values))
+    if not axes:
+        raise SweepError("Specify at least one of pclass, age, fare or family_size")
+    
+    base_row = passenger_matrix(request.passenger)
+    survived, survival_probability, death_probability = score_matrix(base_row)
+    surface = run_sweep(
+        feature_encoder, lambda X: score_matrix(X)[1], base_row[0], axes,
+        chunk_rows=SWEEP_CHUNK_ROWS, max_cells=SWEEP_MAX_CELLS,
+    )
+    return {
+        "base": {
+            "survived": int(survived[0]),
+            "survival_probability": float(survival_probability[0]),
+            "death_probability": float(death_probability[0]),
+        },
+        "axes": {axis: values.tolist() for axis, values in axes},
+        "shape": list(surface.shape),
+        "total_points": int(surface.size),
+        "survival_probability": surface,
+    }
+
 # API endpoints
 @app.get("/", response_model=HealthResponse)
 async def root():
@@ -155,8 +519,69 @@ async def health_check():
         model_loaded=model_loaded
     )
 
+async def predict_with_version(version: str, passenger: PassengerData) -> Optional[dict]:
+    """Score one passenger with a non-primary version; None if it cannot be loaded"""
+    try:
+        # The first request for a version loads it, so stay off the event loop
+        model_version = await run_in_threadpool(model_registry.get, version)
+    except Exception as e:
+        model_registry.stats(version).errors += 1
+        logger.warning("Model version not available, answering with the primary",
+                       extra=log_fields(version=version, error=str(e)))
+        return None
+    
+    started = time.perf_counter()
+    try:
+        survived, survival_probability, death_probability = model_version.score(
+            records_to_columns([passenger.model_dump()])
+        )
+    except FeatureEncodingError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    model_registry.record_served(version, time.perf_counter() - started)
+    return {
+        "survived": int(survived[0]),
+        "survival_probability": float(survival_probability[0]),
+        "death_probability": float(death_probability[0]),
+    }
+
+def predict_primary(passenger: PassengerData, explain: bool = False) -> dict:
+    """Score one passenger with the primary model, as /predict always has"""
+    # Convert Pydantic model to dictionary
+    passenger_dict = {
+        'Pclass': passenger.pclass,
+        'Name': passenger.name,
+        'Sex': passenger.sex,
+        'Age': passenger.age,
+        'SibSp': passenger.sibsp,
+        'Parch': passenger.parch,
+        'Fare': passenger.fare,
+        'Embarked': passenger.embarked
+    }
+    
+    # Preprocess passenger data
+    df_processed = preprocess_passenger(passenger_dict)
+    
+    # Encode features
+    df_encoded = encode_features(df_processed)
+    
+    # Select features
+    X = df_encoded[feature_columns]
+    
+    # Make prediction
+    survival_prob = model.predict_proba(X)[0]
+    prediction = model.predict(X)[0]
+    
+    result = {
+        "survived": int(prediction),
+        "survival_probability": float(survival_prob[1]),
+        "death_probability": float(survival_prob[0]),
+    }
+    if explain:
+        result["explanation"] = explainer.explain_one(X)
+    return result
+
 @app.post("/predict", response_model=PredictionResult)
-async def predict_survival(passenger: PassengerData):
+async def predict_survival(passenger: PassengerData, explain: bool = False):
     """
     Predict survival for a single passenger
     
@@ -168,6 +593,17 @@ async def predict_survival(passenger: PassengerData):
     - **parch**: Number of parents/children aboard
     - **fare**: Ticket fare (optional)
     - **embarked**: Port of embarkation (C, Q, or S)
+    
+    With ``?explain=true`` the response includes per-feature contributions
+    that add up, with ``base_value``, to the survival probability.
+    
+    A share of requests may be answered by a candidate model version (see
+    ``GET /models``); the ``X-Model-Version`` response header names the
+    version that answered. Explained requests always use the primary model.
+    
+    Primary-model answers come from a cache shared by all workers on the
+    host when the same encoded features were scored before (see
+    ``GET /prediction-cache``).
     """
     if not model_loaded:
         raise HTTPException(
@@ -175,43 +611,367 @@ async def predict_survival(passenger: PassengerData):
             detail="ML model not available"
         )
     
+    version = model_registry.route(request_id_var.get())
+    if version != model_registry.primary.name and not explain:
+        result = await predict_with_version(version, passenger)
+        if result is not None:
+            record_prediction(passenger.model_dump(), result, version)
+            response = wire.json_response(result)
+            response.headers["X-Model-Version"] = version
+            return response
+    
     try:
-        # Convert Pydantic model to dictionary
-        passenger_dict = {
-            'Pclass': passenger.pclass,
-            'Name': passenger.name,
-            'Sex': passenger.sex,
-            'Age': passenger.age,
-            'SibSp': passenger.sibsp,
-            'Parch': passenger.parch,
-            'Fare': passenger.fare,
-            'Embarked': passenger.embarked
-        }
-        
-        # Preprocess passenger data
-        df_processed = preprocess_passenger(passenger_dict)
+        started = time.perf_counter()
+        result = None
+        if prediction_cache is not None and not explain:
+            features = passenger_matrix(passenger)[0]
+            result = prediction_cache.get(features)
+        if result is None:
+            result = predict_primary(passenger, explain)
+            if prediction_cache is not None and not explain:
+                prediction_cache.put(features, result)
+        model_registry.record_served(model_registry.primary.name, time.perf_counter() - started)
+        record_prediction(passenger.model_dump(), result, model_registry.primary.name)
+        if model_registry.shadow is not None:
+            model_registry.submit_shadow(
+                records_to_columns([passenger.model_dump()]), result["survived"], result["survival_probability"]
+            )
+        response = wire.json_response(result)
+        response.headers["X-Model-Version"] = model_registry.primary.name
+        return response
         
-        # Encode features
-        df_encoded = encode_features(df_processed)
-        
-        # Select features
-        X = df_encoded[feature_columns]
-        
-        # Make prediction
-        survival_prob = model.predict_proba(X)[0]
-        prediction = model.predict(X)[0]
-        
-        return PredictionResult(
-            survived=int(prediction),
-            survival_probability=float(survival_prob[1]),
-            death_probability=float(survival_prob[0])
+    except FeatureEncodingError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction failed: {str(e)}"
         )
-        
+
+@app.post("/predict/batch", response_model=BatchPredictionResult)
+async def predict_batch(request: Request, explain: bool = False):
+    """
+    Predict survival for many passengers in one request
+
+    The body format is chosen with ``Content-Type`` and the response format
+    with ``Accept`` (defaulting to the request format):
+
+    - **application/json**: ``{"passengers": [...]}`` or ``{"columns": {...}}``
+    - **application/msgpack**: same shapes as JSON; the response is columnar
+    - **application/vnd.apache.arrow.stream**: an Arrow IPC stream with one
+      column per passenger field; the response is an Arrow record batch
+    - **text/csv**: a header row with the passenger fields
+
+    ``?explain=true`` adds per-feature contributions for every passenger.
+    """
+    if not model_loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="ML model not available"
+        )
+    
+    try:
+        content_type = wire.normalize_media_type(request.headers.get("content-type"))
+    except wire.UnsupportedMediaType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    try:
+        accept_type = wire.negotiate(request.headers.get("accept"), default=content_type)
+    except wire.UnsupportedMediaType as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    
+    body = await request.body()
+    try:
+        content = await run_in_threadpool(score_batch_body, body, content_type, accept_type, explain)
+    except FeatureEncodingError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Prediction failed: {str(e)}"
         )
+    return Response(content=content, media_type=accept_type)
+
+@app.post("/predict/sweep", response_model=SweepResult)
+async def predict_sweep(request: SweepRequest):
+    """
+    What-if sweep: score a base passenger across a grid of variations
+
+    - **passenger**: the base passenger
+    - **pclass**: classes to try, e.g. ``[1, 2, 3]``
+    - **age** / **fare**: inclusive ranges, e.g. ``{"start": 10, "stop": 60, "step": 5}``
+    - **family_size**: family sizes to try (1 = travelling alone)
+
+    Every combination is scored; ``survival_probability`` has one nesting
+    level per swept axis, in the order pclass, age, fare, family_size.
+    """
+    if not model_loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="ML model not available"
+        )
+    
+    try:
+        result = await run_in_threadpool(run_sweep_request, request)
+    except (SweepError, FeatureEncodingError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return wire.json_response(result)
+
+@app.post("/predict/counterfactual", response_model=CounterfactualResult)
+async def predict_counterfactual(passenger: PassengerData, max_candidates: int = 5000):
+    """
+    Find the smallest realistic change that makes a passenger survive
+
+    Only class, fare, port of embarkation and family composition are changed;
+    the answer changes as few of these as possible, and among those the one
+    closest to the original passenger. ``status`` is ``found``, ``not_found``
+    (within ``max_candidates`` scored candidates) or ``already_survives``.
+    """
+    if not model_loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="ML model not available"
+        )
+    if not 1 <= max_candidates <= MAX_COUNTERFACTUAL_CANDIDATES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"max_candidates must be between 1 and {MAX_COUNTERFACTUAL_CANDIDATES}"
+        )
+    
+    try:
+        result = await run_in_threadpool(counterfactual_search.search, passenger.model_dump(), max_candidates)
+    except FeatureEncodingError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return wire.json_response(result)
+
+@app.post("/similar", response_model=SimilarResult)
+async def similar_passengers_endpoint(passenger: PassengerData, k: int = 5):
+    """
+    The k most similar real passengers from the training data, with their outcomes
+
+    Similarity is Euclidean distance over the standardized model features.
+    """
+    if similar_passengers is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Similarity index not available; run ml-model/train.py"
+        )
+    if not 1 <= k <= MAX_SIMILAR:
+        raise HTTPException(status_code=422, detail=f"k must be between 1 and {MAX_SIMILAR}")
+    
+    try:
+        neighbors = similar_passengers.query(passenger_matrix(passenger), k)
+    except FeatureEncodingError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return wire.json_response({
+        "neighbors": neighbors,
+        "survival_rate": sum(n["survived"] for n in neighbors) / len(neighbors),
+    })
+
+def split_values(values: List[str]) -> List[str]:
+    """Query parameter values, allowing both repeated and comma-separated forms"""
+    return [value.strip() for item in values for value in item.split(",") if value.strip()]
+
+@app.get("/cohorts", response_model=CohortResult)
+async def cohorts(request: Request):
+    """
+    Survival statistics of passenger cohorts in the training data
+
+    - **group_by**: dimensions to break the result down by, e.g. ``group_by=sex,pclass``
+    - any dimension as a filter, e.g. ``sex=female&age_group=Child,Teen``
+
+    Dimensions: sex, pclass, age_group, fare_group, embarked, title
+    (labels are listed by ``GET /cohorts/dimensions``).
+    """
+    if cohort_cube is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Cohort cube not available; run ml-model/train.py"
+        )
+    
+    params = request.query_params
+    group_by = split_values(params.getlist("group_by"))
+    filters = {key: split_values(params.getlist(key)) for key in params.keys() if key != "group_by"}
+    try:
+        return wire.json_response(cohort_cube.query(filters, group_by))
+    except CohortQueryError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get("/cohorts/dimensions")
+async def cohort_dimensions():
+    """Cohort dimensions and their labels"""
+    if cohort_cube is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Cohort cube not available; run ml-model/train.py"
+        )
+    return cohort_cube.labels
+
+@app.get("/models", response_model=ModelsResult)
+async def list_models():
+    """
+    Model versions, traffic routing, and per-version latency and shadow agreement
+
+    ``served`` is the latency of requests a version answered. ``shadow`` is
+    the latency of shadow scoring and how often the shadow predicted the same
+    class as the primary (``agreement_rate``), with the mean and largest
+    difference in survival probability.
+    """
+    if not model_loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="ML model not available"
+        )
+    return wire.json_response(await run_in_threadpool(model_registry.summary))
+
+@app.put("/models/routing", response_model=ModelsResult)
+async def update_model_routing(routing: RoutingConfig):
+    """
+    Route a share of ``/predict`` traffic to a candidate and choose the shadow version
+
+    - **candidate**: version answering ``candidate_percent`` percent of requests
+    - **candidate_percent**: 0 to 100
+    - **shadow**: version that also scores every request the primary answers,
+      in the background; ``null`` turns shadow scoring off
+    """
+    if not model_loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="ML model not available"
+        )
+    try:
+        model_registry.set_routing(routing.candidate, routing.candidate_percent, routing.shadow)
+    except UnknownModelVersion as e:
+        raise HTTPException(status_code=422, detail=f"Unknown model version: {e.args[0]}")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return wire.json_response(await run_in_threadpool(model_registry.summary))
+
+@app.get("/prediction-cache")
+async def prediction_cache_stats():
+    """Size and occupancy of the shared /predict cache, and this worker's hits and misses"""
+    if prediction_cache is None:
+        raise HTTPException(status_code=404, detail="The prediction cache is disabled")
+    return await run_in_threadpool(prediction_cache.stats)
+
+@app.get("/prediction-log")
+async def prediction_log_stats():
+    """Rows logged, written to disk, dropped on overflow, and still buffered"""
+    if prediction_log is None:
+        raise HTTPException(status_code=404, detail="Prediction logging is disabled")
+    return prediction_log.stats()
+
+@app.get("/admission")
+async def admission_stats():
+    """Rate and concurrency limits, requests in flight, and admitted, rate-limited and shed counts per class"""
+    if admission_controller is None:
+        raise HTTPException(status_code=404, detail="Admission control is disabled")
+    return admission_controller.summary()
+
+@app.get("/drift")
+async def input_drift():
+    """
+    How far recent ``/predict`` and ``/predict/batch`` inputs have drifted from the training data
+
+    Per input (age, fare, pclass, sex, embarked, title): the population
+    stability index (``psi``), for age and fare the largest gap between the
+    cumulative distributions (``ks``) and the share of missing values, and a
+    ``status`` of ``stable`` (PSI below 0.1), ``moderate``, ``significant``
+    (0.25 and above) or ``insufficient_data``. ``drifted`` lists the inputs
+    with a significant shift.
+    """
+    if drift_monitor is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Drift monitor not available; run ml-model/train.py"
+        )
+    return wire.json_response(await run_in_threadpool(drift_monitor.summary))
+
+def get_job_or_404(job_id: str) -> dict:
+    try:
+        return job_manager.get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def create_job(request: Request):
+    """
+    Submit a dataset for background scoring
+
+    Accepts the same bodies as ``/predict/batch`` plus ``text/csv`` with a
+    header row. Returns a job ID to poll at ``GET /jobs/{job_id}``.
+    """
+    if not model_loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="ML model not available"
+        )
+    
+    try:
+        content_type = wire.normalize_media_type(request.headers.get("content-type"))
+    except wire.UnsupportedMediaType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    
+    max_bytes = job_manager.max_upload_bytes(content_type)
+    too_large = HTTPException(status_code=413, detail=f"{content_type} job bodies are limited to {max_bytes} bytes")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise too_large
+    
+    # Spool the body to disk so large uploads are never held in memory; writes
+    # are batched and run off the event loop
+    fd, input_path = tempfile.mkstemp(dir=job_manager.jobs_dir, suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            size = 0
+            pending = []
+            pending_bytes = 0
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+                if pending_bytes >= JOB_UPLOAD_WRITE_BYTES:
+                    await run_in_threadpool(f.writelines, pending)
+                    pending, pending_bytes = [], 0
+            await run_in_threadpool(f.writelines, pending)
+        job = await run_in_threadpool(job_manager.create, input_path, content_type)
+    finally:
+        if os.path.exists(input_path):
+            os.remove(input_path)
+    return wire.json_response(job, status_code=202)
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """Job status and progress"""
+    return wire.json_response(await run_in_threadpool(get_job_or_404, job_id))
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, request: Request):
+    """Download the predictions of a finished job (format chosen with ``Accept``)"""
+    try:
+        accept_type = wire.negotiate(request.headers.get("accept"), default=wire.JSON)
+    except wire.UnsupportedMediaType as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    
+    try:
+        content = await run_in_threadpool(job_manager.result, job_id, accept_type)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    except JobNotReady as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(content=content, media_type=accept_type)
+
+@app.delete("/jobs/{job_id}", response_model=JobStatus)
+async def delete_job(job_id: str):
+    """Cancel a queued or running job, or delete a finished one"""
+    job = await run_in_threadpool(get_job_or_404, job_id)
+    if job["status"] in ACTIVE_STATES:
+        return wire.json_response(await run_in_threadpool(job_manager.cancel, job_id), status_code=202)
+    await run_in_threadpool(job_manager.delete, job_id)
+    return Response(status_code=204)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,160 @@
+"""
+Interactive latency under a bulk flood, with and without admission control (utils/admission.py).
+
+Sends the app (in process, through httpx's ASGI transport) a steady stream
+of ``/predict`` requests from one client, as the Java UI sends them, while
+``--bulk-clients`` clients, each with ``--bulk-concurrency`` connections,
+post ``/predict/batch`` requests of ``--batch-rows`` passengers back to back.
+A rejected bulk request is retried after ``--bulk-backoff`` seconds,
+ignoring ``Retry-After`` as a greedy client would. Each mode runs in its own
+process:
+
+- ``off``: ``ADMISSION_CONTROL=0``
+- ``on``: the default limits, or those set in the environment
+
+For each mode the benchmark reports the interactive latency percentiles and
+the share of interactive requests answered, and the bulk rows scored and
+requests rejected. Fails (exit code 1) when, with admission control on,
+interactive requests are rejected or their p99 latency is not lower than
+without it.
+
+Usage (from fastapi-backend/, after ml-model/train.py):
+    python perf/bench_admission.py --seconds 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+async def flood(args) -> dict:
+    import asyncio
+    import contextlib
+    import io
+
+    import httpx
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    from bench_wire_formats import make_passengers
+
+    passengers = make_passengers(max(args.batch_rows, 1000))
+    batch = json.dumps({"passengers": passengers[:args.batch_rows]})
+    deadline = time.monotonic() + args.seconds
+    latencies, interactive_status, bulk_status = [], {}, {}
+    bulk_rows = 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench",
+                                 timeout=None) as client:
+        async def interactive(passenger):
+            started = time.perf_counter()
+            response = await client.post("/predict", json=passenger, headers={"X-API-Key": "java-ui"})
+            interactive_status[response.status_code] = interactive_status.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+
+        async def bulk(key):
+            nonlocal bulk_rows
+            while time.monotonic() < deadline:
+                response = await client.post("/predict/batch", content=batch, headers={
+                    "Content-Type": "application/json", "X-API-Key": key,
+                })
+                bulk_status[response.status_code] = bulk_status.get(response.status_code, 0) + 1
+                if response.status_code == 200:
+                    bulk_rows += args.batch_rows
+                else:
+                    await asyncio.sleep(args.bulk_backoff)
+
+        workers = [
+            asyncio.create_task(bulk(f"bulk-{c}"))
+            for c in range(args.bulk_clients) for _ in range(args.bulk_concurrency)
+        ]
+        pending, i = [], 0
+        next_at = time.monotonic()
+        while next_at < deadline:
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            pending.append(asyncio.create_task(interactive(passengers[i % len(passengers)])))
+            i += 1
+            next_at += 1 / args.interactive_rate
+        await asyncio.gather(*pending, *workers)
+
+    latencies = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    return {
+        "interactive_sent": i,
+        "interactive_ok": interactive_status.get(200, 0),
+        "interactive_status": interactive_status,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(np.max(latencies)),
+        "bulk_rows_per_s": bulk_rows / args.seconds,
+        "bulk_status": bulk_status,
+        "admission": app.admission_controller.summary() if app.admission_controller is not None else None,
+    }
+
+def run_mode(mode: str, args) -> dict:
+    env = {
+        **os.environ,
+        "ADMISSION_CONTROL": "1" if mode == "on" else "0",
+        "LOG_LEVEL": "WARNING", "PREDICTION_LOG": "0", "PREDICTION_CACHE_SLOTS": "0",
+        # Every simulated client shares one address, so they are told apart by key
+        "ADMISSION_API_KEYS": ",".join(["java-ui"] + [f"bulk-{c}" for c in range(args.bulk_clients)]),
+    }
+    command = [sys.executable, os.path.abspath(__file__), "--child",
+               "--seconds", str(args.seconds), "--interactive-rate", str(args.interactive_rate),
+               "--bulk-clients", str(args.bulk_clients), "--bulk-concurrency", str(args.bulk_concurrency),
+               "--batch-rows", str(args.batch_rows), "--bulk-backoff", str(args.bulk_backoff)]
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--interactive-rate", type=float, default=5, help="/predict requests per second")
+    parser.add_argument("--bulk-clients", type=int, default=4)
+    parser.add_argument("--bulk-concurrency", type=int, default=4, help="Connections per bulk client")
+    parser.add_argument("--batch-rows", type=int, default=2000)
+    parser.add_argument("--bulk-backoff", type=float, default=0.05, help="Seconds before retrying a rejection")
+    parser.add_argument("--modes", default="off,on")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        import asyncio
+        import warnings
+
+        warnings.filterwarnings("ignore")
+        print(json.dumps(asyncio.run(flood(args))))
+        return 0
+
+    print(f"/predict at {args.interactive_rate:g}/s against {args.bulk_clients} bulk clients x "
+          f"{args.bulk_concurrency} connections of {args.batch_rows}-row batches, {args.seconds:g} s")
+    print(f"{'admission':<11}{'answered':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+          f"{'bulk rows/s':>13}  bulk statuses")
+    results = {}
+    for mode in args.modes.split(","):
+        results[mode] = r = run_mode(mode, args)
+        statuses = " ".join(f"{code}:{count}" for code, count in sorted(r["bulk_status"].items()))
+        print(f"{mode:<11}{r['interactive_ok'] / max(r['interactive_sent'], 1):>10.1%}{r['p50_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}{r['bulk_rows_per_s']:>13.0f}  {statuses}")
+
+    failed = False
+    if "on" in results:
+        on = results["on"]
+        if on["interactive_ok"] < on["interactive_sent"]:
+            print(f"FAIL {on['interactive_sent'] - on['interactive_ok']} interactive requests were rejected "
+                  f"({on['interactive_status']})")
+            failed = True
+        if "off" in results and not on["p99_ms"] < results["off"]["p99_ms"]:
+            print("FAIL admission control does not lower the interactive p99 latency")
+            failed = True
+    return int(failed)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Compare serving the sklearn forest with the compact export (MODEL_FORMAT=compact).
+
+For each format, a fresh process loads the model and scores one request, and
+reports how much its resident memory grew, split into private pages and
+pages shared with other processes (the compact arrays are memory-mapped, so
+every uvicorn worker maps the same page-cache copy). Scoring latency is then
+compared by batch size, and the compact forest must predict the same class
+for every row, with probabilities within ``--tolerance``.
+
+Usage (from fastapi-backend/, after ml-model/train.py):
+    python perf/bench_compact_forest.py --rows 65536
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+warnings.filterwarnings("ignore")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_PATH = os.path.join(BACKEND_DIR, "..", "ml-model", "models")
+
+# Loads one model format and prints the memory it added: RSS, private and shared KiB
+MEASURE_LOAD = """
+import sys
+sys.path.insert(0, {backend_dir!r})
+import numpy as np
+from utils.forest import load_model
+
+def memory():
+    fields = {{}}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0].endswith(':') and len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    private = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    return fields['Rss'], private, shared
+
+before = memory()
+model = load_model({models_path!r}, {model_format!r})
+model.predict_proba(np.zeros((1, model.n_features_in_)))
+after = memory()
+print(*(a - b for a, b in zip(after, before)))
+"""
+
+def load_memory(model_format: str) -> tuple[int, int, int]:
+    code = MEASURE_LOAD.format(backend_dir=BACKEND_DIR, models_path=MODELS_PATH, model_format=model_format)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    rss, private, shared = (int(value) for value in result.stdout.split()[-3:])
+    return rss, private, shared
+
+def median_ms(fn, repeat: int) -> float:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return float(np.median(samples))
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=65536)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    import pickle
+
+    from bench_wire_formats import make_passengers
+    from utils.features import FeatureEncoder, records_to_columns, score_rows
+    from utils.forest import load_model
+
+    print("Memory added by loading the model and scoring one row (KiB):")
+    print(f"{'format':<10}{'rss':>10}{'private':>10}{'shared':>10}")
+    for model_format in ("sklearn", "compact"):
+        rss, private, shared = load_memory(model_format)
+        print(f"{model_format:<10}{rss:>10}{private:>10}{shared:>10}")
+
+    with open(os.path.join(MODELS_PATH, "encoders.pkl"), "rb") as f:
+        encoders = pickle.load(f)
+    with open(os.path.join(MODELS_PATH, "feature_columns.pkl"), "rb") as f:
+        feature_columns = pickle.load(f)
+    X = FeatureEncoder(encoders, feature_columns).encode(records_to_columns(make_passengers(args.rows)))
+    sklearn_model = load_model(MODELS_PATH, "sklearn")
+    compact_model = load_model(MODELS_PATH, "compact")
+
+    print("\nScoring latency, median ms (score_rows):")
+    print(f"{'rows':>8}{'sklearn':>10}{'compact':>10}")
+    for n in (1, 16, 256, 1024, 8192, args.rows):
+        if n > args.rows:
+            continue
+        repeat = 50 if n <= 1024 else 5
+        sklearn_ms = median_ms(lambda: score_rows(sklearn_model, X[:n]), repeat)
+        compact_ms = median_ms(lambda: score_rows(compact_model, X[:n]), repeat)
+        print(f"{n:>8}{sklearn_ms:>10.2f}{compact_ms:>10.2f}")
+
+    expected = sklearn_model.predict_proba(X)
+    actual = compact_model.predict_proba(X)
+    changed = int((expected.argmax(axis=1) != actual.argmax(axis=1)).sum())
+    error = float(np.abs(expected - actual).max())
+    print(f"\n{args.rows} rows: {changed} predicted classes changed, max probability error {error:.2e}")
+    if changed or error > args.tolerance:
+        print("FAIL compact forest disagrees with the sklearn forest")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
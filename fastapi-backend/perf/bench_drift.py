@@ -0,0 +1,109 @@
+"""
+Cost and sensitivity of the input drift monitor (utils/drift.py).
+
+Times ``DriftMonitor.observe`` (one passenger, as ``/predict`` records it)
+and ``observe_batch`` (a batch with its encoded feature matrix, as
+``/predict/batch`` records it), per passenger and per input. Then replays
+the training passengers, which must score as stable, and the same passengers
+with fares tripled and everyone in first class, which must be flagged.
+Fails (exit code 1) when recording costs more than ``--max-update-ns`` per
+input or either check goes the wrong way.
+
+Usage (from fastapi-backend/, after ml-model/train.py):
+    python perf/bench_drift.py --passengers 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+warnings.filterwarnings("ignore")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_PATH = os.path.join(BACKEND_DIR, "..", "ml-model", "models")
+TRAIN_FILE = os.path.join(BACKEND_DIR, "..", "ml-model", "data", "train.csv")
+
+def training_passengers() -> list[dict]:
+    import pandas as pd
+
+    df = pd.read_csv(TRAIN_FILE)
+    df = df.astype(object).where(df.notna(), None)
+    return [
+        {"pclass": row.Pclass, "name": row.Name, "sex": row.Sex, "age": row.Age, "sibsp": row.SibSp,
+         "parch": row.Parch, "fare": row.Fare, "embarked": row.Embarked or "S"}
+        for row in df.itertuples()
+    ]
+
+def min_ns(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        fn()
+        best = min(best, time.perf_counter_ns() - started)
+    return best
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--passengers", type=int, default=100_000)
+    parser.add_argument("--batch-rows", type=int, default=1024)
+    parser.add_argument("--max-update-ns", type=float, default=1000)
+    args = parser.parse_args()
+
+    import pickle
+
+    from bench_wire_formats import make_passengers
+    from utils.drift import DriftMonitor
+    from utils.features import FeatureEncoder, records_to_columns
+
+    with open(os.path.join(MODELS_PATH, "encoders.pkl"), "rb") as f:
+        encoders = pickle.load(f)
+    with open(os.path.join(MODELS_PATH, "feature_columns.pkl"), "rb") as f:
+        feature_columns = pickle.load(f)
+    encoder = FeatureEncoder(encoders, feature_columns)
+    reference_path = os.path.join(MODELS_PATH, "drift_reference.pkl")
+    monitor = DriftMonitor.load(reference_path, encoder)
+    n_inputs = len(monitor.inputs)
+
+    passengers = make_passengers(args.passengers)
+    single_ns = min_ns(lambda: [monitor.observe(p) for p in passengers]) / len(passengers)
+    columns = records_to_columns(passengers[:args.batch_rows])
+    X = encoder.encode(columns)
+    batch_ns = min_ns(lambda: monitor.observe_batch(columns, X), 50) / args.batch_rows
+    summary_ms = min_ns(monitor.summary, 20) / 1e6
+
+    print(f"{'':<24}{'per passenger':>16}{'per input':>12}")
+    print(f"{'observe':<24}{single_ns:>13.0f} ns{single_ns / n_inputs:>9.0f} ns")
+    print(f"{f'observe_batch ({args.batch_rows} rows)':<24}{batch_ns:>13.0f} ns{batch_ns / n_inputs:>9.0f} ns")
+    print(f"summary: {summary_ms:.2f} ms")
+
+    failed = False
+    if max(single_ns, batch_ns) / n_inputs > args.max_update_ns:
+        print(f"FAIL recording an input costs more than {args.max_update_ns:.0f} ns")
+        failed = True
+
+    if not os.path.exists(TRAIN_FILE):
+        print(f"Skipping the sensitivity check: {TRAIN_FILE} not found")
+        return int(failed)
+    training = training_passengers()
+    shifted = [{**p, "pclass": 1, "fare": None if p["fare"] is None else p["fare"] * 3} for p in training]
+    for label, rows, expect_drift in (("training passengers", training, False), ("shifted passengers", shifted, True)):
+        monitor = DriftMonitor.load(reference_path, encoder)
+        for p in rows:
+            monitor.observe(p)
+        summary = monitor.summary()
+        scores = "  ".join(
+            f"{name} {s['psi']:.3f}" + (f"/{s['ks']:.3f}" if s.get("ks") is not None else "")
+            for name, s in summary["inputs"].items()
+        )
+        print(f"\n{label}: PSI (/KS) {scores}\ndrifted: {summary['drifted'] or 'none'}")
+        if bool(summary["drifted"]) != expect_drift or (expect_drift and not {"pclass", "fare"} <= set(summary["drifted"])):
+            print(f"FAIL drift {'not ' if expect_drift else ''}detected for {label}")
+            failed = True
+    return int(failed)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Shared-memory prediction cache (utils/prediction_cache.py) against per-process caching.
+
+Starts ``--workers`` processes that import the app, as uvicorn workers do,
+and sends each a random share of the same request stream: passengers drawn
+from a Zipf distribution over ``--population`` distinct passengers, so a few
+are asked about often and most rarely. The ``/predict`` handler is called
+directly in three modes:
+
+- ``none``: no cache
+- ``per-process``: each worker has its own LRU cache of ``--slots`` entries
+- ``shared``: all workers use one shared table of ``--slots`` entries
+
+For each mode the benchmark reports the hit rate, the CPU time the handler
+takes per request (wall-clock latency on a busy host also counts the other
+workers' time slices), the median latency, and the memory held by the caches. In shared mode, a sample of cached answers is
+checked against a fresh prediction. Fails (exit code 1) when a cached answer
+differs or the shared cache's hit rate is below the per-process one.
+
+Usage (from fastapi-backend/, after ml-model/train.py):
+    python perf/bench_prediction_cache.py --workers 4 --requests 20000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CHECKED_REQUESTS = 200
+
+class LocalCache:
+    """Per-process LRU cache with the interface of ``SharedPredictionCache``"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: OrderedDict[bytes, dict] = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, features):
+        result = self.entries.get(features.tobytes())
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(features.tobytes())
+        self.hits += 1
+        return result
+
+    def put(self, features, result):
+        self.entries[features.tobytes()] = result
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def nbytes(self) -> int:
+        size = sys.getsizeof(self.entries)
+        for key, value in self.entries.items():
+            size += sys.getsizeof(key) + sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value.values())
+        return size
+
+def worker(mode: str, segment: str, slots: int, passengers: list, requests: list, barrier, results) -> None:
+    warnings.filterwarnings("ignore")
+    os.environ.update({
+        "LOG_LEVEL": "WARNING", "PREDICTION_LOG": "0", "DRIFT_MONITOR": "0",
+        "PREDICTION_CACHE_NAME": segment, "PREDICTION_CACHE_SLOTS": str(slots if mode == "shared" else 0),
+    })
+    import asyncio
+    import contextlib
+    import io
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    if mode == "per-process":
+        app.prediction_cache = LocalCache(slots)
+    loop = asyncio.new_event_loop()
+    models = [app.PassengerData(**p) for p in passengers]
+
+    barrier.wait()
+    latencies = np.empty(len(requests))
+    cpu = np.empty(len(requests))
+    answers = []
+    for i, index in enumerate(requests):
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        response = loop.run_until_complete(app.predict_survival(models[index]))
+        latencies[i] = time.perf_counter() - started
+        cpu[i] = time.thread_time() - cpu_started
+        if i >= len(requests) - CHECKED_REQUESTS:
+            answers.append((index, json.loads(response.body)))
+
+    mismatches = 0
+    for index, answer in answers:
+        fresh = app.predict_primary(models[index])
+        mismatches += answer != fresh
+    cache = app.prediction_cache
+    results.put({
+        "latencies": latencies,
+        "cpu": cpu,
+        "hits": getattr(cache, "hits", 0),
+        "misses": getattr(cache, "misses", 0),
+        "nbytes": cache.nbytes() if mode == "per-process" else getattr(cache, "nbytes", 0),
+        "mismatches": mismatches,
+    })
+    if mode == "shared":
+        cache.close()
+
+def run(mode: str, segment: str, args, passengers: list, stream: np.ndarray) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(args.workers)
+    results = context.Queue()
+    # Requests are spread over workers at random, as the kernel spreads connections
+    owner = np.random.default_rng(1).integers(0, args.workers, len(stream))
+    processes = [
+        context.Process(target=worker, args=(mode, segment, args.slots, passengers, stream[owner == w].tolist(),
+                                             barrier, results))
+        for w in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    latencies = np.concatenate([r["latencies"] for r in reports]) * 1000
+    cpu = np.concatenate([r["cpu"] for r in reports]) * 1000
+    hits = sum(r["hits"] for r in reports)
+    lookups = hits + sum(r["misses"] for r in reports)
+    return {
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "cpu_ms": float(cpu.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        # Per-process caches add up; the shared table is held once
+        "nbytes": max(r["nbytes"] for r in reports) if mode == "shared" else sum(r["nbytes"] for r in reports),
+        "mismatches": sum(r["mismatches"] for r in reports),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20000, help="Requests per mode, over all workers")
+    parser.add_argument("--population", type=int, default=50000, help="Distinct passengers")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of passenger popularity")
+    parser.add_argument("--slots", type=int, default=4096, help="Entries per cache")
+    parser.add_argument("--modes", default="none,per-process,shared")
+    args = parser.parse_args()
+
+    # bench_wire_formats imports the app; keep it from attaching to the default segment
+    os.environ["PREDICTION_CACHE_SLOTS"] = "0"
+    from bench_wire_formats import make_passengers
+
+    passengers = make_passengers(args.population)
+    rng = np.random.default_rng(0)
+    stream = (rng.zipf(args.zipf, args.requests * 2) - 1)
+    stream = stream[stream < args.population][:args.requests]
+    distinct = len(np.unique(stream))
+
+    print(f"{args.requests} requests for {distinct} distinct passengers over {args.workers} workers, "
+          f"{args.slots} entries per cache")
+    print(f"{'mode':<14}{'hit rate':>10}{'CPU ms/request':>16}{'p50 ms':>10}{'cache MiB':>11}")
+    segment = f"titanic-predictions-bench-{os.getpid()}"
+    results = {}
+    try:
+        for mode in args.modes.split(","):
+            results[mode] = result = run(mode, segment, args, passengers, stream)
+            print(f"{mode:<14}{result['hit_rate']:>10.1%}{result['cpu_ms']:>16.3f}{result['p50_ms']:>10.3f}"
+                  f"{result['nbytes'] / 2**20:>11.2f}")
+    finally:
+        try:
+            from multiprocessing import shared_memory
+
+            shared_memory.SharedMemory(segment).unlink()
+        except FileNotFoundError:
+            pass
+
+    failed = False
+    if any(result["mismatches"] for result in results.values()):
+        print("FAIL a cached answer differs from a fresh prediction")
+        failed = True
+    if "shared" in results and "per-process" in results and \
+            results["shared"]["hit_rate"] < results["per-process"]["hit_rate"]:
+        print("FAIL the shared cache hits less often than per-process caches")
+        failed = True
+    return int(failed)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Latency cost of the prediction log (utils/prediction_log.py).
+
+Calls the ``/predict`` handler and the batch scoring path directly (no HTTP
+client, so the logging cost is not diluted) with logging switched on and
+off in alternating blocks, so drift and background activity affect both
+modes alike. The flusher thread runs and writes to a temporary directory
+during the measurement. A p99 from a few thousand calls moves by several
+percent between identical runs on a busy machine, so the comparison is
+repeated ``--rounds`` times and the median cost is reported. Fails (exit
+code 1) when logging adds more than ``--max-overhead`` to the p99 latency
+of either path.
+
+Calls are paced to keep the serving thread busy ``--utilization`` of the
+time, as a server with headroom would be; the flusher does its work in the
+gaps. At ``--utilization 1`` requests run back to back, and on a single CPU
+every millisecond the flusher spends writing is added to some request.
+
+Usage (from fastapi-backend/, after ml-model/train.py):
+    python perf/bench_prediction_log.py --rounds 3 --format parquet
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+warnings.filterwarnings("ignore")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+def measure(call, prediction_log, app, samples: int, block: int, utilization: float) -> dict:
+    """Latencies in ms with logging on and off, alternating every ``block`` calls"""
+    latencies = {"off": [], "on": []}
+    for start in range(0, 2 * samples, block):
+        mode = "on" if (start // block) % 2 else "off"
+        app.prediction_log = prediction_log if mode == "on" else None
+        for _ in range(block):
+            started = time.perf_counter()
+            call()
+            elapsed = time.perf_counter() - started
+            latencies[mode].append(elapsed * 1000)
+            time.sleep(elapsed * (1 / utilization - 1))
+    app.prediction_log = prediction_log
+    return {mode: np.array(values) for mode, values in latencies.items()}
+
+def report(label: str, rounds: list) -> float:
+    """Print p50/p99 per round and return the median p99 cost"""
+    overheads = []
+    for i, latencies in enumerate(rounds, 1):
+        p50 = {mode: np.percentile(values, 50) for mode, values in latencies.items()}
+        p99 = {mode: np.percentile(values, 99) for mode, values in latencies.items()}
+        overheads.append(p99["on"] / p99["off"] - 1)
+        print(f"{label:<16}{i:>6}{p50['off']:>9.3f}{p50['on']:>9.3f}{p99['off']:>9.3f}{p99['on']:>9.3f}"
+              f"{overheads[-1]:>+10.1%}")
+    overhead = float(np.median(overheads))
+    print(f"{label:<16}{'median p99 cost':>46}{overhead:>+10.1%}")
+    return overhead
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Single predictions per mode and round")
+    parser.add_argument("--batches", type=int, default=1000, help="Batch requests per mode and round")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--batch-rows", type=int, default=1024)
+    parser.add_argument("--format", choices=["parquet", "sqlite"], default="parquet")
+    parser.add_argument("--utilization", type=float, default=0.5,
+                        help="Share of the time the serving thread is busy (1 = back to back)")
+    parser.add_argument("--max-overhead", type=float, default=0.05)
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(prefix="titanic-prediction-log-")
+    os.environ["PREDICTION_LOG_DIR"] = log_dir
+    os.environ["PREDICTION_LOG_FORMAT"] = args.format
+    os.environ["PREDICTION_LOG"] = "1"
+
+    import app
+    from bench_wire_formats import make_passengers
+    from utils import wire
+
+    prediction_log = app.prediction_log
+    prediction_log.start()
+    app.model_registry.start()
+    loop = asyncio.new_event_loop()
+    try:
+        passengers = [app.PassengerData(**p) for p in make_passengers(256)]
+        counter = iter(range(10**9))
+
+        def predict_one():
+            loop.run_until_complete(app.predict_survival(passengers[next(counter) % len(passengers)]))
+
+        body = wire.dumps({"passengers": make_passengers(args.batch_rows)})
+
+        def predict_batch():
+            app.score_batch_body(body, wire.JSON, wire.JSON)
+
+        for _ in range(50):
+            predict_one()
+            predict_batch()
+
+        print(f"Latency in ms at {args.utilization:.0%} utilization, prediction log {args.format}")
+        print(f"{'':<16}{'round':>6}{'p50 off':>9}{'p50 on':>9}{'p99 off':>9}{'p99 on':>9}{'p99 cost':>10}")
+        overheads = [
+            report("/predict", [
+                measure(predict_one, prediction_log, app, args.requests, 10, args.utilization)
+                for _ in range(args.rounds)
+            ]),
+            report(f"batch of {args.batch_rows}", [
+                measure(predict_batch, prediction_log, app, args.batches, 10, args.utilization)
+                for _ in range(args.rounds)
+            ]),
+        ]
+    finally:
+        loop.close()
+        app.model_registry.shutdown()
+        prediction_log.shutdown()
+        files = os.listdir(log_dir)
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+    stats = prediction_log.stats()
+    print(f"\nLogged {stats['logged']} rows, wrote {stats['written']} to {len(files)} file(s), dropped {stats['dropped']}")
+    if max(overheads) > args.max_overhead:
+        print(f"FAIL logging adds more than {args.max_overhead:.0%} to p99 latency")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Compare batch scoring wire formats: bytes on the wire and CPU per 10k rows.
+
+For each format the benchmark measures, on the server side, decoding the
+request into feature columns plus encoding them into the model matrix
+("decode"), and serializing the predictions ("encode"). Model inference is
+the same for every format and is reported once for reference.
+
+``json+pydantic`` is the baseline of validating every row as a
+``PassengerData`` model and building the DataFrame row by row.
+
+Usage (from fastapi-backend/, with a trained model in ../ml-model/models):
+    python perf/bench_wire_formats.py --rows 10000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings("ignore")
+
+import app
+from utils import wire
+
+NAMES = ["Braund, Mr. Owen", "Cumings, Mrs. John", "Heikkinen, Miss. Laina",
+         "Palsson, Master. Gosta", "Uruchurtu, Don. Manuel", "Byles, Rev. Thomas"]
+
+def make_passengers(n: int, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    passengers = []
+    for i in range(n):
+        passengers.append({
+            "pclass": int(rng.integers(1, 4)),
+            "name": NAMES[i % len(NAMES)],
+            "sex": "female" if rng.random() < 0.35 else "male",
+            "age": None if rng.random() < 0.2 else round(float(rng.uniform(1, 80)), 1),
+            "sibsp": int(rng.poisson(0.5)),
+            "parch": int(rng.poisson(0.4)),
+            "fare": round(float(rng.lognormal(3, 1)), 2),
+            "embarked": str(rng.choice(["S", "C", "Q"], p=[0.72, 0.19, 0.09])),
+        })
+    return passengers
+
+def request_bodies(passengers: list[dict]) -> dict[str, bytes]:
+    columns = {field: [p[field] for p in passengers] for field in passengers[0]}
+    bodies = {
+        "json": wire.dumps({"passengers": passengers}),
+        "json-columns": wire.dumps({"columns": columns}),
+    }
+    if wire.msgpack is not None:
+        bodies["msgpack"] = wire.msgpack.packb({"columns": columns})
+    if wire.pa is not None:
+        pa = wire.pa
+        table = pa.table({
+            "pclass": pa.array(columns["pclass"], pa.int8()),
+            "name": pa.array(columns["name"]).dictionary_encode(),
+            "sex": pa.array(columns["sex"]).dictionary_encode(),
+            "age": pa.array(columns["age"], pa.float64()),
+            "sibsp": pa.array(columns["sibsp"], pa.int8()),
+            "parch": pa.array(columns["parch"], pa.int8()),
+            "fare": pa.array(columns["fare"], pa.float64()),
+            "embarked": pa.array(columns["embarked"]).dictionary_encode(),
+        })
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        bodies["arrow"] = sink.getvalue().to_pybytes()
+    return bodies
+
+MEDIA_TYPES = {
+    "json": wire.JSON,
+    "json-columns": wire.JSON,
+    "msgpack": wire.MSGPACK,
+    "arrow": wire.ARROW,
+}
+
+def cpu_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        best = min(best, time.process_time() - started)
+    return best * 1000
+
+def pydantic_baseline(body: bytes) -> None:
+    passengers = [app.PassengerData(**p) for p in json.loads(body)["passengers"]]
+    df = app.pd.concat([
+        app.preprocess_passenger({
+            "Pclass": p.pclass, "Name": p.name, "Sex": p.sex, "Age": p.age,
+            "SibSp": p.sibsp, "Parch": p.parch, "Fare": p.fare, "Embarked": p.embarked,
+        }) for p in passengers[:500]
+    ])
+    app.encode_features(df)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch scoring wire formats")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if not app.model_loaded:
+        sys.exit("Model not loaded; run ml-model/train.py first")
+
+    passengers = make_passengers(args.rows)
+    bodies = request_bodies(passengers)
+    scale = 10000 / args.rows
+
+    X = app.feature_encoder.encode(wire.decode_batch(bodies["json"], wire.JSON))
+    survived, p_survived, p_died = app.score_matrix(X)
+    inference = cpu_ms(lambda: app.score_matrix(X), args.repeat) * scale
+
+    print(f"rows={args.rows}, figures scaled to 10k rows; model inference: {inference:.1f} ms CPU\n")
+    print(f"{'format':<15}{'request KB':>12}{'response KB':>13}{'decode ms':>11}{'encode ms':>11}")
+    for name, body in bodies.items():
+        media_type = MEDIA_TYPES[name]
+        decode = cpu_ms(lambda: app.feature_encoder.encode(wire.decode_batch(body, media_type)), args.repeat)
+        response = wire.encode_batch_result(survived, p_survived, p_died, media_type)
+        encode = cpu_ms(lambda: wire.encode_batch_result(survived, p_survived, p_died, media_type), args.repeat)
+        print(
+            f"{name:<15}{len(body) * scale / 1024:>12.1f}{len(response) * scale / 1024:>13.1f}"
+            f"{decode * scale:>11.1f}{encode * scale:>11.1f}"
+        )
+
+    # The per-row pandas path is slow, so it is timed on 500 rows and extrapolated
+    baseline = cpu_ms(lambda: pydantic_baseline(bodies["json"]), 1)
+    print(f"{'json+pydantic':<15}{len(bodies['json']) * scale / 1024:>12.1f}{'':>13}"
+          f"{baseline * 10000 / 500:>11.1f}{'':>11}  (per-row validation + DataFrame, extrapolated)")
+
+if __name__ == "__main__":
+    main()
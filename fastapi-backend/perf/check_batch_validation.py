@@ -0,0 +1,89 @@
+"""
+Batch validation check: malformed and empty batches get a client error or an empty result.
+
+Posts in-process to /predict/batch and fails (exit code 1) when:
+
+- a column with fewer or more values than ``pclass`` (e.g. one ``name`` for
+  two passengers, which numpy would broadcast) is not rejected with 422
+- a scalar in place of a column is not rejected with 422
+- an empty batch (``{"passengers": []}``, empty columns, a header-only CSV,
+  with and without ``?explain=true``) does not return 200 with no predictions
+
+Usage (from fastapi-backend/, with a trained model in ../ml-model/models):
+    python perf/check_batch_validation.py
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import warnings
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings("ignore")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("ADMISSION_CONTROL", "0")
+
+CSV_HEADER = "pclass,name,sex,age,sibsp,parch,fare,embarked\n"
+
+# name, request body, content type, expected status
+REJECTED = [
+    ("short name column", {"columns": {"pclass": [1, 2], "name": ["A, Mr. B"], "sex": ["male", "female"]}}),
+    ("short sex column", {"columns": {"pclass": [1, 2], "name": ["A, Mr. B", "C, Mrs. D"], "sex": ["male"]}}),
+    ("long embarked column", {"columns": {"pclass": [1], "name": ["A, Mr. B"], "sex": ["male"],
+                                          "embarked": ["S", "C"]}}),
+    ("short age column", {"columns": {"pclass": [1, 2], "name": ["A, Mr. B", "C, Mrs. D"],
+                                      "sex": ["male", "female"], "age": [30]}}),
+    ("scalar columns", {"columns": {"pclass": 1, "name": "A, Mr. B", "sex": "male"}}),
+    ("scalar fare column", {"columns": {"pclass": [1], "name": ["A, Mr. B"], "sex": ["male"], "fare": 7.25}}),
+]
+
+EMPTY = [
+    ("no passengers", json.dumps({"passengers": []}), "application/json"),
+    ("empty columns", json.dumps({"columns": {"pclass": [], "name": [], "sex": []}}), "application/json"),
+    ("header-only CSV", CSV_HEADER, "text/csv"),
+]
+
+async def run(client) -> list[str]:
+    failures = []
+    for name, body in REJECTED:
+        response = await client.post("/predict/batch", json=body)
+        print(f"{name:<22} {response.status_code} {response.json().get('detail')}")
+        if response.status_code != 422:
+            failures.append(f"{name}: status {response.status_code}, expected 422")
+
+    for name, body, content_type in EMPTY:
+        for explain in (False, True):
+            response = await client.post("/predict/batch", content=body, params={"explain": explain},
+                                         headers={"Content-Type": content_type, "Accept": "application/json"})
+            label = f"{name}{' (explain)' if explain else ''}"
+            print(f"{label:<22} {response.status_code} {response.text[:80]}")
+            if response.status_code != 200:
+                failures.append(f"{label}: status {response.status_code}, expected 200")
+            elif response.json()["predictions"] != []:
+                failures.append(f"{label}: predictions are not empty")
+    return failures
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check that malformed and empty batches are handled")
+    parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+
+    async def main_async():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://check") as client:
+            return await run(client)
+
+    failures = asyncio.run(main_async())
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
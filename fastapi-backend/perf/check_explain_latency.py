@@ -0,0 +1,106 @@
+"""
+Latency budget check for ``?explain=true``.
+
+Fails (exit code 1) when:
+
+- explaining one passenger adds more than ``--single-budget-ms`` to a
+  single ``/predict`` call: the p95 of ``explain_one`` minus the p95 of
+  scoring the same row. Both walk the forest, so this is the explanation's
+  own cost (table lookups and building the response), not the predict time
+- explaining a batch costs more than ``--batch-ratio`` times scoring it
+- contributions plus ``base_value`` do not add up to the predicted
+  survival probability
+
+Usage (from fastapi-backend/, with a trained model in ../ml-model/models):
+    python perf/check_explain_latency.py --rows 10000
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+warnings.filterwarnings("ignore")
+
+import app
+from bench_wire_formats import make_passengers
+from utils import wire
+from utils.features import records_to_columns
+
+def paired_timings_ms(a, b, repeat: int) -> tuple[np.ndarray, np.ndarray]:
+    """Timings of two functions run alternately, so both see the same machine state"""
+    samples_a, samples_b = [], []
+    for _ in range(repeat):
+        for fn, samples in ((a, samples_a), (b, samples_b)):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+    return np.array(samples_a), np.array(samples_b)
+
+def timings_ms(fn, repeat: int) -> np.ndarray:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return np.array(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the latency budget of explanations")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--single-budget-ms", type=float, default=10.0)
+    parser.add_argument("--batch-ratio", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if not app.model_loaded:
+        sys.exit("Model not loaded; run ml-model/train.py first")
+
+    X = app.feature_encoder.encode(records_to_columns(make_passengers(args.rows)))
+    failures = []
+
+    _, survival_probability, _ = app.score_matrix(X)
+    contributions = app.explainer.contributions(X)
+    error = np.abs(contributions.sum(axis=1) + app.explainer.base_value - survival_probability).max()
+    print(f"additivity: max |base + sum(contributions) - P(survived)| = {error:.2e}")
+    if error > 1e-9:
+        failures.append("contributions do not add up to the prediction")
+
+    row = X[:1]
+    predict_single, explain_single = paired_timings_ms(
+        lambda: app.score_matrix(row), lambda: app.explainer.explain_one(row), args.repeat
+    )
+    predict_p95, explain_p95 = np.percentile(predict_single, 95), np.percentile(explain_single, 95)
+    added = explain_p95 - predict_p95
+    print(f"single: predict p95 {predict_p95:.2f} ms, explain p95 {explain_p95:.2f} ms, "
+          f"added {added:.2f} ms (budget {args.single_budget_ms} ms)")
+    if added > args.single_budget_ms:
+        failures.append(f"single explanation adds {added:.2f} ms at p95, budget {args.single_budget_ms} ms")
+
+    repeat = max(3, args.repeat // 10)
+    predict_batch = np.median(timings_ms(lambda: app.score_matrix(X), repeat))
+    explain_batch = np.median(timings_ms(lambda: app.explainer.contributions(X), repeat))
+    ratio = explain_batch / predict_batch
+    print(f"batch of {args.rows}: predict {predict_batch:.1f} ms, explain {explain_batch:.1f} ms, "
+          f"ratio {ratio:.2f} (budget {args.batch_ratio})")
+    if ratio > args.batch_ratio:
+        failures.append(f"batch explanation costs {ratio:.2f}x a prediction, budget {args.batch_ratio}x")
+
+    encoded = timings_ms(lambda: wire.encode_batch_result(
+        *app.score_matrix(X), wire.JSON, contributions=contributions,
+        feature_names=app.feature_columns, base_value=app.explainer.base_value,
+    ), repeat)
+    print(f"batch JSON response with contributions: {np.median(encoded):.1f} ms")
+
+    if failures:
+        print("\nFAILED:\n- " + "\n- ".join(failures))
+        sys.exit(1)
+    print("\nOK: explanations are within budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Admission control: per-client rate limits, priority classes and load shedding.
+
+Every request to a prediction endpoint is sorted into a priority class:
+
+- **interactive**: one passenger at a time, as the Java UI and the chatbot
+  send them (``/predict``, ``/predict/counterfactual``, ``/similar``,
+  ``/cohorts``)
+- **bulk**: many rows per request (``/predict/batch``, ``/predict/sweep``,
+  ``POST /jobs``). A client may also mark an interactive request as bulk
+  with ``X-Priority: bulk``; it cannot promote a bulk one
+
+A request then passes two checks, both kept in process memory:
+
+- **Rate limit**: a token bucket per client and class, refilled at
+  ``rate`` requests per second up to ``burst``. A client is its
+  ``X-API-Key`` if the key is one of the configured ``api_keys``, or else
+  its address: an unknown key is ignored, so a client cannot get a fresh
+  bucket by sending a new key with every request. ``X-Real-IP`` (set by
+  nginx) is only believed from the ``trusted_proxies`` networks. An empty bucket is
+  answered with 429 and ``Retry-After``. Only the ``max_clients`` most
+  recently seen buckets are kept; a forgotten client comes back with a full
+  bucket
+- **Concurrency limit**: at most ``max_concurrency`` admitted requests are in
+  flight, of which at most ``max_bulk`` are bulk, so bulk work never holds
+  every slot. A bulk request over its limit is answered with 503 at once.
+  An interactive request waits in a FIFO queue for up to
+  ``queue_timeout`` seconds and is answered with 503 if no slot frees up;
+  shedding early keeps the requests that are admitted fast instead of
+  letting every request slow down together
+
+Other endpoints (health, metrics, job status) are never limited. The
+controller runs on the event loop, so its state needs no lock. Counters of
+admitted and rejected requests are served by ``GET /admission``.
+"""
+
+import asyncio
+import ipaddress
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from starlette.requests import Request
+
+from utils import wire
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+CLASSES = (INTERACTIVE, BULK)
+
+# (method, path) -> class; paths are matched exactly, so /jobs/{id} polls are not limited
+ENDPOINT_CLASSES = {
+    ("POST", "/predict"): INTERACTIVE,
+    ("POST", "/predict/counterfactual"): INTERACTIVE,
+    ("POST", "/similar"): INTERACTIVE,
+    ("GET", "/cohorts"): INTERACTIVE,
+    ("POST", "/predict/batch"): BULK,
+    ("POST", "/predict/sweep"): BULK,
+    ("POST", "/jobs"): BULK,
+}
+API_KEY_HEADER = "X-API-Key"
+PRIORITY_HEADER = "X-Priority"
+REAL_IP_HEADER = "X-Real-IP"
+TOP_REJECTED_CLIENTS = 10
+
+def _display_client(client: str) -> str:
+    """A client ID safe to show: API keys are secrets, so only their first characters are kept"""
+    if client.startswith("key:"):
+        return client[:8] + "..."
+    return client
+
+class TokenBucket:
+    """Requests a client may still send in one class; refilled lazily on each take"""
+
+    __slots__ = ("tokens", "updated", "rejected")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+        self.rejected = 0
+
+    def take(self, now: float, rate: float, burst: float) -> float:
+        """Take one token; 0 if one was there, else the seconds until one will be"""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        self.rejected += 1
+        return (1 - self.tokens) / rate
+
+class ClassStats:
+    __slots__ = ("admitted", "rate_limited", "shed", "queued", "in_flight", "peak_in_flight")
+
+    def __init__(self):
+        self.admitted = self.rate_limited = self.shed = self.queued = 0
+        self.in_flight = self.peak_in_flight = 0
+
+class AdmissionController:
+    """HTTP middleware applying rate limits and concurrency limits per priority class"""
+
+    def __init__(self, rates: dict, bursts: dict, max_concurrency: int = 64, max_bulk: int = 4,
+                 queue_timeout: float = 0.25, max_queue: int = 256, max_clients: int = 10_000,
+                 trusted_proxies: str = "", api_keys: str = ""):
+        if max_concurrency < 1 or max_bulk < 1:
+            raise ValueError("max_concurrency and max_bulk must be at least 1")
+        for cls in CLASSES:
+            if rates[cls] > 0 and bursts[cls] < 1:
+                raise ValueError(f"The {cls} burst must be at least 1")
+        # A rate of 0 turns the class's rate limit off
+        self.rates = {cls: float(rates[cls]) for cls in CLASSES}
+        self.bursts = {cls: float(bursts[cls]) for cls in CLASSES}
+        self.max_concurrency = max_concurrency
+        self.max_bulk = min(max_bulk, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.max_clients = max_clients
+        self.trusted_proxies = [
+            ipaddress.ip_network(network.strip(), strict=False)
+            for network in trusted_proxies.split(",") if network.strip()
+        ]
+        self.api_keys = frozenset(key.strip() for key in api_keys.split(",") if key.strip())
+        self._buckets: OrderedDict[tuple[str, str], TokenBucket] = OrderedDict()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._in_flight = 0
+        self.stats = {cls: ClassStats() for cls in CLASSES}
+
+    def classify(self, request: Request) -> Optional[str]:
+        cls = ENDPOINT_CLASSES.get((request.method, request.url.path))
+        if cls == INTERACTIVE and request.headers.get(PRIORITY_HEADER, "").strip().lower() == BULK:
+            return BULK
+        return cls
+
+    def client_id(self, request: Request) -> str:
+        api_key = request.headers.get(API_KEY_HEADER)
+        if api_key and api_key in self.api_keys:
+            return f"key:{api_key}"
+        host = request.client.host if request.client else "unknown"
+        real_ip = request.headers.get(REAL_IP_HEADER)
+        if real_ip and self.trusted_proxies:
+            try:
+                address = ipaddress.ip_address(host)
+            except ValueError:
+                address = None
+            if address is not None and any(address in network for network in self.trusted_proxies):
+                host = real_ip.strip()
+        return f"ip:{host}"
+
+    def _take_token(self, client: str, cls: str, now: float) -> float:
+        rate = self.rates[cls]
+        if rate <= 0:
+            return 0.0
+        key = (client, cls)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.bursts[cls], now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(now, rate, self.bursts[cls])
+
+    def _has_slot(self, cls: str) -> bool:
+        if self._in_flight >= self.max_concurrency:
+            return False
+        return cls != BULK or self.stats[BULK].in_flight < self.max_bulk
+
+    def _occupy(self, cls: str) -> None:
+        self._in_flight += 1
+        stats = self.stats[cls]
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+
+    def _release(self, cls: str) -> None:
+        self._in_flight -= 1
+        self.stats[cls].in_flight -= 1
+        # Hand the freed slot straight to the oldest waiter, so no arrival can take it first
+        while self._waiters and self._in_flight < self.max_concurrency:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._occupy(INTERACTIVE)
+                waiter.set_result(None)
+
+    async def _acquire(self, cls: str) -> bool:
+        """Take a slot for the request, waiting for one if it is interactive"""
+        # Queued interactive requests are served first; arrivals do not overtake them
+        if self._has_slot(cls) and (cls == BULK or not self._waiters):
+            self._occupy(cls)
+            return True
+        if cls == BULK or self.queue_timeout <= 0 or len(self._waiters) >= self.max_queue:
+            return False
+        self.stats[cls].queued += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            # The slot may have been handed over just as the wait timed out
+            return waiter.done()
+        except asyncio.CancelledError:
+            # The client went away; give back a slot it was handed
+            if waiter.done():
+                self._release(cls)
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+                self._waiters.remove(waiter)
+
+    async def __call__(self, request: Request, call_next):
+        cls = self.classify(request)
+        if cls is None:
+            return await call_next(request)
+        stats = self.stats[cls]
+
+        retry_after = self._take_token(self.client_id(request), cls, time.monotonic())
+        if retry_after:
+            stats.rate_limited += 1
+            return self._reject(429, f"Rate limit exceeded for {cls} requests", retry_after)
+
+        if not await self._acquire(cls):
+            stats.shed += 1
+            return self._reject(503, f"Server busy; {cls} request not admitted", 1.0)
+        stats.admitted += 1
+        try:
+            return await call_next(request)
+        finally:
+            self._release(cls)
+
+    @staticmethod
+    def _reject(status_code: int, detail: str, retry_after: float):
+        response = wire.json_response({"detail": detail}, status_code=status_code)
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def summary(self) -> dict:
+        """Limits, requests in flight and waiting, and admitted and rejected counts per class"""
+        top = sorted(
+            ((bucket.rejected, client, cls) for (client, cls), bucket in self._buckets.items() if bucket.rejected),
+            reverse=True,
+        )[:TOP_REJECTED_CLIENTS]
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_bulk": self.max_bulk,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "clients": len(self._buckets),
+            "classes": {
+                cls: {
+                    "rate": self.rates[cls],
+                    "burst": self.bursts[cls],
+                    "admitted": stats.admitted,
+                    "rate_limited": stats.rate_limited,
+                    "shed": stats.shed,
+                    "queued": stats.queued,
+                    "in_flight": stats.in_flight,
+                    "peak_in_flight": stats.peak_in_flight,
+                }
+                for cls, stats in self.stats.items()
+            },
+            "top_rejected_clients": [
+                {"client": _display_client(client), "class": cls, "rate_limited": rejected}
+                for rejected, client, cls in top
+            ],
+        }
@@ -0,0 +1,87 @@
+"""
+Cohort survival statistics.
+
+``ml-model/train.py`` saves ``cohort_cube.pkl``: passenger and survivor
+counts for every combination of sex, class, age group, fare group, port and
+title (a dense array of a couple of thousand cells). Slices, roll-ups and
+drill-downs are answered straight from those arrays with NumPy ``take`` and
+``sum``, with no pandas at request time.
+"""
+
+import pickle
+from typing import Mapping, Sequence
+
+import numpy as np
+
+class CohortQueryError(ValueError):
+    """Raised for unknown dimensions or labels"""
+
+class CohortCube:
+    """Counts and survivors over the cohort dimensions"""
+
+    def __init__(self, cube: dict):
+        self.dimensions = list(cube["dimensions"])
+        self.labels = {dim: list(cube["labels"][dim]) for dim in self.dimensions}
+        self.label_index = {dim: {label: i for i, label in enumerate(labels)} for dim, labels in self.labels.items()}
+        self.counts = np.asarray(cube["counts"], dtype=np.int64)
+        self.survivors = np.asarray(cube["survivors"], dtype=np.int64)
+
+    @classmethod
+    def load(cls, path: str) -> "CohortCube":
+        with open(path, "rb") as f:
+            return cls(pickle.load(f))
+
+    def query(self, filters: Mapping[str, Sequence[str]], group_by: Sequence[str]) -> dict:
+        """Restrict dimensions to the ``filters`` labels, then sum out every dimension not in ``group_by``"""
+        unknown = [dim for dim in list(filters) + list(group_by) if dim not in self.label_index]
+        if unknown:
+            raise CohortQueryError(f"Unknown dimension: {unknown[0]}; expected one of {', '.join(self.dimensions)}")
+        if len(set(group_by)) != len(group_by):
+            raise CohortQueryError("Duplicate dimension in group_by")
+
+        counts, survivors = self.counts, self.survivors
+        labels = dict(self.labels)
+        for axis, dim in enumerate(self.dimensions):
+            if dim not in filters:
+                continue
+            try:
+                index = [self.label_index[dim][label] for label in filters[dim]]
+            except KeyError as e:
+                raise CohortQueryError(
+                    f"Unknown {dim} value: {e.args[0]!r}; expected one of {', '.join(self.labels[dim])}"
+                ) from None
+            counts = np.take(counts, index, axis=axis)
+            survivors = np.take(survivors, index, axis=axis)
+            labels[dim] = [self.labels[dim][i] for i in index]
+
+        summed = tuple(axis for axis, dim in enumerate(self.dimensions) if dim not in group_by)
+        counts = counts.sum(axis=summed)
+        survivors = survivors.sum(axis=summed)
+        # Summing keeps cube order; put the axes in the requested group_by order
+        kept = [dim for dim in self.dimensions if dim in group_by]
+        order = [kept.index(dim) for dim in group_by]
+        counts = np.transpose(counts, order)
+        survivors = np.transpose(survivors, order)
+
+        if not group_by:
+            # A full roll-up: a single group holding the whole slice
+            counts, survivors = counts.reshape(1), survivors.reshape(1)
+
+        groups = []
+        for index in zip(*np.nonzero(counts)):
+            count = int(counts[index])
+            survived = int(survivors[index])
+            group = {dim: labels[dim][i] for dim, i in zip(group_by, index)}
+            group.update(count=count, survivors=survived, survival_rate=survived / count)
+            groups.append(group)
+
+        total = int(counts.sum())
+        total_survivors = int(survivors.sum())
+        return {
+            "filters": {dim: list(values) for dim, values in filters.items()},
+            "group_by": list(group_by),
+            "count": total,
+            "survivors": total_survivors,
+            "survival_rate": total_survivors / total if total else None,
+            "groups": groups,
+        }
@@ -0,0 +1,230 @@
+"""
+Counterfactual search: the smallest realistic change that flips a prediction.
+
+Only features a passenger could plausibly have chosen differently are
+changed, as four groups:
+
+- ``pclass``: another class
+- ``fare``: another ticket price
+- ``embarked``: another port
+- ``family``: a different number of siblings/spouses and parents/children
+
+Candidates are generated level by level: every single-group change first,
+then every pair, and so on. The search stops at the first level that
+contains a flip, so the answer changes as few groups as possible. Within a
+level, candidates are sorted by distance from the passenger (a stable sort,
+so ties keep generation order). They are scored in growing chunks, and the
+first flip is the answer. This makes the result deterministic and usually
+avoids scoring most of the level.
+
+Options are pruned against the forest. A tree only compares a feature with
+its split thresholds, so two values that fall between the same thresholds of
+every feature they set always score the same. Each group keeps one option
+per distinct routing, the closest one, and drops options that route like the
+passenger's own values. For fare, the options are representative prices of
+the intervals between the forest's Fare splits, spread evenly on a log scale
+from £1 to £512.
+
+Candidate rows are gathered from encoded per-option columns around the
+passenger's encoded row; nothing is re-encoded per candidate.
+"""
+
+import itertools
+from typing import Mapping
+
+import numpy as np
+
+from .features import FeatureEncoder, fare_group_labels, records_to_columns, score_rows
+from .forest import tree_arrays
+
+GROUPS = ("pclass", "fare", "embarked", "family")
+PORTS = ("S", "C", "Q")
+MAX_FAMILY_MEMBERS = 4
+MAX_FARE = 512.0
+FARE_OPTIONS = 48
+# Candidates are scored in chunks that double from FIRST_CHUNK up to MAX_CHUNK rows
+FIRST_CHUNK = 256
+MAX_CHUNK = 1024
+
+def split_thresholds(model, feature_index: int) -> np.ndarray:
+    """Sorted distinct thresholds the forest compares a feature with"""
+    thresholds = [tree.threshold[tree.feature == feature_index] for tree in tree_arrays(model)]
+    return np.unique(np.concatenate(thresholds))
+
+class OptionTable:
+    """Alternative values of one group with their encoded columns and distances"""
+
+    def __init__(self, values: list, columns: dict[str, np.ndarray], distances: np.ndarray):
+        self.values = values
+        self.columns = columns
+        self.distances = distances
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+class CounterfactualSearch:
+    """Find the fewest feature-group changes that make a passenger survive"""
+
+    def __init__(self, model, encoder: FeatureEncoder):
+        self.model = model
+        self.encoder = encoder
+        self.thresholds = {
+            name: split_thresholds(model, index) for name, index in encoder.column_index.items()
+        }
+        fare_edges = np.concatenate([[0.0], self.thresholds["Fare"][self.thresholds["Fare"] < MAX_FARE], [MAX_FARE]])
+        # Trees go left when value <= threshold, so any fare in (a, b] routes the same way
+        midpoints = np.unique(np.round((fare_edges[:-1] + fare_edges[1:]) / 2, 2))
+        targets = np.geomspace(1.0, MAX_FARE, FARE_OPTIONS)
+        nearest = np.abs(np.log(midpoints[None, :]) - np.log(targets[:, None])).argmin(axis=1)
+        self.fares = np.unique(midpoints[nearest])
+
+    def score(self, X: np.ndarray):
+        return score_rows(self.model, X)
+
+    def _routing(self, columns: Mapping[str, np.ndarray]) -> np.ndarray:
+        """Per option, how many thresholds of each feature its value exceeds"""
+        return np.column_stack([
+            np.searchsorted(self.thresholds[name], values, side="left")
+            for name, values in columns.items()
+        ])
+
+    def _table(self, values: list, columns: dict[str, np.ndarray], distances: np.ndarray,
+               base_row: np.ndarray) -> OptionTable:
+        """Keep the closest option per distinct routing, excluding the passenger's own"""
+        routing = self._routing(columns)
+        base = self._routing({name: base_row[[self.encoder.column_index[name]]] for name in columns})[0]
+        order = np.argsort(distances, kind="stable")
+        seen = {tuple(base)}
+        keep = []
+        for i in order:
+            key = tuple(routing[i])
+            if key not in seen:
+                seen.add(key)
+                keep.append(i)
+        keep = np.array(keep, dtype=np.intp)
+        return OptionTable(
+            [values[i] for i in keep],
+            {name: column[keep] for name, column in columns.items()},
+            distances[keep],
+        )
+
+    def options(self, passenger: Mapping, base_row: np.ndarray) -> dict[str, OptionTable]:
+        """Pruned alternatives of each group, nearest first; distances are at most 1 per group"""
+        encoder = self.encoder
+
+        classes = np.array([1.0, 2.0, 3.0])
+        pclass = self._table(
+            [1, 2, 3], {"Pclass": classes}, np.abs(classes - passenger["pclass"]) / 2, base_row,
+        )
+
+        fare = passenger["fare"] if passenger["fare"] is not None else base_row[encoder.column_index["Fare"]]
+        fares = self.fares
+        fare_table = self._table(
+            fares.tolist(),
+            {"Fare": fares, "FareGroup": encoder.lookup("fare_group", fare_group_labels(fares))},
+            np.minimum(np.abs(np.log1p(fares) - np.log1p(fare)) / np.log1p(MAX_FARE), 1.0),
+            base_row,
+        )
+
+        embarked = self._table(
+            list(PORTS), {"Embarked": encoder.lookup("embarked", PORTS)}, np.full(len(PORTS), 0.5), base_row,
+        )
+
+        pairs = [(s, p) for s in range(MAX_FAMILY_MEMBERS + 1) for p in range(MAX_FAMILY_MEMBERS + 1)]
+        sibsp = np.array([s for s, _ in pairs], dtype=np.float64)
+        parch = np.array([p for _, p in pairs], dtype=np.float64)
+        family_size = sibsp + parch + 1
+        moved = np.abs(sibsp - passenger["sibsp"]) + np.abs(parch - passenger["parch"])
+        family = self._table(
+            [[s, p] for s, p in pairs],
+            {"SibSp": sibsp, "Parch": parch, "FamilySize": family_size,
+             "IsAlone": (family_size == 1).astype(np.float64)},
+            moved / (2 * MAX_FAMILY_MEMBERS), base_row,
+        )
+        return {"pclass": pclass, "fare": fare_table, "embarked": embarked, "family": family}
+
+    def _level(self, options: dict[str, OptionTable], size: int):
+        """All candidates changing ``size`` groups: option index per group (-1 = unchanged) and distance"""
+        choices, distances = [], []
+        for groups in itertools.combinations(GROUPS, size):
+            shape = [len(options[group]) for group in groups]
+            if 0 in shape:
+                continue
+            grid = np.indices(shape).reshape(size, -1)
+            choice = np.full((grid.shape[1], len(GROUPS)), -1, dtype=np.intp)
+            distance = np.zeros(grid.shape[1])
+            for axis, group in enumerate(groups):
+                choice[:, GROUPS.index(group)] = grid[axis]
+                distance += options[group].distances[grid[axis]]
+            choices.append(choice)
+            distances.append(distance)
+        if not choices:
+            return np.empty((0, len(GROUPS)), dtype=np.intp), np.empty(0)
+        return np.concatenate(choices), np.concatenate(distances)
+
+    def _materialize(self, base_row: np.ndarray, options: dict[str, OptionTable], choice: np.ndarray) -> np.ndarray:
+        X = np.repeat(base_row[None, :], len(choice), axis=0)
+        for g, group in enumerate(GROUPS):
+            selected = choice[:, g] >= 0
+            if not selected.any():
+                continue
+            index = choice[selected, g]
+            for name, column in options[group].columns.items():
+                X[selected, self.encoder.column_index[name]] = column[index]
+        return X
+
+    def search(self, passenger: Mapping, max_candidates: int = 5000) -> dict:
+        """Search for a counterfactual; ``passenger`` uses the API field names"""
+        base_row = self.encoder.encode(records_to_columns([passenger]))
+        base_survived, base_probability, _ = self.score(base_row)
+        base_row = base_row[0]
+        result = {
+            "original_survival_probability": float(base_probability[0]),
+            "candidates_evaluated": 0,
+            "changes": {},
+            "passenger": None,
+            "survival_probability": None,
+        }
+        if int(base_survived[0]) == 1:
+            result["status"] = "already_survives"
+            return result
+
+        options = self.options(passenger, base_row)
+        budget = max_candidates
+        for size in range(1, len(GROUPS) + 1):
+            choices, distances = self._level(options, size)
+            order = np.argsort(distances, kind="stable")[:budget]
+            start, chunk = 0, FIRST_CHUNK
+            while start < len(order):
+                batch = choices[order[start:start + chunk]]
+                survived, survival_probability, _ = self.score(self._materialize(base_row, options, batch))
+                result["candidates_evaluated"] += len(batch)
+                flipped = np.flatnonzero(survived == 1)
+                if len(flipped):
+                    return self._found(result, passenger, options, batch[flipped[0]],
+                                       float(survival_probability[flipped[0]]))
+                start += chunk
+                chunk = min(chunk * 2, MAX_CHUNK)
+            budget -= len(order)
+            if budget <= 0:
+                break
+        result["status"] = "not_found"
+        return result
+
+    def _found(self, result: dict, passenger: Mapping, options: dict[str, OptionTable],
+               choice: np.ndarray, survival_probability: float) -> dict:
+        changed = dict(passenger)
+        changes = {}
+        for g, group in enumerate(GROUPS):
+            if choice[g] < 0:
+                continue
+            value = options[group].values[choice[g]]
+            if group == "family":
+                changes[group] = {"from": [passenger["sibsp"], passenger["parch"]], "to": value}
+                changed["sibsp"], changed["parch"] = value
+            else:
+                changes[group] = {"from": passenger[group], "to": value}
+                changed[group] = value
+        result.update(status="found", changes=changes, passenger=changed,
+                      survival_probability=survival_probability)
+        return result
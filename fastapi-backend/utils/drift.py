@@ -0,0 +1,251 @@
+"""
+Input drift: how far the passengers sent for prediction have moved from the training data.
+
+``ml-model/train.py`` saves ``drift_reference.pkl`` with histograms of Age
+and Fare over the training data's percentiles, with missing values counted
+separately, and counts of every class, sex, port and title. ``DriftMonitor``
+keeps the same histograms for served passengers in fixed-size count arrays.
+Memory does not grow with traffic, and recording a passenger costs a binary
+search or a dict lookup per input. The histograms are compared with the
+reference only when the scores are read:
+
+- **PSI** (population stability index) over deciles of the reference for
+  Age and Fare, plus a bin for missing values, and over the categories, plus
+  a bin for values never seen in training. Below 0.1 is usually read as
+  stable, 0.1 to 0.25 as a moderate shift and above 0.25 as a significant one
+- **KS**: the largest difference between the reference and the served
+  cumulative distributions of Age or Fare, taken at the percentile edges
+
+Scores cover the current window and the previous one (``window_seconds``
+each), so they follow recent traffic. Counts are updated without a lock;
+under concurrent updates an increment can occasionally be lost, which does
+not matter for a distribution score.
+"""
+
+import pickle
+import threading
+import time
+from bisect import bisect_right
+from typing import Mapping, Optional
+
+import numpy as np
+
+from utils.features import FIELD_DEFAULTS, FeatureEncoder, extract_title
+
+PSI_BINS = 10
+# Proportions are floored at this value, so an empty bin does not make the PSI infinite
+PSI_EPSILON = 1e-4
+MODERATE_PSI = 0.1
+SIGNIFICANT_PSI = 0.25
+TITLE_CACHE_SIZE = 100_000
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Population stability index between two histograms over the same bins"""
+    e = np.maximum(expected / max(expected.sum(), 1), PSI_EPSILON)
+    a = np.maximum(actual / max(actual.sum(), 1), PSI_EPSILON)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+class NumericInput:
+    """Age or Fare: bin 0 holds missing values, bins 1.. the values between percentile edges"""
+
+    def __init__(self, field: str, reference: Mapping):
+        self.field = field
+        self.edges = [float(edge) for edge in reference["edges"]]
+        self._edges = np.asarray(self.edges, dtype=np.float64)
+        self.reference = np.concatenate([[reference["missing"]], reference["counts"]]).astype(np.int64)
+        self.size = len(self.reference)
+        # Decile of the reference each value bin starts in; PSI compares deciles, not the fine bins
+        values = self.reference[1:]
+        starts = (np.cumsum(values) - values) / max(values.sum(), 1)
+        deciles = np.minimum((starts * PSI_BINS).astype(np.int64), PSI_BINS - 1)
+        self.psi_groups = np.concatenate([[0], 1 + np.unique(deciles, return_inverse=True)[1]])
+
+    def bin(self, value) -> int:
+        if value is None or value != value:
+            return 0
+        return bisect_right(self.edges, value) + 1
+
+    def bincount(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        bins = np.searchsorted(self._edges, values, side="right") + 1
+        bins[np.isnan(values)] = 0
+        return np.bincount(bins, minlength=self.size)
+
+    def scores(self, counts: np.ndarray) -> dict:
+        reference, served = self.reference, counts
+        result = {
+            "psi": psi(np.bincount(self.psi_groups, reference), np.bincount(self.psi_groups, served)),
+            "ks": None,
+            "missing_rate": float(served[0] / served.sum()) if served.sum() else None,
+            "reference_missing_rate": float(reference[0] / max(reference.sum(), 1)),
+        }
+        if served[1:].sum() and reference[1:].sum():
+            reference_cdf = np.cumsum(reference[1:]) / reference[1:].sum()
+            served_cdf = np.cumsum(served[1:]) / served[1:].sum()
+            result["ks"] = float(np.abs(reference_cdf - served_cdf).max())
+        return result
+
+class CategoricalInput:
+    """Class, sex, port or title: one bin per training category and a last bin for anything else"""
+
+    def __init__(self, field: str, reference: Mapping, codes: Optional[Mapping] = None):
+        self.field = field
+        self.labels = list(reference["labels"])
+        self.other = len(self.labels)
+        self.index = {label: i for i, label in enumerate(self.labels)}
+        # Values of this input in the encoded feature matrix (label codes, or Pclass itself)
+        codes = codes if codes is not None else {label: label for label in self.labels}
+        self.code_index = {float(code): self.index.get(label, self.other) for label, code in codes.items()}
+        self.reference = np.append(np.asarray(reference["counts"], dtype=np.int64), 0)
+        self.size = len(self.reference)
+
+    def bin(self, value) -> int:
+        return self.index.get(value, self.other)
+
+    def bincount(self, codes: np.ndarray) -> np.ndarray:
+        values, counts = np.unique(codes, return_counts=True)
+        out = np.zeros(self.size, dtype=np.int64)
+        for value, count in zip(values.tolist(), counts.tolist()):
+            out[self.code_index.get(value, self.other)] += count
+        return out
+
+    def scores(self, counts: np.ndarray) -> dict:
+        total = counts.sum()
+        return {
+            "psi": psi(self.reference, counts),
+            "unseen_rate": float(counts[-1] / total) if total else None,
+        }
+
+class TitleInput(CategoricalInput):
+    """Title, extracted from the name the way the encoder does it"""
+
+    def __init__(self, reference: Mapping, codes: Optional[Mapping] = None):
+        super().__init__("name", reference, codes)
+        self._title_bins: dict[str, int] = {}
+
+    def bin(self, name) -> int:
+        cached = self._title_bins.get(name)
+        if cached is None:
+            cached = self.index.get(extract_title(name), self.other)
+            if len(self._title_bins) < TITLE_CACHE_SIZE:
+                self._title_bins[name] = cached
+        return cached
+
+class Window:
+    """Counts of the passengers seen during one window"""
+
+    def __init__(self, inputs: Mapping):
+        self.started = time.time()
+        self.counts = [[0] * spec.size for spec in inputs.values()]
+
+    @property
+    def rows(self) -> int:
+        return sum(self.counts[0])
+
+class DriftMonitor:
+    """Histograms of served inputs in two rotating windows, scored against the training reference"""
+
+    def __init__(self, reference: Mapping, feature_encoder: Optional[FeatureEncoder] = None,
+                 window_seconds: float = 3600, min_rows: int = 100):
+        if window_seconds <= 0:
+            raise ValueError("window_seconds must be positive")
+        self.reference_rows = int(reference["rows"])
+        self.window_seconds = window_seconds
+        self.min_rows = min_rows
+        codes = feature_encoder.codes if feature_encoder is not None else {}
+        categorical = reference["categorical"]
+        self.inputs = {
+            "age": NumericInput("age", reference["numeric"]["age"]),
+            "fare": NumericInput("fare", reference["numeric"]["fare"]),
+            "pclass": CategoricalInput("pclass", categorical["pclass"]),
+            "sex": CategoricalInput("sex", categorical["sex"], codes.get("sex")),
+            "embarked": CategoricalInput("embarked", categorical["embarked"], codes.get("embarked")),
+            "title": TitleInput(categorical["title"], codes.get("title")),
+        }
+        # Columns of the encoded feature matrix that hold each categorical input
+        self._matrix_columns = {}
+        if feature_encoder is not None:
+            for name, column in (("pclass", "Pclass"), ("sex", "Sex"), ("embarked", "Embarked"), ("title", "Title")):
+                if column in feature_encoder.column_index:
+                    self._matrix_columns[name] = feature_encoder.column_index[column]
+        self._inputs = list(self.inputs.values())
+        self._lock = threading.Lock()
+        self._previous: Optional[Window] = None
+        self._current = Window(self.inputs)
+        self._rotate_at = time.monotonic() + window_seconds
+
+    @classmethod
+    def load(cls, path: str, feature_encoder: Optional[FeatureEncoder] = None, **kwargs) -> "DriftMonitor":
+        with open(path, "rb") as f:
+            return cls(pickle.load(f), feature_encoder, **kwargs)
+
+    def _window(self) -> Window:
+        if time.monotonic() >= self._rotate_at:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._rotate_at:
+                    # After a quiet spell longer than a window the current counts are too old to keep
+                    stale = now >= self._rotate_at + self.window_seconds
+                    self._previous = None if stale else self._current
+                    self._current = Window(self.inputs)
+                    self._rotate_at = now + self.window_seconds
+        return self._current
+
+    def observe(self, passenger: Mapping) -> None:
+        """Count one passenger given with the API field names"""
+        window = self._window()
+        for spec, counts in zip(self._inputs, window.counts):
+            counts[spec.bin(passenger.get(spec.field))] += 1
+
+    def observe_batch(self, columns: Mapping, X: Optional[np.ndarray] = None) -> None:
+        """Count a batch of passenger columns
+
+        With the batch's encoded feature matrix ``X``, class, sex, port and
+        title are counted from their codes instead of the raw values, which
+        spares extracting every title again.
+        """
+        n = len(columns["pclass"])
+        if not n:
+            return
+        window = self._window()
+        for (name, spec), counts in zip(self.inputs.items(), window.counts):
+            if isinstance(spec, NumericInput):
+                values = columns.get(spec.field)
+                batch = spec.bincount(np.full(n, np.nan) if values is None else values)
+            elif X is not None and name in self._matrix_columns:
+                batch = spec.bincount(X[:, self._matrix_columns[name]])
+            else:
+                values = columns.get(spec.field)
+                if values is None:
+                    values = [FIELD_DEFAULTS.get(spec.field)] * n
+                batch = np.bincount([spec.bin(value) for value in values], minlength=spec.size)
+            for i in np.flatnonzero(batch).tolist():
+                counts[i] += int(batch[i])
+
+    def summary(self) -> dict:
+        """PSI (and KS for Age and Fare) of every input over the current and previous windows"""
+        self._window()
+        windows = [window for window in (self._previous, self._current) if window is not None]
+        rows = sum(window.rows for window in windows)
+        inputs = {}
+        for i, (name, spec) in enumerate(self.inputs.items()):
+            counts = np.sum([np.asarray(window.counts[i], dtype=np.int64) for window in windows], axis=0)
+            scores = spec.scores(counts)
+            if rows < self.min_rows:
+                scores["status"] = "insufficient_data"
+            elif scores["psi"] >= SIGNIFICANT_PSI:
+                scores["status"] = "significant"
+            elif scores["psi"] >= MODERATE_PSI:
+                scores["status"] = "moderate"
+            else:
+                scores["status"] = "stable"
+            inputs[name] = scores
+        return {
+            "rows": rows,
+            "reference_rows": self.reference_rows,
+            "since": min(window.started for window in windows),
+            "window_seconds": self.window_seconds,
+            "min_rows": self.min_rows,
+            "drifted": [name for name, scores in inputs.items() if scores["status"] == "significant"],
+            "inputs": inputs,
+        }
@@ -0,0 +1,227 @@
+"""
+Vectorized feature encoding for batches of passengers.
+
+Mirrors ``preprocess_passenger`` and ``encode_features`` in app.py, with every
+row treated the way the single-passenger ``/predict`` endpoint treats it
+(missing Age and Fare become 30, fixed fare bins), but works on whole NumPy
+columns at once instead of building a DataFrame per passenger.
+
+Input columns use the API field names (``pclass``, ``name``, ``sex``, ``age``,
+``sibsp``, ``parch``, ``fare``, ``embarked``); the output is a float64 matrix
+whose columns follow the saved ``feature_columns``.
+"""
+
+import re
+from typing import Mapping, Sequence
+
+import numpy as np
+
+PASSENGER_FIELDS = ("pclass", "name", "sex", "age", "sibsp", "parch", "fare", "embarked")
+REQUIRED_FIELDS = ("pclass", "name", "sex")
+FIELD_DEFAULTS = {"age": None, "sibsp": 0, "parch": 0, "fare": None, "embarked": "S"}
+
+DEFAULT_AGE = 30.0
+DEFAULT_FARE = 30.0
+
+TITLE_PATTERN = re.compile(r" ([A-Za-z]+)\.")
+TITLE_REPLACEMENTS = {
+    **{title: "Rare" for title in ["Lady", "Countess", "Capt", "Col", "Don", "Dr",
+                                   "Major", "Rev", "Sir", "Jonkheer", "Dona"]},
+    "Mlle": "Miss",
+    "Ms": "Miss",
+    "Mme": "Mrs",
+}
+
+# pd.cut bins are right-inclusive; values outside every bin get the fallback label
+AGE_BINS = np.array([0, 12, 18, 35, 60, 100], dtype=np.float64)
+AGE_LABELS = np.array(["Child", "Teen", "Adult", "Middle", "Senior"], dtype=object)
+AGE_FALLBACK = "Adult"
+FARE_BINS = np.array([0, 7.91, 14.45, 31, 1000], dtype=np.float64)
+FARE_LABELS = np.array(["Low", "Medium", "High", "VeryHigh"], dtype=object)
+FARE_FALLBACK = "Medium"
+
+class FeatureEncodingError(ValueError):
+    """Raised when a batch cannot be encoded with the saved encoders"""
+
+def extract_title(name: str) -> str:
+    match = TITLE_PATTERN.search(name) if isinstance(name, str) else None
+    if match is None:
+        return "Mr"
+    title = match.group(1)
+    return TITLE_REPLACEMENTS.get(title, title)
+
+def bin_labels(values: np.ndarray, bins: np.ndarray, labels: np.ndarray, fallback: str) -> np.ndarray:
+    """Vectorized ``pd.cut`` with right-inclusive bins and a fallback label"""
+    index = np.searchsorted(bins, values, side="left") - 1
+    inside = (values > bins[0]) & (values <= bins[-1])
+    out = np.full(len(values), fallback, dtype=object)
+    out[inside] = labels[index[inside]]
+    return out
+
+def age_group_labels(age: np.ndarray) -> np.ndarray:
+    return bin_labels(age, AGE_BINS, AGE_LABELS, AGE_FALLBACK)
+
+def fare_group_labels(fare: np.ndarray) -> np.ndarray:
+    return bin_labels(fare, FARE_BINS, FARE_LABELS, FARE_FALLBACK)
+
+class FeatureEncoder:
+    """Encode passenger columns into model features using the saved encoders"""
+
+    def __init__(self, encoders: Mapping, feature_columns: Sequence[str]):
+        self.feature_columns = list(feature_columns)
+        self.column_index = {name: i for i, name in enumerate(self.feature_columns)}
+        # LabelEncoder.transform is a sorted-array lookup; plain dicts are faster
+        self.codes = {
+            key: {label: code for code, label in enumerate(encoder.classes_)}
+            for key, encoder in encoders.items()
+        }
+        self._title_cache: dict[str, str] = {}
+
+    def lookup(self, key: str, labels) -> np.ndarray:
+        codes = self.codes[key]
+        try:
+            return np.fromiter((codes[label] for label in labels), dtype=np.float64, count=len(labels))
+        except KeyError as e:
+            raise FeatureEncodingError(f"Unknown {key} value: {e.args[0]!r}") from None
+
+    def code(self, key: str, label) -> float:
+        try:
+            return float(self.codes[key][label])
+        except KeyError:
+            raise FeatureEncodingError(f"Unknown {key} value: {label!r}") from None
+
+    def titles(self, names: Sequence[str]) -> list[str]:
+        cache = self._title_cache
+        out = []
+        for name in names:
+            title = cache.get(name)
+            if title is None:
+                title = extract_title(name)
+                if len(cache) < 100_000:
+                    cache[name] = title
+            out.append(title)
+        return out
+
+    def encode(self, columns: Mapping[str, Sequence]) -> np.ndarray:
+        """Encode a batch given as a mapping of field name to column values"""
+        n = batch_length(columns)
+
+        def numeric(field: str, default: float) -> np.ndarray:
+            if columns.get(field) is None:
+                return np.full(n, default, dtype=np.float64)
+            try:
+                values = np.asarray(columns[field], dtype=np.float64)
+            except (TypeError, ValueError):
+                raise FeatureEncodingError(f"Column '{field}' must be numeric") from None
+            if values.shape != (n,):
+                raise FeatureEncodingError(f"Column '{field}' must be a flat array of {n} numbers")
+            return np.where(np.isnan(values), default, values)
+
+        pclass = numeric("pclass", np.nan)
+        if np.isnan(pclass).any():
+            raise FeatureEncodingError("pclass is required for every passenger")
+        age = numeric("age", DEFAULT_AGE)
+        fare = numeric("fare", DEFAULT_FARE)
+        sibsp = numeric("sibsp", 0)
+        parch = numeric("parch", 0)
+        family_size = sibsp + parch + 1
+
+        embarked = columns.get("embarked")
+        if embarked is None:
+            embarked_codes = np.full(n, self.code("embarked", "S"))
+        else:
+            embarked_codes = self.lookup("embarked", [e if isinstance(e, str) else "S" for e in embarked])
+
+        features = {
+            "Pclass": pclass,
+            "Sex": self.lookup("sex", columns["sex"]),
+            "Age": age,
+            "SibSp": sibsp,
+            "Parch": parch,
+            "Fare": fare,
+            "Embarked": embarked_codes,
+            "FamilySize": family_size,
+            "IsAlone": (family_size == 1).astype(np.float64),
+            "Title": self.lookup("title", self.titles(columns["name"])),
+            "AgeGroup": self.lookup("age_group", age_group_labels(age)),
+            "FareGroup": self.lookup("fare_group", fare_group_labels(fare)),
+        }
+        X = np.empty((n, len(self.feature_columns)), dtype=np.float64)
+        for i, name in enumerate(self.feature_columns):
+            X[:, i] = features[name]
+        return X
+
+def batch_length(columns: Mapping[str, Sequence]) -> int:
+    """Number of passengers in a batch of columns, checking that every column has one value each"""
+    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+    if missing:
+        raise FeatureEncodingError(f"Missing required fields: {', '.join(missing)}")
+    # numpy would otherwise broadcast a single value across the batch
+    n = None
+    for field in PASSENGER_FIELDS:
+        values = columns.get(field)
+        if values is None and field not in REQUIRED_FIELDS:
+            continue
+        if not isinstance(values, (list, tuple, np.ndarray)) or np.ndim(values) == 0:
+            raise FeatureEncodingError(f"Column '{field}' must be an array of values")
+        if n is None:
+            n = len(values)
+        elif len(values) != n:
+            raise FeatureEncodingError(f"Column '{field}' has {len(values)} values, expected {n}")
+    return n
+
+def score_matrix(model, feature_columns: Sequence[str], X: np.ndarray):
+    """Score an encoded feature matrix; returns (survived, P(survived), P(died))"""
+    import pandas as pd
+
+    # The forest was fitted on a DataFrame; keep the column names to match
+    proba = model.predict_proba(pd.DataFrame(X, columns=feature_columns))
+    survived = model.classes_[proba.argmax(axis=1)]
+    return survived, proba[:, 1], proba[:, 0]
+
+def score_rows(model, X: np.ndarray):
+    """``score_matrix`` for small batches, without predict_proba's fixed overhead.
+
+    Walks the trees directly in estimator order, normalizing each tree's
+    leaf values like ``DecisionTreeClassifier.predict_proba``, so the result
+    equals the forest's sequential ``predict_proba``. Below about a thousand
+    rows this is several times faster, as it skips DataFrame validation and
+    joblib dispatch. A ``CompactForest`` has no such overhead and is scored
+    directly.
+    """
+    if not hasattr(model, "estimators_"):
+        proba = model.predict_proba(X)
+        survived = model.classes_[proba.argmax(axis=1)]
+        return survived, proba[:, 1], proba[:, 0]
+    X32 = np.ascontiguousarray(X, dtype=np.float32)
+    n_classes = len(model.classes_)
+    proba = np.zeros((len(X32), n_classes))
+    for estimator in model.estimators_:
+        tree_proba = estimator.tree_.predict(X32)
+        if tree_proba.ndim == 3:
+            tree_proba = tree_proba[:, 0, :]
+        tree_proba = tree_proba[:, :n_classes]
+        normalizer = tree_proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba += tree_proba / normalizer
+    proba /= len(model.estimators_)
+    survived = model.classes_[proba.argmax(axis=1)]
+    return survived, proba[:, 1], proba[:, 0]
+
+def records_to_columns(records: Sequence[Mapping]) -> dict[str, list]:
+    """Turn a list of passenger objects into columns, applying field defaults"""
+    columns = {}
+    for field in PASSENGER_FIELDS:
+        if field in REQUIRED_FIELDS:
+            try:
+                columns[field] = [record[field] for record in records]
+            except KeyError:
+                raise FeatureEncodingError(f"Missing required field: {field}") from None
+        else:
+            default = FIELD_DEFAULTS[field]
+            values = [record.get(field, default) for record in records]
+            # JSON null means "unknown" for numeric fields
+            if field in ("sibsp", "parch"):
+                values = [default if v is None else v for v in values]
+            columns[field] = values
+    return columns
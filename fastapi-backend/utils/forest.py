@@ -0,0 +1,155 @@
+"""
+Model loading, and the compact forest exported by ``ml-model/compact_forest.py``.
+
+``MODEL_FORMAT`` selects what workers serve:
+
+- ``sklearn`` (default): ``titanic_model.pkl``
+- ``compact``: ``titanic_model_compact/``, flat node arrays with float32
+  thresholds, int16/int32 indices and quantized probabilities. The arrays
+  are memory-mapped read-only, so all workers on a host share one copy
+
+``CompactForest`` offers the parts of the sklearn interface the service uses
+(``classes_``, ``predict_proba``, ``predict``, ``apply``), and ``tree_arrays``
+gives per-tree node arrays for either kind of model, for the explainer and
+the counterfactual search.
+
+The compact forest walks every tree in lockstep, one vectorized step per
+level: leaves point to themselves, so after ``max_depth`` steps every row
+has reached its leaf in every tree.
+"""
+
+import json
+import os
+import pickle
+from typing import Iterator, NamedTuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+COMPACT_MODEL_DIR = "titanic_model_compact"
+# Rows walked at once; bounds the (rows x trees) temporaries
+APPLY_CHUNK_ROWS = 4096
+
+class TreeArrays(NamedTuple):
+    """One tree's nodes with sklearn conventions: leaves have children -1 and feature -2"""
+    children_left: np.ndarray
+    children_right: np.ndarray
+    feature: np.ndarray
+    threshold: np.ndarray
+    value: np.ndarray  # P(positive class) at every node
+
+class CompactForest:
+    """Binary random forest over flat, compact node arrays"""
+
+    def __init__(self, arrays: dict, meta: dict):
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact forest format: {meta.get('format')}")
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"]
+        self.value = arrays["value"]
+        self.roots = np.asarray(arrays["roots"])
+        self.classes_ = np.array(meta["classes"])
+        self.n_features_in_ = meta["n_features"]
+        self.max_depth = meta["max_depth"]
+        self.value_scale = meta["value_scale"]
+        self.n_estimators = len(self.roots) - 1
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CompactForest":
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in ("feature", "threshold", "children", "value", "roots")
+        }
+        return cls(arrays, meta)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.children, self.value, self.roots))
+
+    def _apply_global(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        node = np.empty((n_rows, self.n_estimators), dtype=np.intp)
+        node[:] = self.roots[:-1]
+        # Flat gathers: X.ravel()[row * n_features + feature], children.ravel()[node * 2 + go_right]
+        row_offset = (np.arange(n_rows) * n_features)[:, None]
+        X_flat = X.ravel()
+        children = self.children.ravel()
+        for _ in range(self.max_depth):
+            # NaN compares false and goes right, as in sklearn trees without missing-value support
+            go_right = ~(X_flat[row_offset + self.feature[node]] <= self.threshold[node])
+            node *= 2
+            node += go_right
+            node = children[node].astype(np.intp)
+        return node
+
+    def _leaves(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        for start in range(0, len(X), APPLY_CHUNK_ROWS):
+            yield start, self._apply_global(X[start:start + APPLY_CHUNK_ROWS])
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf index per row and tree, numbered within each tree like ``RandomForestClassifier.apply``"""
+        out = np.empty((len(X), self.n_estimators), dtype=np.int64)
+        for start, leaves in self._leaves(X):
+            out[start:start + len(leaves)] = leaves - self.roots[:-1]
+        return out
+
+    def survival_probability(self, X) -> np.ndarray:
+        out = np.empty(len(X))
+        for start, leaves in self._leaves(X):
+            out[start:start + len(leaves)] = self.value[leaves].sum(axis=1, dtype=np.int64)
+        return out / (self.n_estimators * self.value_scale)
+
+    def predict_proba(self, X) -> np.ndarray:
+        positive = self.survival_probability(X)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def trees(self) -> Iterator[TreeArrays]:
+        for start, stop in zip(self.roots[:-1], self.roots[1:]):
+            own = np.arange(start, stop)
+            children = np.asarray(self.children[start:stop])
+            leaf = children[:, 0] == own
+            yield TreeArrays(
+                children_left=np.where(leaf, -1, children[:, 0] - start),
+                children_right=np.where(leaf, -1, children[:, 1] - start),
+                feature=np.where(leaf, -2, self.feature[start:stop]),
+                threshold=np.where(leaf, -2.0, self.threshold[start:stop].astype(np.float64)),
+                value=self.value[start:stop] / self.value_scale,
+            )
+
+def tree_arrays(model, positive_class=1) -> Iterator[TreeArrays]:
+    """Per-tree node arrays of an sklearn forest or a ``CompactForest``"""
+    if isinstance(model, CompactForest):
+        yield from model.trees()
+        return
+    class_index = list(model.classes_).index(positive_class)
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        value = tree.value[:, 0, :]
+        # Older scikit-learn stores class counts, newer stores fractions
+        value = (value / value.sum(axis=1, keepdims=True))[:, class_index]
+        yield TreeArrays(tree.children_left, tree.children_right, tree.feature, tree.threshold, value)
+
+def model_files(models_path: str, model_format: str = None) -> list[str]:
+    """Paths of the files ``load_model`` reads for this format"""
+    model_format = model_format or os.getenv("MODEL_FORMAT", "sklearn")
+    if model_format == "compact":
+        path = os.path.join(models_path, COMPACT_MODEL_DIR)
+        return sorted(os.path.join(path, name) for name in os.listdir(path))
+    return [os.path.join(models_path, "titanic_model.pkl")]
+
+def load_model(models_path: str, model_format: str = None):
+    """The model selected by ``MODEL_FORMAT`` (``sklearn`` or ``compact``)"""
+    model_format = model_format or os.getenv("MODEL_FORMAT", "sklearn")
+    if model_format == "compact":
+        return CompactForest.load(os.path.join(models_path, COMPACT_MODEL_DIR))
+    if model_format != "sklearn":
+        raise ValueError(f"Unknown MODEL_FORMAT: {model_format}")
+    with open(os.path.join(models_path, "titanic_model.pkl"), "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,386 @@
+"""
+Asynchronous batch scoring jobs.
+
+Datasets too large for one HTTP request are submitted as jobs: the body is
+spooled to disk, a job row is written to SQLite, and the job is run by a pool
+of local worker processes that load the model once at start-up.
+
+Each job goes through two steps, both run in the worker pool:
+
+1. ``prepare``: decode the body (any ``utils.wire`` format) and encode it
+   into float64 feature rows appended to ``features.bin``. CSV and Arrow
+   bodies are decoded ``chunk_rows`` rows (or one record batch) at a time, so
+   memory does not grow with the upload; JSON and msgpack documents are
+   parsed whole, which is why their uploads have the lower
+   ``max_document_bytes`` cap
+2. ``score``: the matrix is split into chunks of ``chunk_rows`` rows; each
+   worker memory-maps the matrix, scores its chunk and writes
+   ``chunk-NNNNN.npy``. Every finished chunk is checkpointed in SQLite
+
+Cancellation is a flag in the job row that the coordinator checks between
+chunks. A job interrupted by a restart resumes from its last checkpoint when
+the service starts again, so no external broker is needed.
+
+Layout of ``jobs_dir``::
+
+    jobs.sqlite3
+    <job_id>/input.bin
+    <job_id>/features.bin      (raw float64 rows, one column per feature)
+    <job_id>/chunk-00000.npy
+"""
+
+import multiprocessing
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import closing
+from typing import Optional
+
+import numpy as np
+
+from . import wire
+from .features import FeatureEncoder, score_matrix
+from .forest import load_model
+from .log import get_logger, log_fields
+
+logger = get_logger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    total_rows INTEGER,
+    chunk_rows INTEGER NOT NULL,
+    total_chunks INTEGER,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    owner_pid INTEGER,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_chunks (
+    job_id TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    finished_at REAL NOT NULL,
+    PRIMARY KEY (job_id, chunk)
+);
+"""
+
+class JobNotFound(KeyError):
+    """Raised for an unknown job ID"""
+
+class JobNotReady(RuntimeError):
+    """Raised when the result of a job that has not succeeded is requested"""
+
+# Worker process state, set once by _init_worker
+_model = None
+_feature_columns = None
+_feature_encoder = None
+
+def _init_worker(models_path: str) -> None:
+    global _model, _feature_columns, _feature_encoder
+    _model = load_model(models_path)
+    with open(os.path.join(models_path, 'encoders.pkl'), 'rb') as f:
+        encoders = pickle.load(f)
+    with open(os.path.join(models_path, 'feature_columns.pkl'), 'rb') as f:
+        _feature_columns = pickle.load(f)
+    # Parallelism comes from the pool; one thread per worker avoids oversubscription
+    if hasattr(_model, "n_jobs"):
+        _model.n_jobs = 1
+    _feature_encoder = FeatureEncoder(encoders, _feature_columns)
+
+def _save_atomic(path: str, array: np.ndarray) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+def _prepare(input_path: str, content_type: str, features_path: str, max_rows: int, chunk_rows: int) -> int:
+    tmp_path = features_path + ".tmp"
+    n_rows = 0
+    with open(tmp_path, "wb") as out:
+        for columns in wire.iter_batch_file(input_path, content_type, chunk_rows):
+            X = _feature_encoder.encode(columns)
+            n_rows += len(X)
+            if n_rows > max_rows:
+                raise ValueError(f"Job exceeds {max_rows} passengers")
+            np.ascontiguousarray(X, dtype=np.float64).tofile(out)
+    os.replace(tmp_path, features_path)
+    return n_rows
+
+def _score_chunk(features_path: str, start: int, stop: int, out_path: str) -> int:
+    X = np.memmap(features_path, dtype=np.float64, mode="r").reshape(-1, len(_feature_columns))[start:stop]
+    survived, survival_probability, death_probability = score_matrix(_model, _feature_columns, X)
+    _save_atomic(out_path, np.column_stack([survived, survival_probability, death_probability]))
+    return stop - start
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobManager:
+    """Persist scoring jobs in SQLite and run them on a local process pool"""
+
+    def __init__(self, models_path: str, jobs_dir: str, workers: int = 2,
+                 chunk_rows: int = 50_000, max_rows: int = 10_000_000,
+                 max_bytes: int = 2 * 2**30, max_document_bytes: int = 256 * 2**20,
+                 retention_seconds: float = 24 * 3600):
+        self.models_path = models_path
+        self.jobs_dir = jobs_dir
+        self.db_path = os.path.join(jobs_dir, "jobs.sqlite3")
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_document_bytes = max_document_bytes
+        self.retention_seconds = retention_seconds
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._stopping = threading.Event()
+        self._threads: dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as db:
+            db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    # Lifecycle
+
+    def start(self) -> None:
+        """Start the worker pool, purge expired jobs and resume unfinished ones"""
+        # spawn: workers must not inherit the server's threads and sockets
+        context = multiprocessing.get_context("spawn")
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=context,
+            initializer=_init_worker, initargs=(self.models_path,),
+        )
+        self._stopping.clear()
+        self.purge_expired()
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                "SELECT id, owner_pid FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                ACTIVE_STATES,
+            ).fetchall()
+        for row in rows:
+            # Leave jobs alone that another live server process is running
+            if row["owner_pid"] != os.getpid() and _pid_alive(row["owner_pid"]):
+                continue
+            logger.info("Resuming job", extra=log_fields(job_id=row["id"]))
+            self._dispatch(row["id"])
+
+    def shutdown(self) -> None:
+        """Stop dispatching; running jobs stay 'running' and resume on next start"""
+        self._stopping.set()
+        for thread in list(self._threads.values()):
+            thread.join(timeout=30)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def purge_expired(self) -> int:
+        cutoff = time.time() - self.retention_seconds
+        with closing(self._connect()) as db:
+            expired = [row["id"] for row in db.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?, ?) AND updated_at < ?",
+                (*FINISHED_STATES, cutoff),
+            )]
+        for job_id in expired:
+            self.delete(job_id)
+        return len(expired)
+
+    # API
+
+    def max_upload_bytes(self, content_type: str) -> int:
+        """Largest body accepted for a job; JSON and msgpack are parsed whole, so they get the lower cap"""
+        if content_type in wire.STREAMED_MEDIA_TYPES:
+            return self.max_bytes
+        return min(self.max_bytes, self.max_document_bytes)
+
+    def create(self, input_path: str, content_type: str) -> dict:
+        """Register a job whose body has been spooled to ``input_path``"""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id))
+        os.replace(input_path, os.path.join(self.job_dir(job_id), "input.bin"))
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute(
+                "INSERT INTO jobs (id, status, content_type, chunk_rows, owner_pid, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, content_type, self.chunk_rows, os.getpid(), now, now),
+            )
+        logger.info("Job queued", extra=log_fields(job_id=job_id, content_type=content_type))
+        self._dispatch(job_id)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> dict:
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                raise JobNotFound(job_id)
+            done = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(rows), 0) FROM job_chunks WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        total_rows = row["total_rows"]
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "total_rows": total_rows,
+            "rows_done": done[1],
+            "chunks_done": done[0],
+            "total_chunks": row["total_chunks"],
+            "progress": round(done[1] / total_rows, 4) if total_rows else (1.0 if row["status"] == SUCCEEDED else 0.0),
+            "cancel_requested": bool(row["cancel_requested"]),
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def cancel(self, job_id: str) -> dict:
+        """Request cancellation; the job stops after its in-flight chunks"""
+        job = self.get(job_id)
+        if job["status"] in ACTIVE_STATES:
+            self._update(job_id, cancel_requested=1)
+            with closing(self._connect()) as db:
+                owner_pid = db.execute("SELECT owner_pid FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+                # Nothing is running the job, so nothing else will mark it cancelled
+                if job_id not in self._threads and (owner_pid == os.getpid() or not _pid_alive(owner_pid)):
+                    db.execute(
+                        "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+                        (CANCELLED, time.time(), job_id, *ACTIVE_STATES),
+                    )
+        return self.get(job_id)
+
+    def delete(self, job_id: str) -> None:
+        """Remove a finished job and its files"""
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM job_chunks WHERE job_id = ?", (job_id,))
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def result(self, job_id: str, media_type: str) -> bytes:
+        job = self.get(job_id)
+        if job["status"] != SUCCEEDED:
+            raise JobNotReady(f"Job is {job['status']}")
+        directory = self.job_dir(job_id)
+        parts = [np.load(os.path.join(directory, f"chunk-{i:05d}.npy")) for i in range(job["total_chunks"])]
+        scores = np.concatenate(parts) if parts else np.empty((0, 3))
+        return wire.encode_batch_result(scores[:, 0], scores[:, 1], scores[:, 2], media_type)
+
+    # Coordination
+
+    def _dispatch(self, job_id: str) -> None:
+        with self._lock:
+            if job_id in self._threads or self._pool is None:
+                return
+            thread = threading.Thread(target=self._run, args=(job_id,), name=f"job-{job_id[:8]}", daemon=True)
+            self._threads[job_id] = thread
+        thread.start()
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or bool(row[0])
+
+    def _run(self, job_id: str) -> None:
+        started = time.perf_counter()
+        try:
+            self._update(job_id, status=RUNNING, owner_pid=os.getpid())
+            status = self._run_chunks(job_id)
+            if status is not None:
+                self._update(job_id, status=status)
+                logger.info("Job finished", extra=log_fields(
+                    job_id=job_id, status=status, duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                ))
+        except Exception as e:
+            logger.exception("Job failed", extra=log_fields(job_id=job_id))
+            self._update(job_id, status=FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._threads.pop(job_id, None)
+
+    def _run_chunks(self, job_id: str) -> Optional[str]:
+        """Run the job to completion; returns None if interrupted by shutdown"""
+        directory = self.job_dir(job_id)
+        features_path = os.path.join(directory, "features.bin")
+        with closing(self._connect()) as db:
+            job = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            done = {row[0] for row in db.execute("SELECT chunk FROM job_chunks WHERE job_id = ?", (job_id,))}
+
+        if job["total_rows"] is None or not os.path.exists(features_path):
+            total_rows = self._pool.submit(
+                _prepare, os.path.join(directory, "input.bin"), job["content_type"],
+                features_path, self.max_rows, job["chunk_rows"],
+            ).result()
+            total_chunks = -(-total_rows // job["chunk_rows"])
+            self._update(job_id, total_rows=total_rows, total_chunks=total_chunks)
+            done = set()
+        else:
+            total_rows, total_chunks = job["total_rows"], job["total_chunks"]
+
+        chunk_rows = job["chunk_rows"]
+        pending = iter([chunk for chunk in range(total_chunks) if chunk not in done])
+        in_flight = {}
+        # Keep every worker busy while bounding the work lost to a cancellation
+        max_in_flight = self.workers * 2
+        while True:
+            if self._cancel_requested(job_id):
+                for future in in_flight:
+                    future.cancel()
+                return CANCELLED
+            if self._stopping.is_set():
+                for future in in_flight:
+                    future.cancel()
+                return None
+            for chunk in pending:
+                start = chunk * chunk_rows
+                stop = min(start + chunk_rows, total_rows)
+                out_path = os.path.join(directory, f"chunk-{chunk:05d}.npy")
+                in_flight[self._pool.submit(_score_chunk, features_path, start, stop, out_path)] = chunk
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                return SUCCEEDED
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            with closing(self._connect()) as db:
+                for future in finished:
+                    chunk = in_flight.pop(future)
+                    db.execute(
+                        "INSERT OR REPLACE INTO job_chunks (job_id, chunk, rows, finished_at) VALUES (?, ?, ?, ?)",
+                        (job_id, chunk, future.result(), time.time()),
+                    )
+            self._update(job_id)
@@ -0,0 +1,181 @@
+"""
+Structured, queue-backed logging with request-ID correlation.
+
+Records are handed to a bounded in-memory queue; a background listener thread
+encodes them as one JSON object per line and does the actual terminal I/O, so
+logging never blocks the event loop. When the queue is full, records are
+dropped and counted instead of waiting.
+
+Configuration (environment variables):
+
+- ``LOG_LEVEL``: minimum level, default ``INFO``
+- ``LOG_SAMPLE_RATE``: fraction of DEBUG/INFO records kept, default ``1.0``
+  (warnings and errors are always kept)
+- ``LOG_ASYNC``: set to ``0`` to write synchronously from the calling thread
+- ``LOG_QUEUE_SIZE``: capacity of the queue, default ``10000``
+
+The request ID of the current request lives in ``request_id_var`` and is
+attached to every record. It is read from and echoed in the ``X-Request-ID``
+header; chatbot-service forwards its own request ID there, so a chat request
+and the prediction it triggers share one ID.
+
+Each service is built as its own Docker context, so this module is copied
+rather than imported from a shared package; keep it identical to
+``chatbot-service/utils/log.py`` apart from this docstring.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# HTTP client loggers that would add an unstructured line per outgoing call
+QUIET_LOGGERS = ("httpx", "httpcore")
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_listener: logging.handlers.QueueListener | None = None
+_dropped = 0
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+class JSONFormatter(logging.Formatter):
+    """Format records as single-line JSON objects"""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class ContextFilter(logging.Filter):
+    """Attach the request ID and drop a share of low-severity records"""
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and self.sample_rate < 1.0:
+            if random.random() >= self.sample_rate:
+                return False
+        record.request_id = request_id_var.get()
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that counts and drops records when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve arguments and tracebacks on the calling thread so the record
+        # carries no live references; JSON encoding happens on the listener.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+def setup_logging(
+    service: str,
+    level: str | None = None,
+    sample_rate: float | None = None,
+    use_queue: bool | None = None,
+    stream=None,
+) -> None:
+    """Configure the root logger of a service; safe to call more than once"""
+    global _listener
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    if sample_rate is None:
+        sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    if use_queue is None:
+        use_queue = os.getenv("LOG_ASYNC", "1") != "0"
+
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter(service))
+
+    if use_queue:
+        log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        handler: logging.Handler = DroppingQueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, output)
+        _listener.start()
+        atexit.register(shutdown_logging)
+    else:
+        handler = output
+    handler.addFilter(ContextFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+def shutdown_logging() -> None:
+    """Flush and stop the background listener, if any"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def dropped_records() -> int:
+    return _dropped
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+def log_fields(**fields) -> dict:
+    """Extra fields for a log call: ``logger.info("msg", extra=log_fields(a=1))``"""
+    return {"fields": fields}
+
+access_logger = logging.getLogger("access")
+
+async def request_context_middleware(request, call_next):
+    """Assign a request ID, echo it in the response and log one access line"""
+    request_id = request.headers.get(REQUEST_ID_HEADER) or new_request_id()
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+        response.headers[REQUEST_ID_HEADER] = request_id
+        access_logger.info("request", extra=log_fields(
+            method=request.method,
+            path=request.url.path,
+            status=response.status_code,
+            duration_ms=round((time.perf_counter() - started) * 1000, 2),
+        ))
+        return response
+    finally:
+        request_id_var.reset(token)
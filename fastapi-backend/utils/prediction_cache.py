@@ -0,0 +1,217 @@
+"""
+Prediction cache shared by every worker process on a host.
+
+The cache maps an encoded feature vector (the row ``FeatureEncoder`` builds,
+so passengers who differ only in ways the model cannot see share an entry)
+to the predicted class and probabilities. It lives in one fixed-size
+``multiprocessing.shared_memory`` segment that every uvicorn worker attaches
+to by name, so a passenger scored by one worker is a hit in all of them and
+the cache is held once per host instead of once per process.
+
+Layout: a header, then ``slots + ways - 1`` entries in three arrays: a
+32-bit hash per entry, a CLOCK reference byte per entry, and the record
+``checksum | model fingerprint | features | survived, P(survived), P(died)``.
+
+- **Open addressing**: a key lives in one of the ``ways`` entries that
+  follow its home slot. Entries are replaced but never emptied, so a lookup
+  stops at the first empty entry
+- **CLOCK eviction**: a hit sets the entry's reference byte. An insert into
+  a full window takes the first entry whose byte is clear, clearing the
+  bytes it passes, so an entry is only kept if it was read since the last
+  time an insert passed it
+- **No locks**: a record is written with one copy and read with one copy.
+  A reader that races a writer, or two writers that race on one entry,
+  leave a record whose checksum does not match; it is treated as a miss
+- **Model changes**: the fingerprint of the model files is part of the
+  hashed key and of every record, so a retrained model never reads the
+  previous model's entries, which age out through eviction. Workers serving
+  different models during a rolling restart can share the segment safely
+
+The segment outlives the workers (it is never unlinked on exit) and is
+recreated empty after a reboot or container restart.
+"""
+
+import hashlib
+import os
+import struct
+import time
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Sequence
+
+import numpy as np
+
+MAGIC = b"TPCACHE1"
+HEADER = struct.Struct("<8sIIII")  # magic, slots, ways, features per key, record size
+HEADER_SIZE = 64
+VALUE = struct.Struct("<ddd")
+ENTRY_OVERHEAD = 4 + 1  # hash and reference byte per entry, besides the record
+# How long a worker waits for the worker that created the segment to write its header
+ATTACH_TIMEOUT_SECONDS = 2.0
+
+def fingerprint(paths: Sequence[str]) -> bytes:
+    """8-byte digest of the contents of the model files"""
+    digest = hashlib.blake2b(digest_size=8)
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.digest()
+
+def _open_segment(name: str, size: int) -> tuple[shared_memory.SharedMemory, bool]:
+    try:
+        segment, created = shared_memory.SharedMemory(name=name, create=True, size=size), True
+    except FileExistsError:
+        segment, created = shared_memory.SharedMemory(name=name), False
+    # The segment belongs to no single worker; keep the resource tracker from unlinking it at exit
+    try:
+        resource_tracker.unregister(segment._name, "shared_memory")
+    except Exception:
+        pass
+    return segment, created
+
+class SharedPredictionCache:
+    """Fixed-size, lock-free, set-associative prediction cache in shared memory"""
+
+    def __init__(self, name: str, slots: int, n_features: int, model_fingerprint: bytes, ways: int = 8):
+        if slots < 1 or ways < 1:
+            raise ValueError("slots and ways must be at least 1")
+        if len(model_fingerprint) != 8:
+            raise ValueError("model_fingerprint must be 8 bytes")
+        self.name = name
+        self.slots = slots
+        self.ways = ways
+        self.n_features = n_features
+        self.model_fingerprint = model_fingerprint
+        self.key_size = 8 * n_features
+        self.record_size = 4 + 8 + self.key_size + VALUE.size
+        self.entries = slots + ways - 1
+        self.nbytes = HEADER_SIZE + self.entries * (ENTRY_OVERHEAD + self.record_size)
+        # Hashes are seeded with the fingerprint, so each model has its own home slots
+        self._seed = zlib.crc32(model_fingerprint)
+        self._hand = 0
+        self.hits = self.misses = self.inserts = self.evictions = self.torn = 0
+
+        self._segment, created = _open_segment(name, self.nbytes)
+        header = HEADER.pack(MAGIC, slots, ways, n_features, self.record_size)
+        buf = self._segment.buf
+        if created:
+            # The segment starts zeroed, which is an empty table; the magic is written last
+            buf[8:HEADER.size] = header[8:]
+            buf[:8] = MAGIC
+        else:
+            deadline = time.monotonic() + ATTACH_TIMEOUT_SECONDS
+            while bytes(buf[:8]) != MAGIC and time.monotonic() < deadline:
+                time.sleep(0.01)
+            if self._segment.size < self.nbytes or bytes(buf[:HEADER.size]) != header:
+                self.close()
+                raise ValueError(f"Shared memory segment {name!r} has a different layout; "
+                                 f"remove /dev/shm/{name} or choose another name")
+        hashes_end = HEADER_SIZE + 4 * self.entries
+        refs_end = hashes_end + self.entries
+        self._hashes = buf[HEADER_SIZE:hashes_end].cast("I")
+        self._refs = buf[hashes_end:refs_end]
+        self._records = buf[refs_end:refs_end + self.entries * self.record_size]
+
+    def _hash(self, key: bytes) -> int:
+        # 0 marks an empty entry
+        return zlib.crc32(key, self._seed) or 1
+
+    def get(self, features: np.ndarray) -> Optional[dict]:
+        """The cached prediction for one encoded feature row, or None"""
+        key = np.ascontiguousarray(features, dtype=np.float64).tobytes()
+        h = self._hash(key)
+        start = h % self.slots
+        hashes, size = self._hashes, self.record_size
+        for i in range(start, start + self.ways):
+            stored = hashes[i]
+            if stored == 0:
+                break
+            if stored != h:
+                continue
+            record = bytes(self._records[i * size:(i + 1) * size])
+            if record[12:12 + self.key_size] != key or record[4:12] != self.model_fingerprint:
+                continue
+            if int.from_bytes(record[:4], "little") != zlib.crc32(record[4:]):
+                self.torn += 1
+                continue
+            self._refs[i] = 1
+            self.hits += 1
+            survived, survival_probability, death_probability = VALUE.unpack_from(record, 12 + self.key_size)
+            return {
+                "survived": int(survived),
+                "survival_probability": survival_probability,
+                "death_probability": death_probability,
+            }
+        self.misses += 1
+        return None
+
+    def put(self, features: np.ndarray, result: dict) -> None:
+        """Store the prediction for one encoded feature row, evicting within its window if needed"""
+        key = np.ascontiguousarray(features, dtype=np.float64).tobytes()
+        h = self._hash(key)
+        start = h % self.slots
+        body = self.model_fingerprint + key + VALUE.pack(
+            result["survived"], result["survival_probability"], result["death_probability"],
+        )
+        record = zlib.crc32(body).to_bytes(4, "little") + body
+        hashes, refs = self._hashes, self._refs
+        target = None
+        for i in range(start, start + self.ways):
+            stored = hashes[i]
+            if stored == 0 or (stored == h and self._records[i * self.record_size + 12:
+                                                             (i + 1) * self.record_size - VALUE.size] == key):
+                target = i
+                break
+        if target is None:
+            # Second chance: skip (and clear) entries read since the last sweep
+            self._hand = (self._hand + 1) % self.ways
+            for step in range(self.ways):
+                i = start + (self._hand + step) % self.ways
+                if not refs[i]:
+                    target = i
+                    break
+                refs[i] = 0
+            else:
+                target = start + self._hand
+            self.evictions += 1
+        # The record first: a reader that sees the new hash with the old record finds a key mismatch
+        self._records[target * self.record_size:(target + 1) * self.record_size] = record
+        refs[target] = 0
+        hashes[target] = h
+        self.inserts += 1
+
+    def stats(self) -> dict:
+        """Table size and occupancy, and this process's hit counters"""
+        used = int(np.count_nonzero(np.frombuffer(self._hashes, dtype=np.uint32)))
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "slots": self.slots,
+            "ways": self.ways,
+            "bytes": self.nbytes,
+            "used": used,
+            "process": {
+                "pid": os.getpid(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "inserts": self.inserts,
+                "evictions": self.evictions,
+                "torn": self.torn,
+            },
+        }
+
+    def close(self) -> None:
+        for view in ("_hashes", "_refs", "_records"):
+            if hasattr(self, view):
+                getattr(self, view).release()
+                delattr(self, view)
+        self._segment.close()
+
+    def unlink(self) -> None:
+        """Remove the segment; processes still attached keep their mapping"""
+        # unlink() unregisters the segment, so it has to be registered again first
+        resource_tracker.register(self._segment._name, "shared_memory")
+        self._segment.unlink()
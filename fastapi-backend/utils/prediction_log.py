@@ -0,0 +1,395 @@
+"""
+Non-blocking prediction log for audit and retraining.
+
+Request handlers append each scored passenger to an in-memory columnar
+buffer and return; they never touch the disk. A background thread flushes
+the buffer in batches to rotating files in ``log_dir``:
+
+- ``parquet`` (default): one row group per flush
+- ``sqlite``: one transaction per flush into a ``predictions`` table
+
+The buffer is a ring of two preallocated segments of ``capacity`` rows.
+Handlers fill one segment while the flusher writes the other, so a flush
+never copies rows or holds the lock while writing. When the filling segment
+is full and the flusher has not freed the other one yet, new rows are
+dropped and counted instead of making the request wait. ``sample_rate``
+logs only a share of requests; a batch request is logged or skipped as a
+whole.
+
+The flusher writes whenever ``flush_rows`` rows are buffered or every
+``flush_seconds``, so each write is short, and on Linux it runs at a lower
+CPU priority so that requests win when the CPU is busy.
+
+A file is closed and a new one started after ``rotate_rows`` rows or
+``rotate_seconds`` seconds. Open files end in ``.inprogress`` and are
+renamed when closed, so only complete files match ``predictions-*.parquet``
+(or ``*.sqlite3``). Only the ``max_files`` newest files are kept.
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Mapping, Optional, Sequence
+
+import numpy as np
+
+from utils.log import get_logger, log_fields
+
+logger = get_logger(__name__)
+
+FORMATS = ("parquet", "sqlite")
+
+# Columns that are the same for every row of one request: kept as codes into a
+# per-segment table of distinct values, and written dictionary-encoded
+CALL_COLUMNS = ("request_id", "endpoint", "model_version")
+# Per-row columns and their dtypes; object columns hold strings
+COLUMNS = {
+    "ts": np.float64,
+    "pclass": np.int8,
+    "name": object,
+    "sex": object,
+    "age": np.float32,
+    "sibsp": np.int16,
+    "parch": np.int16,
+    "fare": np.float32,
+    "embarked": object,
+    "survived": np.int8,
+    "survival_probability": np.float32,
+}
+PASSENGER_COLUMNS = ("pclass", "name", "sex", "age", "sibsp", "parch", "fare", "embarked")
+NULLABLE = ("name", "sex", "age", "fare", "embarked")
+PASSENGER_DEFAULTS = {"age": np.nan, "sibsp": 0, "parch": 0, "fare": np.nan, "embarked": "S"}
+
+OUTPUT_COLUMNS = ("ts", *CALL_COLUMNS, *(name for name in COLUMNS if name != "ts"))
+
+class Segment:
+    """Preallocated columns for ``capacity`` rows"""
+
+    def __init__(self, capacity: int):
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.codes = {name: np.empty(capacity, dtype=np.int32) for name in CALL_COLUMNS}
+        self.values: dict[str, dict] = {name: {} for name in CALL_COLUMNS}
+        self.capacity = capacity
+        self.size = 0
+
+    def set_call(self, rows, **values) -> None:
+        for name, value in values.items():
+            table = self.values[name]
+            code = table.get(value)
+            if code is None:
+                code = table[value] = len(table)
+            self.codes[name][rows] = code
+
+    def rows(self) -> dict:
+        """Per-row columns as arrays, call columns as (codes, distinct values)"""
+        rows = {name: column[:self.size] for name, column in self.columns.items()}
+        for name in CALL_COLUMNS:
+            rows[name] = (self.codes[name][:self.size], list(self.values[name]))
+        return rows
+
+    def clear(self) -> None:
+        # Drop references to the logged strings
+        for name, dtype in COLUMNS.items():
+            if dtype is object:
+                self.columns[name][:self.size] = None
+        self.size = 0
+        for table in self.values.values():
+            table.clear()
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    types = {np.float64: pa.float64(), np.float32: pa.float32(), np.int8: pa.int8(), np.int16: pa.int16(),
+             object: pa.string()}
+    return pa.schema([
+        (name, pa.dictionary(pa.int32(), pa.string()) if name in CALL_COLUMNS else types[COLUMNS[name]])
+        for name in OUTPUT_COLUMNS
+    ])
+
+class ParquetFile:
+    def __init__(self, path: str):
+        import pyarrow.parquet as pq
+
+        self.schema = _parquet_schema()
+        # Dictionary pages only pay off for low-cardinality columns, and statistics only
+        # for the timestamp readers filter on; both cost flusher CPU for every column
+        self.writer = pq.ParquetWriter(
+            path, self.schema, compression="zstd",
+            use_dictionary=["sex", "embarked", *CALL_COLUMNS], write_statistics=["ts"],
+        )
+
+    def write(self, rows: dict) -> None:
+        import pyarrow as pa
+
+        arrays = []
+        for field in self.schema:
+            if field.name in CALL_COLUMNS:
+                codes, values = rows[field.name]
+                arrays.append(pa.DictionaryArray.from_arrays(pa.array(codes), pa.array(values, pa.string())))
+            else:
+                # from_pandas: NaN in string columns (e.g. empty CSV cells) is written as null
+                arrays.append(pa.array(rows[field.name], type=field.type, from_pandas=True))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+class SQLiteFile:
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE predictions ({})".format(", ".join(
+            f"{name} {sql_type}" for name, sql_type in zip(OUTPUT_COLUMNS, self.sql_types())
+        )))
+
+    @staticmethod
+    def sql_types() -> list:
+        types = []
+        for name in OUTPUT_COLUMNS:
+            dtype = COLUMNS.get(name, object)
+            types.append("TEXT" if dtype is object else "REAL" if dtype in (np.float32, np.float64) else "INTEGER")
+        return types
+
+    def write(self, rows: dict) -> None:
+        columns = []
+        for name in OUTPUT_COLUMNS:
+            if name in CALL_COLUMNS:
+                codes, values = rows[name]
+                columns.append(np.array(values, dtype=object)[codes].tolist())
+            elif name in NULLABLE:
+                # SQLite has no NaN; missing values are stored as NULL
+                columns.append([None if v != v else v for v in rows[name].tolist()])
+            else:
+                columns.append(rows[name].tolist())
+        with self.db:
+            self.db.executemany(
+                f"INSERT INTO predictions VALUES ({', '.join('?' * len(OUTPUT_COLUMNS))})", zip(*columns)
+            )
+
+    def close(self) -> None:
+        self.db.close()
+
+class PredictionLog:
+    """Buffer predictions in memory and write them to rotating files on a background thread"""
+
+    def __init__(self, log_dir: str, file_format: str = "parquet", capacity: int = 65536,
+                 flush_rows: int = 8192, flush_seconds: float = 1.0, sample_rate: float = 1.0, rotate_rows: int = 1_000_000,
+                 rotate_seconds: float = 3600, max_files: int = 100):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown prediction log format: {file_format} (expected one of {', '.join(FORMATS)})")
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.log_dir = log_dir
+        self.file_format = file_format
+        self.extension = "parquet" if file_format == "parquet" else "sqlite3"
+        self.flush_rows = min(flush_rows, capacity)
+        self.flush_seconds = flush_seconds
+        self.sample_rate = sample_rate
+        self.rotate_rows = rotate_rows
+        self.rotate_seconds = rotate_seconds
+        self.max_files = max_files
+        self._active = Segment(capacity)
+        self._spare: Optional[Segment] = Segment(capacity)
+        self._full: Optional[Segment] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._file_path: Optional[str] = None
+        self._file_rows = 0
+        self._file_opened = 0.0
+        self._files_opened = 0
+        self.logged = 0
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+        os.makedirs(log_dir, exist_ok=True)
+
+    # Request side
+
+    def _reserve(self, n: int):
+        """A segment and the first of ``n`` free rows in it, or (None, 0) if the rows are dropped.
+
+        Called with the lock held; rows are filled before it is released, so
+        the flusher never sees a half-written row.
+        """
+        segment = self._active
+        if segment.size + n > segment.capacity:
+            if self._spare is None or n > segment.capacity:
+                self.dropped += n
+                return None, 0
+            # Hand the full segment to the flusher and continue in the spare
+            self._active, self._spare = self._spare, None
+            self._full = segment
+            self._wake.set()
+            segment = self._active
+        start = segment.size
+        segment.size += n
+        self.logged += n
+        if segment.size >= self.flush_rows:
+            self._wake.set()
+        return segment, start
+
+    def log(self, passenger: Mapping, survived: int, survival_probability: float,
+            endpoint: str, model_version: str, request_id: str) -> None:
+        """Log one prediction; never blocks on I/O"""
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        ts = time.time()
+        with self._lock:
+            segment, row = self._reserve(1)
+            if segment is None:
+                return
+            columns = segment.columns
+            columns["ts"][row] = ts
+            segment.set_call(row, request_id=request_id, endpoint=endpoint, model_version=model_version)
+            for name in PASSENGER_COLUMNS:
+                value = passenger.get(name)
+                columns[name][row] = PASSENGER_DEFAULTS.get(name) if value is None else value
+            columns["survived"][row] = survived
+            columns["survival_probability"][row] = survival_probability
+
+    def log_batch(self, passengers: Mapping[str, Sequence], survived: np.ndarray, survival_probability: np.ndarray,
+                  endpoint: str, model_version: str, request_id: str) -> None:
+        """Log a batch given as passenger columns and the scored arrays"""
+        n = len(survived)
+        if not n or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return
+        # Convert outside the lock; only the copy into the segment holds it. String
+        # columns are copied as they are: missing values (None or NaN) become nulls
+        # when the flusher writes them
+        values = {}
+        for name in PASSENGER_COLUMNS:
+            column = passengers.get(name)
+            if column is None:
+                values[name] = PASSENGER_DEFAULTS[name]
+            elif COLUMNS[name] is not object:
+                column = np.asarray(column, dtype=np.float64)
+                if name in ("sibsp", "parch"):
+                    column = np.where(np.isnan(column), PASSENGER_DEFAULTS[name], column)
+                values[name] = column
+            else:
+                values[name] = column
+        ts = time.time()
+        with self._lock:
+            segment, start = self._reserve(n)
+            if segment is None:
+                return
+            rows = slice(start, start + n)
+            columns = segment.columns
+            columns["ts"][rows] = ts
+            segment.set_call(rows, request_id=request_id, endpoint=endpoint, model_version=model_version)
+            for name, column in values.items():
+                columns[name][rows] = column
+            columns["survived"][rows] = survived
+            columns["survival_probability"][rows] = survival_probability
+
+    # Flusher side
+
+    def _take(self) -> Optional[Segment]:
+        """The segment to write next: a full one handed over, or the partly filled active one"""
+        with self._lock:
+            if self._full is not None:
+                full, self._full = self._full, None
+                return full
+            if self._spare is None or not self._active.size:
+                return None
+            segment, self._active, self._spare = self._active, self._spare, None
+            return segment
+
+    def _release(self, segment: Segment) -> None:
+        segment.clear()
+        with self._lock:
+            self._spare = segment
+
+    def _open_file(self) -> None:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        self._files_opened += 1
+        name = f"predictions-{stamp}-{os.getpid()}-{self._files_opened:05d}.{self.extension}"
+        self._file_path = os.path.join(self.log_dir, name)
+        in_progress = self._file_path + ".inprogress"
+        self._file = ParquetFile(in_progress) if self.file_format == "parquet" else SQLiteFile(in_progress)
+        self._file_rows = 0
+        self._file_opened = time.monotonic()
+
+    def _close_file(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._file_path + ".inprogress", self._file_path)
+        self._file = None
+        self._remove_old_files()
+
+    def _remove_old_files(self) -> None:
+        if not self.max_files:
+            return
+        finished = sorted(
+            name for name in os.listdir(self.log_dir)
+            if name.startswith("predictions-") and name.endswith("." + self.extension)
+        )
+        for name in finished[:-self.max_files]:
+            os.remove(os.path.join(self.log_dir, name))
+
+    def _write(self, segment: Segment) -> None:
+        try:
+            if self._file is None:
+                self._open_file()
+            self._file.write(segment.rows())
+            self._file_rows += segment.size
+            self.written += segment.size
+            if (self._file_rows >= self.rotate_rows
+                    or time.monotonic() - self._file_opened >= self.rotate_seconds):
+                self._close_file()
+        except Exception:
+            self.write_errors += 1
+            logger.exception("Writing the prediction log failed", extra=log_fields(rows=segment.size))
+        finally:
+            self._release(segment)
+
+    def flush(self) -> None:
+        """Write everything buffered so far (called by the flusher thread and at shutdown)"""
+        while True:
+            segment = self._take()
+            if segment is None:
+                return
+            self._write(segment)
+
+    def _run(self) -> None:
+        # Writing is background work: let request threads win the CPU (Linux threads can be reniced)
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+            if self._file is not None and time.monotonic() - self._file_opened >= self.rotate_seconds:
+                self._close_file()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+            self._thread.start()
+
+    def shutdown(self) -> None:
+        """Write what is buffered and close the current file"""
+        if self._thread is not None:
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join(timeout=30)
+            self._thread = None
+        self.flush()
+        self._close_file()
+
+    def stats(self) -> dict:
+        return {
+            "logged": self.logged,
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+            "buffered": self._active.size,
+        }
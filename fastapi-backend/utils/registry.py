@@ -0,0 +1,298 @@
+"""
+Several model versions served side by side, for A/B tests and shadow scoring.
+
+Versions are directories under ``<models>/versions/`` written by
+``ml-model/train.py --version NAME``. Each holds ``titanic_model.pkl`` (or
+``titanic_model_compact/``), ``encoders.pkl`` and ``feature_columns.pkl``.
+The model in ``<models>/`` itself is the version ``current``.
+
+- **Routing**: ``candidate_percent`` percent of ``/predict`` requests are
+  answered by the candidate. The choice hashes the request ID, so a retried
+  request with the same ``X-Request-ID`` gets the same version
+- **Shadow scoring**: every request answered by the primary is also scored
+  by the shadow version on a background thread, after the response has been
+  computed. The queue is bounded; when it is full, requests are not shadowed
+  and are counted as dropped, so the shadow can never slow down serving
+- **Lazy loading**: a version is loaded the first time it is used. At most
+  ``max_resident`` versions stay loaded; the least recently used one is
+  unloaded first. The primary is never unloaded
+
+Per version, the registry records scoring latency, and for the shadow how
+often it agrees with the primary on the predicted class and by how much the
+survival probabilities differ.
+"""
+
+import os
+import pickle
+import queue
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Mapping, Optional
+
+import numpy as np
+
+from utils.features import FeatureEncoder, score_rows
+from utils.forest import COMPACT_MODEL_DIR, load_model
+from utils.log import get_logger, log_fields
+
+logger = get_logger(__name__)
+
+CURRENT_VERSION = "current"
+VERSIONS_DIR = "versions"
+# Latency samples kept per version for the percentiles
+LATENCY_SAMPLES = 2048
+
+class UnknownModelVersion(KeyError):
+    """Raised for a version with no artifacts in the models directory"""
+
+class LatencyStats:
+    """Count and recent percentiles of one kind of latency"""
+
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self.count = 0
+        self._samples = np.zeros(samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples[self.count % len(self._samples)] = seconds * 1000
+        self.count += 1
+
+    def summary(self) -> dict:
+        recent = self._samples[:min(self.count, len(self._samples))]
+        if not len(recent):
+            return {"count": 0}
+        p50, p99 = np.percentile(recent, [50, 99])
+        return {"count": self.count, "p50_ms": round(float(p50), 3), "p99_ms": round(float(p99), 3)}
+
+class VersionStats:
+    """Serving and shadow statistics of one version"""
+
+    def __init__(self):
+        self.served = LatencyStats()
+        self.shadowed = LatencyStats()
+        self.compared = 0
+        self.agreed = 0
+        self.abs_difference = 0.0
+        self.max_abs_difference = 0.0
+        self.dropped = 0
+        self.errors = 0
+
+    def summary(self) -> dict:
+        result = {"served": self.served.summary(), "shadow": self.shadowed.summary()}
+        if self.compared:
+            result["shadow"].update({
+                "agreement_rate": self.agreed / self.compared,
+                "mean_abs_difference": self.abs_difference / self.compared,
+                "max_abs_difference": self.max_abs_difference,
+            })
+        result["shadow"]["dropped"] = self.dropped
+        result["errors"] = self.errors
+        return result
+
+class ModelVersion:
+    """One loaded model version with its own encoders"""
+
+    def __init__(self, name: str, model, feature_encoder: FeatureEncoder):
+        self.name = name
+        self.model = model
+        self.feature_encoder = feature_encoder
+        self.feature_columns = feature_encoder.feature_columns
+
+    @classmethod
+    def load(cls, name: str, path: str) -> "ModelVersion":
+        model = load_model(path)
+        with open(os.path.join(path, "encoders.pkl"), "rb") as f:
+            encoders = pickle.load(f)
+        with open(os.path.join(path, "feature_columns.pkl"), "rb") as f:
+            feature_columns = pickle.load(f)
+        return cls(name, model, FeatureEncoder(encoders, feature_columns))
+
+    def score(self, columns: Mapping):
+        """Encode and score passenger columns; returns (survived, P(survived), P(died))"""
+        return score_rows(self.model, self.feature_encoder.encode(columns))
+
+class ModelRegistry:
+    """Lazily loaded, LRU-bounded model versions with A/B routing and shadow scoring"""
+
+    def __init__(self, models_path: str, primary: ModelVersion, max_resident: int = 3,
+                 shadow_queue_size: int = 1000):
+        if max_resident < 1:
+            raise ValueError("max_resident must be at least 1")
+        self.models_path = models_path
+        self.primary = primary
+        self.max_resident = max_resident
+        self.candidate: Optional[str] = None
+        self.candidate_percent = 0.0
+        self.shadow: Optional[str] = None
+        self._resident: OrderedDict[str, ModelVersion] = OrderedDict()
+        self._stats: dict[str, VersionStats] = {}
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._shadow_queue: queue.Queue = queue.Queue(maxsize=shadow_queue_size)
+        self._shadow_thread: Optional[threading.Thread] = None
+
+    # Versions
+
+    def path(self, name: str) -> str:
+        if name == CURRENT_VERSION:
+            return self.models_path
+        return os.path.join(self.models_path, VERSIONS_DIR, name)
+
+    def exists(self, name: str) -> bool:
+        if name == self.primary.name:
+            return True
+        if os.sep in name or name.startswith("."):
+            return False
+        path = self.path(name)
+        return (
+            os.path.exists(os.path.join(path, "encoders.pkl"))
+            and os.path.exists(os.path.join(path, "feature_columns.pkl"))
+            and (os.path.exists(os.path.join(path, "titanic_model.pkl"))
+                 or os.path.isdir(os.path.join(path, COMPACT_MODEL_DIR)))
+        )
+
+    def versions(self) -> list[str]:
+        names = {self.primary.name}
+        if self.exists(CURRENT_VERSION):
+            names.add(CURRENT_VERSION)
+        versions_dir = os.path.join(self.models_path, VERSIONS_DIR)
+        if os.path.isdir(versions_dir):
+            names.update(name for name in os.listdir(versions_dir) if self.exists(name))
+        return sorted(names)
+
+    def get(self, name: str) -> ModelVersion:
+        """The loaded version, loading it (and unloading the least recently used) if needed"""
+        if name == self.primary.name:
+            return self.primary
+        with self._lock:
+            if name in self._resident:
+                self._resident.move_to_end(name)
+                return self._resident[name]
+            if not self.exists(name):
+                raise UnknownModelVersion(name)
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        # Load outside the registry lock so requests for resident versions never wait on a load
+        with load_lock:
+            with self._lock:
+                if name in self._resident:
+                    return self._resident[name]
+            started = time.perf_counter()
+            version = ModelVersion.load(name, self.path(name))
+            with self._lock:
+                self._resident[name] = version
+                # The primary counts towards the bound but lives outside the LRU
+                while len(self._resident) > self.max_resident - 1:
+                    evicted, _ = self._resident.popitem(last=False)
+                    logger.info("Model version unloaded", extra=log_fields(version=evicted))
+            logger.info("Model version loaded", extra=log_fields(
+                version=name, duration_ms=round((time.perf_counter() - started) * 1000, 2),
+            ))
+            return version
+
+    def resident(self) -> list[str]:
+        with self._lock:
+            return [self.primary.name, *self._resident]
+
+    # Routing
+
+    def set_routing(self, candidate: Optional[str], candidate_percent: float, shadow: Optional[str]) -> None:
+        """Change the candidate, its share of traffic and the shadow version"""
+        if not 0 <= candidate_percent <= 100:
+            raise ValueError("candidate_percent must be between 0 and 100")
+        if candidate_percent and candidate is None:
+            raise ValueError("candidate_percent needs a candidate")
+        for name in (candidate, shadow):
+            if name is not None and not self.exists(name):
+                raise UnknownModelVersion(name)
+        self.candidate, self.candidate_percent, self.shadow = candidate, float(candidate_percent), shadow
+
+    def route(self, key: Optional[str] = None) -> str:
+        """Name of the version that answers a request with this routing key"""
+        candidate, percent = self.candidate, self.candidate_percent
+        if candidate is None or percent <= 0:
+            return self.primary.name
+        if key and key != "-":
+            bucket = zlib.crc32(key.encode()) % 10000
+        else:
+            bucket = random.randrange(10000)
+        return candidate if bucket < percent * 100 else self.primary.name
+
+    # Statistics
+
+    def stats(self, name: str) -> VersionStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats.setdefault(name, VersionStats())
+        return stats
+
+    def record_served(self, name: str, seconds: float) -> None:
+        self.stats(name).served.record(seconds)
+
+    def summary(self) -> dict:
+        resident = self.resident()
+        return {
+            "primary": self.primary.name,
+            "candidate": self.candidate,
+            "candidate_percent": self.candidate_percent,
+            "shadow": self.shadow,
+            "max_resident": self.max_resident,
+            "versions": [
+                {"name": name, "resident": name in resident, **self.stats(name).summary()}
+                for name in self.versions()
+            ],
+        }
+
+    # Shadow scoring
+
+    def submit_shadow(self, columns: Mapping, survived: int, survival_probability: float) -> bool:
+        """Queue one primary-scored passenger for the shadow version; False if not shadowed"""
+        shadow = self.shadow
+        if shadow is None or shadow == self.primary.name:
+            return False
+        try:
+            self._shadow_queue.put_nowait((shadow, columns, survived, survival_probability))
+        except queue.Full:
+            self.stats(shadow).dropped += 1
+            return False
+        return True
+
+    def _shadow_loop(self) -> None:
+        while True:
+            item = self._shadow_queue.get()
+            if item is None:
+                return
+            name, columns, survived, survival_probability = item
+            stats = self.stats(name)
+            try:
+                started = time.perf_counter()
+                shadow_survived, shadow_probability, _ = self.get(name).score(columns)
+                stats.shadowed.record(time.perf_counter() - started)
+            except Exception:
+                stats.errors += 1
+                logger.exception("Shadow scoring failed", extra=log_fields(version=name))
+                continue
+            difference = abs(float(shadow_probability[0]) - survival_probability)
+            stats.compared += 1
+            stats.agreed += int(shadow_survived[0]) == survived
+            stats.abs_difference += difference
+            stats.max_abs_difference = max(stats.max_abs_difference, difference)
+
+    def start(self) -> None:
+        if self._shadow_thread is None:
+            self._shadow_thread = threading.Thread(target=self._shadow_loop, name="shadow-scoring", daemon=True)
+            self._shadow_thread.start()
+
+    def shutdown(self) -> None:
+        """Stop the shadow thread; queued passengers that were not scored yet are discarded"""
+        if self._shadow_thread is None:
+            return
+        while True:
+            try:
+                self._shadow_queue.get_nowait()
+            except queue.Empty:
+                break
+        self._shadow_queue.put(None)
+        self._shadow_thread.join(timeout=5)
+        self._shadow_thread = None
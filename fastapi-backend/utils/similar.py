@@ -0,0 +1,55 @@
+"""
+Nearest historical passengers.
+
+``ml-model/train.py`` builds a KD-tree over the standardized encoded features
+of every passenger in the training data and saves it, with the passengers'
+original records and outcomes, as ``similarity_index.pkl`` next to the model.
+Queries are encoded with the same ``FeatureEncoder`` as predictions and
+answered with a single tree lookup.
+"""
+
+import pickle
+from typing import Sequence
+
+import numpy as np
+
+class SimilarPassengers:
+    """k-nearest-neighbour lookups over the training passengers"""
+
+    def __init__(self, index: dict, feature_columns: Sequence[str]):
+        if list(index["feature_columns"]) != list(feature_columns):
+            raise ValueError("Similarity index was built with different feature columns than the model")
+        self.tree = index["tree"]
+        self.mean = np.asarray(index["mean"], dtype=np.float64)
+        self.scale = np.asarray(index["scale"], dtype=np.float64)
+        self.passengers = index["passengers"]
+
+    @classmethod
+    def load(cls, path: str, feature_columns: Sequence[str]) -> "SimilarPassengers":
+        with open(path, "rb") as f:
+            return cls(pickle.load(f), feature_columns)
+
+    def __len__(self) -> int:
+        return len(self.passengers)
+
+    def query(self, X: np.ndarray, k: int) -> list[dict]:
+        """The ``k`` passengers closest to the first row of ``X``, nearest first"""
+        k = min(k, len(self.passengers))
+        distances, indices = self.tree.query((X[:1] - self.mean) / self.scale, k=k)
+        neighbours = []
+        for distance, index in zip(distances[0].tolist(), indices[0].tolist()):
+            record = self.passengers[index]
+            neighbours.append({
+                "passenger_id": record["PassengerId"],
+                "name": record["Name"],
+                "pclass": record["Pclass"],
+                "sex": record["Sex"],
+                "age": record["Age"],
+                "sibsp": record["SibSp"],
+                "parch": record["Parch"],
+                "fare": record["Fare"],
+                "embarked": record["Embarked"],
+                "survived": int(record["Survived"]),
+                "distance": distance,
+            })
+        return neighbours
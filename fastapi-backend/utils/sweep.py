@@ -0,0 +1,93 @@
+"""
+What-if sensitivity sweeps.
+
+A sweep varies a base passenger along one or more axes (``pclass``, ``age``,
+``fare``, ``family_size``) and scores every point of the cartesian grid. The
+base passenger is encoded once; each axis is encoded once into the feature
+columns it changes (e.g. ``age`` sets ``Age`` and ``AgeGroup``), and grid rows
+are materialized by gathering from those per-axis tables. Rows are built and
+scored ``chunk_rows`` at a time, so memory stays bounded however large the
+grid is; only the probabilities for the whole grid are kept.
+"""
+
+from typing import Callable, Mapping, Optional, Sequence
+
+import numpy as np
+
+from .features import FeatureEncoder, age_group_labels, fare_group_labels
+
+AXES = ("pclass", "age", "fare", "family_size")
+
+class SweepError(ValueError):
+    """Raised for an invalid sweep specification"""
+
+def range_values(start: float, stop: float, step: float, max_points: int) -> np.ndarray:
+    """Inclusive range ``start, start + step, ..., stop``"""
+    if step <= 0:
+        raise SweepError("step must be positive")
+    if stop < start:
+        raise SweepError("stop must not be less than start")
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    if count > max_points:
+        raise SweepError(f"Range has {count} points, the limit per axis is {max_points}")
+    return start + step * np.arange(count)
+
+def axis_columns(encoder: FeatureEncoder, axis: str, values: np.ndarray,
+                 base: Mapping[str, float]) -> dict[str, np.ndarray]:
+    """Encoded feature columns set by each value of one axis"""
+    if axis == "pclass":
+        if not np.isin(values, (1, 2, 3)).all():
+            raise SweepError("pclass values must be 1, 2 or 3")
+        return {"Pclass": values.astype(np.float64)}
+    if axis == "age":
+        if (values < 0).any():
+            raise SweepError("age values must not be negative")
+        return {"Age": values, "AgeGroup": encoder.lookup("age_group", age_group_labels(values))}
+    if axis == "fare":
+        if (values < 0).any():
+            raise SweepError("fare values must not be negative")
+        return {"Fare": values, "FareGroup": encoder.lookup("fare_group", fare_group_labels(values))}
+    if axis == "family_size":
+        if (values < 1).any():
+            raise SweepError("family_size values must be at least 1")
+        # Keep the base passenger's parents/children where possible; the rest are siblings/spouses
+        parch = np.minimum(base["Parch"], values - 1)
+        return {
+            "SibSp": values - 1 - parch,
+            "Parch": parch,
+            "FamilySize": values.astype(np.float64),
+            "IsAlone": (values == 1).astype(np.float64),
+        }
+    raise SweepError(f"Unknown sweep axis: {axis}")
+
+def run_sweep(encoder: FeatureEncoder, score: Callable[[np.ndarray], np.ndarray],
+              base_row: np.ndarray, axes: Sequence[tuple[str, np.ndarray]],
+              chunk_rows: int = 65536, max_cells: Optional[int] = None) -> np.ndarray:
+    """Score the cartesian grid of ``axes`` around ``base_row``.
+
+    ``score`` maps an encoded matrix to survival probabilities. Returns the
+    probabilities with one dimension per axis, in the order given.
+    """
+    shape = tuple(len(values) for _, values in axes)
+    total = int(np.prod(shape, dtype=np.int64))
+    if max_cells is not None and total > max_cells:
+        raise SweepError(f"Grid has {total} cells, the limit is {max_cells}")
+    base = dict(zip(encoder.feature_columns, base_row.tolist()))
+
+    # (axis position, feature column index, encoded values per axis point)
+    gathers = []
+    for position, (axis, values) in enumerate(axes):
+        for name, column in axis_columns(encoder, axis, np.asarray(values, dtype=np.float64), base).items():
+            gathers.append((position, encoder.column_index[name], column))
+
+    out = np.empty(total, dtype=np.float64)
+    chunk = np.empty((min(chunk_rows, total), len(base_row)), dtype=np.float64)
+    for start in range(0, total, chunk_rows):
+        stop = min(start + chunk_rows, total)
+        X = chunk[:stop - start]
+        X[:] = base_row
+        indices = np.unravel_index(np.arange(start, stop), shape)
+        for position, column_index, column in gathers:
+            X[:, column_index] = column[indices[position]]
+        out[start:stop] = score(X)
+    return out.reshape(shape)
@@ -0,0 +1,283 @@
+"""
+Wire formats for batch scoring.
+
+Batch requests and responses can be exchanged as:
+
+- JSON (``application/json``), encoded and decoded with orjson when installed
+- msgpack (``application/msgpack``)
+- Apache Arrow IPC streams (``application/vnd.apache.arrow.stream``)
+- CSV (``text/csv``) with a header row, e.g. a Kaggle-style passenger file
+
+JSON and msgpack requests carry either ``{"passengers": [{...}, ...]}`` (the
+same objects ``/predict`` accepts) or columns, ``{"columns": {"pclass": [...],
+...}}``. Arrow requests are record batches with one column per passenger
+field; numeric columns without nulls are read straight into NumPy without a
+copy. CSV headers are matched case-insensitively, so both ``pclass`` and
+``Pclass`` work and extra columns are ignored. No per-row pydantic validation
+is done on any of these paths.
+
+msgpack and pyarrow are optional: formats whose library is missing answer
+415 Unsupported Media Type.
+"""
+
+import io
+import json
+from typing import Iterator, Mapping, Optional, Sequence
+
+import numpy as np
+from fastapi.responses import Response
+
+from .features import PASSENGER_FIELDS, FeatureEncodingError, records_to_columns
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional format
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional format
+    pa = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+CSV = "text/csv"
+
+MEDIA_TYPE_ALIASES = {
+    "application/json": JSON,
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/vnd.apache.arrow.stream": ARROW,
+    "text/csv": CSV,
+    "application/csv": CSV,
+}
+
+class UnsupportedMediaType(ValueError):
+    """Raised for a media type that is unknown or whose library is not installed"""
+
+def available_media_types() -> list[str]:
+    types = [JSON, CSV]
+    if msgpack is not None:
+        types.append(MSGPACK)
+    if pa is not None:
+        types.append(ARROW)
+    return types
+
+def normalize_media_type(value: str | None, default: str = JSON) -> str:
+    if not value:
+        return default
+    media_type = MEDIA_TYPE_ALIASES.get(value.split(";")[0].strip().lower())
+    if media_type is None:
+        raise UnsupportedMediaType(f"Unsupported media type: {value}")
+    if media_type not in available_media_types():
+        raise UnsupportedMediaType(f"Media type {media_type} is not available on this server")
+    return media_type
+
+def negotiate(accept: str | None, default: str) -> str:
+    """Pick the response media type from an Accept header, in preference order"""
+    if not accept:
+        return default
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media_range, *params = [p.strip() for p in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        candidates.append((-quality, position, media_range.lower()))
+    for _, _, media_range in sorted(candidates):
+        if media_range in ("*/*", "application/*"):
+            return default
+        media_type = MEDIA_TYPE_ALIASES.get(media_range)
+        if media_type in available_media_types():
+            return media_type
+    raise UnsupportedMediaType(f"None of the accepted media types are available: {accept}")
+
+def _json_default(value):
+    """NumPy arrays and scalars for the json fallback, as orjson's OPT_SERIALIZE_NUMPY handles them"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_json_default).encode()
+
+def loads(body: bytes):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def json_response(content, status_code: int = 200) -> Response:
+    """JSON response serialized in one pass, bypassing response_model re-validation"""
+    return Response(content=dumps(content), status_code=status_code, media_type=JSON)
+
+def _columns_from_document(document) -> Mapping:
+    if not isinstance(document, dict):
+        raise FeatureEncodingError("Expected an object with 'passengers' or 'columns'")
+    if "columns" in document:
+        columns = document["columns"]
+        if not isinstance(columns, dict):
+            raise FeatureEncodingError("'columns' must be an object of arrays")
+        return columns
+    if "passengers" in document:
+        return records_to_columns(document["passengers"])
+    raise FeatureEncodingError("Expected an object with 'passengers' or 'columns'")
+
+def _arrow_array(array) -> np.ndarray:
+    if pa.types.is_integer(array.type) or pa.types.is_floating(array.type):
+        if array.null_count == 0:
+            # Zero-copy view of the Arrow buffer
+            return array.to_numpy(zero_copy_only=True)
+        return array.cast(pa.float64()).to_numpy(zero_copy_only=False)
+    if pa.types.is_dictionary(array.type):
+        # Decode each distinct value once, then gather by index
+        labels = np.array(array.dictionary.to_pylist() + [None], dtype=object)
+        indices = array.indices.fill_null(len(labels) - 1).to_numpy(zero_copy_only=False)
+        return labels[indices]
+    return array.to_numpy(zero_copy_only=False)
+
+def _arrow_columns(body: bytes) -> dict:
+    reader = pa.ipc.open_stream(pa.py_buffer(body))
+    table = reader.read_all()
+    return {name: _arrow_array(table.column(name).combine_chunks()) for name in table.column_names}
+
+def _frame_columns(df) -> dict:
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    columns = {}
+    for name in PASSENGER_FIELDS:
+        if name not in df.columns:
+            continue
+        series = df[name]
+        if series.dtype == object:
+            columns[name] = series.where(series.notna(), None).to_numpy()
+        else:
+            columns[name] = series.to_numpy(dtype=np.float64)
+    return columns
+
+def _csv_columns(body: bytes) -> dict:
+    import pandas as pd
+
+    return _frame_columns(pd.read_csv(io.BytesIO(body)))
+
+def decode_batch(body: bytes, media_type: str) -> Mapping:
+    """Decode a batch request body into passenger columns"""
+    try:
+        if media_type == ARROW:
+            return _arrow_columns(body)
+        if media_type == MSGPACK:
+            return _columns_from_document(msgpack.unpackb(body))
+        if media_type == CSV:
+            return _csv_columns(body)
+        return _columns_from_document(loads(body))
+    except FeatureEncodingError:
+        raise
+    except Exception as e:
+        raise FeatureEncodingError(f"Could not decode {media_type} body: {e}") from None
+
+# Formats iter_batch_file decodes a part at a time; the others are parsed whole
+STREAMED_MEDIA_TYPES = (CSV, ARROW)
+
+def iter_batch_file(path: str, media_type: str, chunk_rows: int) -> Iterator[Mapping]:
+    """Decode a batch request body spooled to ``path`` into passenger columns, a part at a time
+
+    CSV is read ``chunk_rows`` rows at a time and Arrow one record batch at a
+    time from a memory map, so neither is held in memory whole. JSON and
+    msgpack documents can only be parsed whole; callers cap their size.
+    """
+    try:
+        if media_type == CSV:
+            import pandas as pd
+
+            with pd.read_csv(path, chunksize=chunk_rows) as reader:
+                for df in reader:
+                    yield _frame_columns(df)
+        elif media_type == ARROW:
+            with pa.memory_map(path) as source:
+                for batch in pa.ipc.open_stream(source):
+                    yield {name: _arrow_array(column) for name, column in zip(batch.schema.names, batch.columns)}
+        else:
+            with open(path, "rb") as f:
+                body = f.read()
+            yield decode_batch(body, media_type)
+    except FeatureEncodingError:
+        raise
+    except Exception as e:
+        raise FeatureEncodingError(f"Could not decode {media_type} body: {e}") from None
+
+def encode_batch_result(survived: np.ndarray, survival_probability: np.ndarray,
+                        death_probability: np.ndarray, media_type: str,
+                        contributions: Optional[np.ndarray] = None,
+                        feature_names: Sequence[str] = (), base_value: Optional[float] = None) -> bytes:
+    """Encode batch predictions.
+
+    JSON follows ``BatchPredictionResult`` (a list of per-passenger objects);
+    msgpack, Arrow and CSV use columns, which are smaller and faster to produce.
+
+    With ``contributions`` (see ``utils.explain``) each passenger also gets
+    per-feature contributions: a ``contributions`` object per prediction in
+    JSON, a ``contributions`` map of columns in msgpack, and one
+    ``contribution_<feature>`` column per feature in Arrow and CSV. The
+    ``base_value`` is a top-level field (Arrow: schema metadata; CSV: omitted).
+    """
+    survived = survived.astype(np.int8, copy=False)
+    if media_type == CSV:
+        header = ["survived", "survival_probability", "death_probability"]
+        matrix = [survived, survival_probability, death_probability]
+        fmt = ["%d", "%.17g", "%.17g"]
+        if contributions is not None:
+            header += [f"contribution_{name}" for name in feature_names]
+            matrix += list(contributions.T)
+            fmt += ["%.17g"] * len(feature_names)
+        buffer = io.StringIO()
+        buffer.write(",".join(header) + "\n")
+        np.savetxt(buffer, np.column_stack(matrix), fmt=fmt, delimiter=",")
+        return buffer.getvalue().encode()
+    if media_type == ARROW:
+        arrays = [pa.array(survived), pa.array(survival_probability), pa.array(death_probability)]
+        names = ["survived", "survival_probability", "death_probability"]
+        metadata = None
+        if contributions is not None:
+            arrays += [pa.array(column) for column in contributions.T]
+            names += [f"contribution_{name}" for name in feature_names]
+            metadata = {"base_value": repr(float(base_value))}
+        batch = pa.RecordBatch.from_arrays(arrays, names=names, metadata=metadata)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+    if media_type == MSGPACK:
+        document = {
+            "survived": survived.tolist(),
+            "survival_probability": survival_probability.tolist(),
+            "death_probability": death_probability.tolist(),
+            "total_passengers": len(survived),
+        }
+        if contributions is not None:
+            document["base_value"] = float(base_value)
+            document["contributions"] = dict(zip(feature_names, contributions.T.tolist()))
+        return msgpack.packb(document)
+    predictions = [
+        {"survived": s, "survival_probability": p, "death_probability": d}
+        for s, p, d in zip(survived.tolist(), survival_probability.tolist(), death_probability.tolist())
+    ]
+    document = {"predictions": predictions, "total_passengers": len(predictions)}
+    if contributions is not None:
+        feature_names = list(feature_names)
+        for prediction, row in zip(predictions, contributions.tolist()):
+            prediction["contributions"] = dict(zip(feature_names, row))
+        document["base_value"] = float(base_value)
+    return dumps(document)
@@ -0,0 +1,224 @@
+"""
+Compact forest export for serving.
+
+A fitted sklearn forest keeps, per node, int64 child and feature indices, a
+float64 threshold, impurity and sample counts, and float64 class counts, and
+every tree is a separate Python object. Inference only needs the split and
+the survival probability. The export flattens all trees into shared node
+arrays:
+
+- ``feature`` (int16): split feature
+- ``threshold`` (float32): split threshold, rounded *down* to float32. Trees
+  compare float32 inputs, so ``x <= threshold`` routes every input exactly
+  as the float64 threshold did
+- ``children`` (int32, n x 2): left and right child as global node indices;
+  leaves point to themselves with an infinite threshold, so every tree can
+  be walked a fixed number of steps without branching on leaves
+- ``value`` (uint16, or uint8 with ``--leaf-bits 8``): P(survived) at every
+  node, quantized
+- ``roots`` (int64): first node of each tree
+
+The arrays are written as ``.npy`` files in ``models/titanic_model_compact/``
+so serving workers can memory-map them and share one copy in the page cache.
+
+The export is validated before it is written: on the training data, on
+random feature combinations and on values at and just above every split
+threshold, the compact forest must reach the same leaves, predict the same
+class, and stay within ``--tolerance`` of the survival probability.
+
+Usage (from ml-model/, after train.py):
+    python compact_forest.py --leaf-bits 16 --tolerance 1e-4
+"""
+
+import argparse
+import json
+import os
+import pickle
+import shutil
+import sys
+
+import numpy as np
+
+FORMAT_VERSION = 1
+COMPACT_MODEL_DIR = 'models/titanic_model_compact'
+LEAF_DTYPES = {8: np.uint8, 16: np.uint16}
+
+def float32_floor(values):
+    """Largest float32 not above each float64 value"""
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+def export_forest(model, leaf_bits=16):
+    """Flatten a fitted binary sklearn forest into compact node arrays"""
+    if len(model.classes_) != 2:
+        raise ValueError("Only binary classifiers can be exported")
+    positive = 1
+    value_dtype = LEAF_DTYPES[leaf_bits]
+    scale = np.iinfo(value_dtype).max
+
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    roots = np.concatenate([[0], np.cumsum([tree.node_count for tree in trees])]).astype(np.int64)
+    if roots[-1] > np.iinfo(np.int32).max:
+        raise ValueError("Forest has too many nodes for int32 indices")
+
+    feature = np.empty(roots[-1], dtype=np.int16)
+    threshold = np.empty(roots[-1], dtype=np.float32)
+    children = np.empty((roots[-1], 2), dtype=np.int32)
+    value = np.empty(roots[-1], dtype=value_dtype)
+    for tree, start in zip(trees, roots[:-1]):
+        nodes = slice(start, start + tree.node_count)
+        leaf = tree.children_left == -1
+        own = np.arange(start, start + tree.node_count)
+        feature[nodes] = np.where(leaf, 0, tree.feature)
+        threshold[nodes] = np.where(leaf, np.float32(np.inf), float32_floor(tree.threshold))
+        children[nodes, 0] = np.where(leaf, own, tree.children_left + start)
+        children[nodes, 1] = np.where(leaf, own, tree.children_right + start)
+        counts = tree.value[:, 0, :]
+        # Older scikit-learn stores class counts, newer stores fractions
+        probability = counts[:, positive] / counts.sum(axis=1)
+        value[nodes] = np.round(probability * scale).astype(value_dtype)
+
+    meta = {
+        'format': FORMAT_VERSION,
+        'classes': [int(c) for c in model.classes_],
+        'n_features': int(model.n_features_in_),
+        'max_depth': int(max(tree.max_depth for tree in trees)),
+        'value_scale': int(scale),
+    }
+    return {'feature': feature, 'threshold': threshold, 'children': children, 'value': value, 'roots': roots}, meta
+
+def compact_apply(arrays, meta, X):
+    """Global leaf index per row and tree, walking all trees in lockstep"""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    roots = arrays['roots'][:-1]
+    node = np.broadcast_to(roots, (len(X), len(roots))).copy()
+    rows = np.arange(len(X))[:, None]
+    for _ in range(meta['max_depth']):
+        go_right = ~(X[rows, arrays['feature'][node]] <= arrays['threshold'][node])
+        node = arrays['children'][node, go_right.astype(np.intp)]
+    return node
+
+def compact_proba(arrays, meta, X):
+    leaves = compact_apply(arrays, meta, X)
+    return arrays['value'][leaves].sum(axis=1, dtype=np.int64) / (leaves.shape[1] * meta['value_scale']), leaves
+
+def validation_rows(model, X_train, n_random, seed=42):
+    """Training rows, random feature combinations, and rows on both sides of every split threshold"""
+    rng = np.random.default_rng(seed)
+    X_train = np.asarray(X_train, dtype=np.float64)
+    n_features = X_train.shape[1]
+    low, high = X_train.min(axis=0), X_train.max(axis=0)
+    # Each feature drawn independently: half observed values, half uniform over the observed range
+    random_rows = X_train[rng.integers(0, len(X_train), (n_random, n_features)), np.arange(n_features)]
+    uniform = rng.random((n_random, n_features)) < 0.5
+    random_rows[uniform] = (low + rng.random((n_random, n_features)) * (high - low))[uniform]
+
+    edge_rows = []
+    for f in range(n_features):
+        thresholds = np.unique(np.concatenate([
+            estimator.tree_.threshold[estimator.tree_.feature == f] for estimator in model.estimators_
+        ]))
+        if not len(thresholds):
+            continue
+        at = float32_floor(thresholds)
+        above = np.nextafter(at, np.float32(np.inf))
+        values = np.concatenate([at, above]).astype(np.float64)
+        rows = X_train[rng.integers(0, len(X_train), len(values))].copy()
+        rows[:, f] = values
+        edge_rows.append(rows)
+    return np.vstack([X_train, random_rows, *edge_rows])
+
+def validate(model, arrays, meta, X, tolerance):
+    """Compare the compact forest with sklearn on ``X``; returns a list of failures"""
+    expected = model.predict_proba(X)
+    expected_leaves = model.apply(X) + arrays['roots'][:-1]
+    probability, leaves = compact_proba(arrays, meta, np.asarray(X))
+    failures = []
+    if not np.array_equal(leaves, expected_leaves):
+        failures.append(f"{int((leaves != expected_leaves).any(axis=1).sum())} rows reach different leaves")
+    expected_class = expected.argmax(axis=1)
+    # argmax picks the first class on ties, as sklearn does
+    compact_class = (probability > 1 - probability).astype(int)
+    if not np.array_equal(compact_class, expected_class):
+        failures.append(f"{int((compact_class != expected_class).sum())} rows change predicted class")
+    error = float(np.abs(probability - expected[:, 1]).max())
+    if error > tolerance:
+        failures.append(f"max probability error {error:.2e} exceeds tolerance {tolerance:.0e}")
+    return failures, error
+
+def sklearn_forest_nbytes(model):
+    """Bytes held by the trees' node and value arrays (excluding Python object overhead)"""
+    return sum(
+        estimator.tree_.node_count * estimator.tree_.__getstate__()['nodes'].dtype.itemsize
+        + estimator.tree_.value.nbytes
+        for estimator in model.estimators_
+    )
+
+def save_compact_forest(arrays, meta, path=COMPACT_MODEL_DIR):
+    """Write the arrays as .npy files plus meta.json, replacing any previous export"""
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def export_and_validate(model, X_train, leaf_bits=16, tolerance=1e-4, validate_rows=100_000,
+                        model_file='models/titanic_model.pkl', path=COMPACT_MODEL_DIR):
+    """Export, validate and save the compact forest; returns False (and saves nothing) if validation fails"""
+    arrays, meta = export_forest(model, leaf_bits)
+    X = validation_rows(model, X_train, validate_rows)
+    # The forest was fitted on a DataFrame; keep the column names to match
+    if hasattr(X_train, 'columns'):
+        import pandas as pd
+
+        X = pd.DataFrame(X, columns=X_train.columns)
+    failures, error = validate(model, arrays, meta, X, tolerance)
+    print(f"Compact forest validated on {len(X)} rows: max probability error {error:.2e}")
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        print("Compact forest not saved; try --leaf-bits 16 or a larger --tolerance")
+        return False
+
+    save_compact_forest(arrays, meta, path)
+    compact_nbytes = sum(array.nbytes for array in arrays.values())
+    print(f"Nodes: {len(arrays['value'])} in {len(arrays['roots']) - 1} trees, max depth {meta['max_depth']}")
+    print(f"Node arrays in memory: {sklearn_forest_nbytes(model) / 2**20:.2f} MiB sklearn, "
+          f"{compact_nbytes / 2**20:.2f} MiB compact")
+    if os.path.exists(model_file):
+        print(f"Artifact size: {os.path.getsize(model_file) / 2**20:.2f} MiB {model_file}, "
+              f"{directory_size(path) / 2**20:.2f} MiB {path}/")
+    print(f"Compact forest saved to: {path}/")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leaf-bits', type=int, choices=sorted(LEAF_DTYPES), default=16)
+    parser.add_argument('--tolerance', type=float, default=1e-4,
+                        help="Largest allowed survival probability difference")
+    parser.add_argument('--validate-rows', type=int, default=100_000,
+                        help="Random feature combinations to validate on, besides the training data")
+    parser.add_argument('--data', default='data/train.csv')
+    args = parser.parse_args()
+
+    import train
+
+    with open('models/titanic_model.pkl', 'rb') as f:
+        model = pickle.load(f)
+    with open('models/feature_columns.pkl', 'rb') as f:
+        feature_columns = pickle.load(f)
+    df_encoded, _ = train.encode_categorical_features(train.preprocess_data(train.load_data(args.data)))
+    ok = export_and_validate(model, df_encoded[feature_columns], args.leaf_bits, args.tolerance, args.validate_rows)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Evaluation report for a trained model.
+
+``train.py`` calls ``evaluate_model`` on the held-out test split and writes
+the result to ``models/evaluation_report.json`` next to the model:
+
+- **Metrics with bootstrap confidence intervals**: accuracy, precision,
+  recall, F1, ROC AUC, Brier score and log loss, each with the percentile
+  interval over ``n_bootstrap`` resamples of the test set. The model is
+  scored once; every resample reuses those probabilities, and a block of
+  resamples is scored at once as a (resamples x rows) array
+- **Permutation importance**: how much accuracy and ROC AUC drop when one
+  feature's values are shuffled, over ``n_repeats`` repetitions. A
+  repetition stacks one shuffled copy of the test set per feature and scores
+  them with a single batched ``predict_proba`` call
+- **Calibration**: observed survival rate against mean predicted
+  probability in ten equal-width bins, and the expected calibration error
+- **ROC and precision-recall curves**, thinned to at most
+  ``MAX_CURVE_POINTS`` points
+
+Repetitions and bootstrap blocks run in parallel threads (``n_jobs``, all
+cores by default); forest scoring and the numpy work release the GIL.
+Results are reproducible for a given ``seed`` whatever ``n_jobs`` is.
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.stats import rankdata
+from sklearn.metrics import average_precision_score, precision_recall_curve, roc_curve
+
+REPORT_FILE = 'models/evaluation_report.json'
+CALIBRATION_BINS = 10
+MAX_CURVE_POINTS = 201
+# Elements of a (resamples x rows) block scored at once
+BOOTSTRAP_BLOCK_ELEMENTS = 4_000_000
+PROBABILITY_EPSILON = 1e-15
+
+def roc_auc_rows(y, p):
+    """ROC AUC of every row of ``p`` against the matching row of ``y`` (Mann-Whitney U, ties averaged)"""
+    y = np.broadcast_to(y, p.shape)
+    ranks = rankdata(p, axis=1)
+    positives = y.sum(axis=1)
+    negatives = y.shape[1] - positives
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return ((ranks * y).sum(axis=1) - positives * (positives + 1) / 2) / (positives * negatives)
+
+def classification_metrics(y, p):
+    """Metrics of every row of probabilities ``p`` against labels ``y``, both (rows x passengers)"""
+    y = np.broadcast_to(y, p.shape)
+    predicted = p > 0.5  # RandomForestClassifier.predict picks class 0 on a tie
+    true_positives = (predicted & (y == 1)).sum(axis=1)
+    predicted_positives = predicted.sum(axis=1)
+    positives = y.sum(axis=1)
+    clipped = np.clip(p, PROBABILITY_EPSILON, 1 - PROBABILITY_EPSILON)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        precision = true_positives / predicted_positives
+        recall = true_positives / positives
+        f1 = 2 * true_positives / (predicted_positives + positives)
+    return {
+        'accuracy': (predicted == y).mean(axis=1),
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'roc_auc': roc_auc_rows(y, p),
+        'brier': ((p - y) ** 2).mean(axis=1),
+        'log_loss': -(y * np.log(clipped) + (1 - y) * np.log(1 - clipped)).mean(axis=1),
+    }
+
+def survival_probability(model, X, feature_names):
+    # The forest was fitted on a DataFrame; keep the column names to match
+    return model.predict_proba(pd.DataFrame(X, columns=feature_names))[:, 1]
+
+def _bootstrap_block(y, p, seed, resamples):
+    index = np.random.default_rng(seed).integers(0, len(y), size=(resamples, len(y)))
+    return classification_metrics(y[index], p[index])
+
+def bootstrap_intervals(y, p, n_bootstrap, confidence=0.95, seed=0, n_jobs=-1):
+    """Point estimate and percentile interval of every metric over bootstrap resamples of the test set"""
+    block = max(1, min(n_bootstrap, BOOTSTRAP_BLOCK_ELEMENTS // max(len(y), 1)))
+    sizes = [min(block, n_bootstrap - start) for start in range(0, n_bootstrap, block)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    blocks = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_bootstrap_block)(y, p, s, size) for s, size in zip(seeds, sizes)
+    )
+    point = classification_metrics(y[None, :], p[None, :])
+    tail = (1 - confidence) / 2 * 100
+    intervals = {}
+    for name, value in point.items():
+        samples = np.concatenate([b[name] for b in blocks])
+        low, high = np.nanpercentile(samples, [tail, 100 - tail])
+        intervals[name] = {'value': float(value[0]), 'ci_low': float(low), 'ci_high': float(high)}
+    return intervals
+
+def _permutation_repeat(model, X, y, feature_names, seed):
+    n, d = X.shape
+    rng = np.random.default_rng(seed)
+    # One copy of the test set per feature, with that feature's column shuffled
+    batch = np.repeat(X[None, :, :], d, axis=0)
+    for j in range(d):
+        batch[j, :, j] = X[rng.permutation(n), j]
+    p = survival_probability(model, batch.reshape(d * n, d), feature_names).reshape(d, n)
+    scores = classification_metrics(y[None, :], p)
+    return scores['accuracy'], scores['roc_auc']
+
+def permutation_importance(model, X, y, feature_names, n_repeats=10, seed=0, n_jobs=-1, max_rows=50_000):
+    """Mean and standard deviation of the accuracy and ROC AUC drop when each feature is shuffled"""
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    if len(X) > max_rows:
+        rows = np.random.default_rng(seed).choice(len(X), max_rows, replace=False)
+        X, y = X[rows], y[rows]
+    baseline = classification_metrics(y[None, :], survival_probability(model, X, feature_names)[None, :])
+    seeds = np.random.SeedSequence(seed).spawn(n_repeats)
+    repeats = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_permutation_repeat)(model, X, y, feature_names, s) for s in seeds
+    )
+    accuracy_drop = baseline['accuracy'][0] - np.array([r[0] for r in repeats])
+    auc_drop = baseline['roc_auc'][0] - np.array([r[1] for r in repeats])
+    features = [
+        {
+            'feature': name,
+            'accuracy_drop_mean': float(accuracy_drop[:, j].mean()),
+            'accuracy_drop_std': float(accuracy_drop[:, j].std()),
+            'roc_auc_drop_mean': float(auc_drop[:, j].mean()),
+            'roc_auc_drop_std': float(auc_drop[:, j].std()),
+        }
+        for j, name in enumerate(feature_names)
+    ]
+    features.sort(key=lambda f: f['roc_auc_drop_mean'], reverse=True)
+    return {'repeats': n_repeats, 'rows': len(X), 'features': features}
+
+def calibration(y, p, n_bins=CALIBRATION_BINS):
+    """Observed survival rate against mean predicted probability per equal-width bin"""
+    bins = np.minimum((p * n_bins).astype(np.int64), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    predicted = np.bincount(bins, weights=p, minlength=n_bins)
+    observed = np.bincount(bins, weights=y, minlength=n_bins)
+    filled = counts > 0
+    mean_predicted = predicted[filled] / counts[filled]
+    fraction_positive = observed[filled] / counts[filled]
+    return {
+        'bins': [
+            {'lower': float(i / n_bins), 'upper': float((i + 1) / n_bins), 'count': int(c),
+             'mean_predicted': float(mp), 'fraction_positive': float(fp)}
+            for i, c, mp, fp in zip(np.flatnonzero(filled), counts[filled], mean_predicted, fraction_positive)
+        ],
+        'expected_calibration_error': float(np.sum(counts[filled] / len(y) * np.abs(fraction_positive - mean_predicted))),
+    }
+
+def thin(*arrays, max_points=MAX_CURVE_POINTS):
+    """Keep at most ``max_points`` evenly spaced points of parallel curve arrays, including both ends"""
+    n = len(arrays[0])
+    keep = np.unique(np.linspace(0, n - 1, min(n, max_points)).round().astype(np.int64))
+    return [[None if not np.isfinite(v) else float(v) for v in np.asarray(a)[keep]] for a in arrays]
+
+def curves(y, p):
+    """ROC and precision-recall curves"""
+    fpr, tpr, roc_thresholds = roc_curve(y, p)
+    precision, recall, pr_thresholds = precision_recall_curve(y, p)
+    # precision_recall_curve has one threshold fewer than points; the last point has none
+    pr_thresholds = np.append(pr_thresholds, np.nan)
+    fpr, tpr, roc_thresholds = thin(fpr, tpr, roc_thresholds)
+    precision, recall, pr_thresholds = thin(precision, recall, pr_thresholds)
+    return (
+        {'fpr': fpr, 'tpr': tpr, 'thresholds': roc_thresholds},
+        {'precision': precision, 'recall': recall, 'thresholds': pr_thresholds},
+    )
+
+def evaluate_model(model, X_test, y_test, n_repeats=10, n_bootstrap=1000, seed=0, n_jobs=-1):
+    """Evaluation report of a fitted classifier on a held-out set"""
+    feature_names = list(X_test.columns)
+    X = np.asarray(X_test, dtype=np.float64)
+    y = np.asarray(y_test).astype(np.int64)
+    timings = {}
+
+    started = time.perf_counter()
+    p = survival_probability(model, X, feature_names)
+    metrics = bootstrap_intervals(y, p, n_bootstrap, seed=seed, n_jobs=n_jobs)
+    timings['bootstrap'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    importance = permutation_importance(model, X, y, feature_names, n_repeats, seed, n_jobs)
+    timings['permutation_importance'] = time.perf_counter() - started
+
+    roc, pr = curves(y, p)
+    roc['auc'] = metrics['roc_auc']['value']
+    pr['average_precision'] = float(average_precision_score(y, p))
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'test_rows': int(len(y)),
+        'positive_rate': float(y.mean()),
+        'bootstrap': {'resamples': n_bootstrap, 'confidence': 0.95, 'seed': seed},
+        'metrics': metrics,
+        'permutation_importance': importance,
+        'calibration': calibration(y, p),
+        'roc_curve': roc,
+        'pr_curve': pr,
+        'timings_s': {name: round(seconds, 3) for name, seconds in timings.items()},
+    }
+
+def write_report(report, path=REPORT_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+
+def print_summary(report):
+    print(f"Evaluated on {report['test_rows']} test passengers "
+          f"({report['bootstrap']['resamples']} bootstrap resamples, 95% intervals):")
+    for name, m in report['metrics'].items():
+        print(f"  {name:<10} {m['value']:.4f}  [{m['ci_low']:.4f}, {m['ci_high']:.4f}]")
+    print(f"  calibration error {report['calibration']['expected_calibration_error']:.4f}")
+    top = report['permutation_importance']['features'][:5]
+    print("Permutation importance (ROC AUC drop): " +
+          ", ".join(f"{f['feature']} {f['roc_auc_drop_mean']:.3f}" for f in top))
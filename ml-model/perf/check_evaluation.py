@@ -0,0 +1,146 @@
+"""
+Evaluation report check: batched, parallel evaluation vs plain per-item loops.
+
+A forest is trained as in train.py, and the encoded dataset is tiled up to
+``--rows`` rows to act as a larger test set. Then, with the same random
+shuffles and resamples:
+
+- **permutation importance**: a loop that scores one shuffled copy per
+  feature with its own ``predict_proba`` call and sklearn's ``roc_auc_score``,
+  vs ``evaluation.permutation_importance`` (one batched call per
+  repetition) with one thread and with ``--jobs``
+- **bootstrap**: a loop over resamples with sklearn's metric functions, vs
+  ``evaluation.bootstrap_intervals`` with one thread and with ``--jobs``
+
+Fails (exit code 1) when the batched results differ from the loops, when the
+parallel results differ from the single-threaded ones, or when the batched
+permutation importance is not faster than the loop.
+
+Usage (from ml-model/, with data/train.csv):
+    python perf/check_evaluation.py --rows 20000 --repeats 5 --bootstrap 200
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, brier_score_loss, f1_score, log_loss, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings("ignore")
+
+import evaluation
+import train
+
+FEATURE_COLUMNS = ['Pclass', 'Sex', 'Age', 'SibSp', 'Parch', 'Fare', 'Embarked',
+                   'FamilySize', 'IsAlone', 'Title', 'AgeGroup', 'FareGroup']
+
+SKLEARN_METRICS = {
+    'accuracy': lambda y, p: accuracy_score(y, p > 0.5),
+    'precision': lambda y, p: precision_score(y, p > 0.5, zero_division=np.nan),
+    'recall': lambda y, p: recall_score(y, p > 0.5, zero_division=np.nan),
+    'f1': lambda y, p: f1_score(y, p > 0.5, zero_division=np.nan),
+    'roc_auc': roc_auc_score,
+    'brier': brier_score_loss,
+    'log_loss': lambda y, p: log_loss(y, np.clip(p, 1e-15, 1 - 1e-15), labels=[0, 1]),
+}
+
+def loop_permutation_importance(model, X, y, n_repeats, seed):
+    """Permutation importance with one predict per shuffled feature, drawing the same shuffles"""
+    baseline = evaluation.survival_probability(model, X, FEATURE_COLUMNS)
+    base_accuracy, base_auc = accuracy_score(y, baseline > 0.5), roc_auc_score(y, baseline)
+    accuracy_drop = np.empty((n_repeats, X.shape[1]))
+    auc_drop = np.empty((n_repeats, X.shape[1]))
+    for r, child in enumerate(np.random.SeedSequence(seed).spawn(n_repeats)):
+        rng = np.random.default_rng(child)
+        for j in range(X.shape[1]):
+            shuffled = X.copy()
+            shuffled[:, j] = X[rng.permutation(len(X)), j]
+            p = evaluation.survival_probability(model, shuffled, FEATURE_COLUMNS)
+            accuracy_drop[r, j] = base_accuracy - accuracy_score(y, p > 0.5)
+            auc_drop[r, j] = base_auc - roc_auc_score(y, p)
+    return {name: (accuracy_drop[:, j].mean(), auc_drop[:, j].mean()) for j, name in enumerate(FEATURE_COLUMNS)}
+
+def loop_bootstrap(y, p, n_bootstrap, seed):
+    """Bootstrap metrics with one sklearn call per resample and metric, drawing the same resamples"""
+    block = max(1, min(n_bootstrap, evaluation.BOOTSTRAP_BLOCK_ELEMENTS // len(y)))
+    sizes = [min(block, n_bootstrap - start) for start in range(0, n_bootstrap, block)]
+    samples = {name: [] for name in SKLEARN_METRICS}
+    for child, size in zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes):
+        for index in np.random.default_rng(child).integers(0, len(y), size=(size, len(y))):
+            for name, metric in SKLEARN_METRICS.items():
+                samples[name].append(metric(y[index], p[index]))
+    return {name: np.nanpercentile(values, [2.5, 97.5]) for name, values in samples.items()}
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--source", default="data/train.csv")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--bootstrap", type=int, default=200)
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        df_encoded, _ = train.encode_categorical_features(train.preprocess_data(train.load_data(args.source)))
+    X, y = df_encoded[FEATURE_COLUMNS], df_encoded['Survived']
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42).fit(X_train, y_train)
+
+    tiles = -(-args.rows // len(X))
+    X_test = np.tile(X.to_numpy(dtype=np.float64), (tiles, 1))[:args.rows]
+    y_test = np.tile(y.to_numpy(dtype=np.int64), tiles)[:args.rows]
+    p = evaluation.survival_probability(model, X_test, FEATURE_COLUMNS)
+    print(f"{len(X_test)} test rows, {args.repeats} repetitions x {len(FEATURE_COLUMNS)} features, "
+          f"{args.bootstrap} bootstrap resamples, {os.cpu_count()} cores\n")
+
+    failures = []
+
+    loop, loop_s = timed(lambda: loop_permutation_importance(model, X_test, y_test, args.repeats, args.seed))
+    runs = {}
+    for jobs in (1, args.jobs):
+        runs[jobs], elapsed = timed(lambda: evaluation.permutation_importance(
+            model, X_test, y_test, FEATURE_COLUMNS, args.repeats, args.seed, n_jobs=jobs))
+        print(f"permutation importance  batched, n_jobs={jobs:<3} {elapsed:7.2f} s   "
+              f"({loop_s / elapsed:.1f}x the per-feature loop, {loop_s:.2f} s)")
+        if elapsed >= loop_s:
+            failures.append(f"batched permutation importance (n_jobs={jobs}) is not faster than the loop")
+    for feature in runs[1]['features']:
+        expected = loop[feature['feature']]
+        if not np.allclose((feature['accuracy_drop_mean'], feature['roc_auc_drop_mean']), expected, atol=1e-9):
+            failures.append(f"permutation importance of {feature['feature']} differs from the loop")
+    if runs[1] != runs[args.jobs]:
+        failures.append("parallel permutation importance differs from the single-threaded one")
+
+    loop, loop_s = timed(lambda: loop_bootstrap(y_test, p, args.bootstrap, args.seed))
+    runs = {}
+    for jobs in (1, args.jobs):
+        runs[jobs], elapsed = timed(lambda: evaluation.bootstrap_intervals(
+            y_test, p, args.bootstrap, seed=args.seed, n_jobs=jobs))
+        print(f"bootstrap intervals     vectorized, n_jobs={jobs:<3} {elapsed:4.2f} s   "
+              f"({loop_s / elapsed:.1f}x the sklearn loop, {loop_s:.2f} s)")
+    for name, (low, high) in loop.items():
+        interval = runs[1][name]
+        if not np.allclose((interval['ci_low'], interval['ci_high']), (low, high), atol=1e-9):
+            failures.append(f"bootstrap interval of {name} differs from the loop")
+    if runs[1] != runs[args.jobs]:
+        failures.append("parallel bootstrap intervals differ from the single-threaded ones")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
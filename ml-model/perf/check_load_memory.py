@@ -0,0 +1,130 @@
+"""
+Training data memory check: compact loader vs the original pandas defaults.
+
+``train.csv`` is tiled up to ``--rows`` rows in a temporary directory. Both
+pipelines then load, preprocess and encode it while tracemalloc records the
+peak allocation:
+
+- ``baseline``: ``pd.read_csv`` with default dtypes and the original
+  ``df.copy()``-based preprocessing and encoding
+- ``compact``: ``train.load_data`` (explicit dtypes, from CSV and then from
+  the Feather cache), ``train.preprocess_data`` and
+  ``train.encode_categorical_features``
+
+Fails (exit code 1) when the compact pipeline does not cut peak memory by at
+least ``--min-factor`` or encodes different feature values.
+
+Usage (from ml-model/, with data/train.csv):
+    python perf/check_load_memory.py --rows 1000000
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings("ignore")
+
+import train
+
+FEATURE_COLUMNS = ['Pclass', 'Sex', 'Age', 'SibSp', 'Parch', 'Fare', 'Embarked',
+                   'FamilySize', 'IsAlone', 'Title', 'AgeGroup', 'FareGroup']
+
+def baseline_pipeline(path: str) -> pd.DataFrame:
+    """The loader, preprocessing and encoding as they were before the compact dtypes"""
+    df = pd.read_csv(path)
+    df_processed = df.copy()
+    df_processed['Age'] = df_processed['Age'].fillna(df_processed['Age'].median())
+    df_processed['Fare'] = df_processed['Fare'].fillna(df_processed['Fare'].median())
+    df_processed['Embarked'] = df_processed['Embarked'].fillna('S')
+    df_processed['FamilySize'] = df_processed['SibSp'] + df_processed['Parch'] + 1
+    df_processed['IsAlone'] = (df_processed['FamilySize'] == 1).astype(int)
+    df_processed['Title'] = df_processed['Name'].str.extract(r' ([A-Za-z]+)\.', expand=False)
+    df_processed['Title'] = df_processed['Title'].replace(['Lady', 'Countess', 'Capt', 'Col', 'Don', 'Dr', 'Major',
+                                                           'Rev', 'Sir', 'Jonkheer', 'Dona'], 'Rare')
+    df_processed['Title'] = df_processed['Title'].replace({'Mlle': 'Miss', 'Ms': 'Miss', 'Mme': 'Mrs'})
+    df_processed['AgeGroup'] = pd.cut(df_processed['Age'], bins=[0, 12, 18, 35, 60, 100],
+                                      labels=['Child', 'Teen', 'Adult', 'Middle', 'Senior'])
+    df_processed['FareGroup'] = pd.qcut(df_processed['Fare'], q=4, labels=['Low', 'Medium', 'High', 'VeryHigh'],
+                                        duplicates='drop')
+    df_encoded = df_processed.copy()
+    for column in ['Sex', 'Embarked', 'Title', 'AgeGroup', 'FareGroup']:
+        df_encoded[column] = LabelEncoder().fit_transform(df_encoded[column])
+    return df_encoded
+
+def compact_pipeline(path: str, use_cache: bool) -> pd.DataFrame:
+    df = train.load_data(path, use_cache=use_cache)
+    df_encoded, _ = train.encode_categorical_features(train.preprocess_data(df))
+    return df_encoded
+
+def measure(name: str, fn):
+    """Peak traced allocation of one run, and the wall time of a separate untraced run"""
+    # Keep the loader's progress output out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        df_encoded = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    X = df_encoded[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    print(f"{name:<16} peak {peak / 2**20:8.1f} MiB   {elapsed:6.2f} s")
+    return peak, X
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--source", default="data/train.csv")
+    parser.add_argument("--min-factor", type=float, default=2.0)
+    args = parser.parse_args()
+
+    source = pd.read_csv(args.source)
+    repeats = -(-args.rows // len(source))
+    scaled = pd.concat([source] * repeats, ignore_index=True).iloc[:args.rows]
+    scaled['PassengerId'] = np.arange(1, len(scaled) + 1)
+
+    workdir = tempfile.mkdtemp(prefix="titanic-load-")
+    try:
+        path = os.path.join(workdir, "train.csv")
+        scaled.to_csv(path, index=False)
+        del scaled
+        print(f"{args.rows} rows, {os.path.getsize(path) / 2**20:.1f} MiB CSV\n")
+
+        pipelines = [
+            ("baseline", lambda: baseline_pipeline(path)),
+            ("compact (csv)", lambda: compact_pipeline(path, use_cache=False)),
+            # The first run writes the cache, the timed and traced runs read it
+            ("compact (cache)", lambda: compact_pipeline(path, use_cache=True)),
+        ]
+        measured = [(name, *measure(name, fn)) for name, fn in pipelines]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline_peak, baseline_X = measured[0][1], measured[0][2]
+    failures = []
+    for name, peak, X in measured[1:]:
+        factor = baseline_peak / peak
+        print(f"{name:<16} uses {factor:.1f}x less memory than baseline")
+        if factor < args.min_factor:
+            failures.append(f"{name}: {factor:.1f}x is below --min-factor {args.min_factor}")
+        # float32 medians may differ from float64 ones in the last bit
+        if not np.allclose(X, baseline_X, rtol=1e-6, atol=1e-4):
+            failures.append(f"{name}: encoded features differ from baseline")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Bounded-memory check for ``train.py --streaming``.
+
+Generates two synthetic datasets with ``synthesize.py``, the second
+``--growth`` times larger than the first, and trains on each in streaming
+mode in a fresh process, recording the peak resident memory. Fails (exit
+code 1) when the larger input needs more than ``--tolerance`` extra peak
+memory: with a fixed sample and chunk size, memory must not follow the input
+size.
+
+Usage (from ml-model/, with data/train.csv):
+    python perf/check_streaming_memory.py --rows 1000000 --growth 4
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ML_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs train.py in the child and reports the child's own peak RSS (KiB on Linux)
+RUN_TRAINING = """
+import resource, runpy, sys
+sys.path.insert(0, {ml_model_dir!r})
+sys.argv = ['train.py'] + {argv!r}
+runpy.run_path({train!r}, run_name='__main__')
+print('PEAK_RSS_KIB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def peak_rss_mib(workdir: str, data: str, sample_rows: int, chunk_rows: int) -> tuple[float, float]:
+    argv = ['--streaming', '--data', data, '--sample-rows', str(sample_rows), '--chunk-rows', str(chunk_rows)]
+    code = RUN_TRAINING.format(ml_model_dir=ML_MODEL_DIR, argv=argv, train=os.path.join(ML_MODEL_DIR, 'train.py'))
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], cwd=workdir, capture_output=True, text=True,
+                            env={**os.environ, 'MPLBACKEND': 'Agg'})
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    line = next(line for line in result.stdout.splitlines() if line.startswith('PEAK_RSS_KIB'))
+    return int(line.split()[1]) / 1024, elapsed
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--growth", type=int, default=4)
+    parser.add_argument("--sample-rows", type=int, default=100_000)
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--source", default=os.path.join(ML_MODEL_DIR, "data", "train.csv"))
+    args = parser.parse_args()
+
+    sys.path.insert(0, ML_MODEL_DIR)
+    from synthesize import synthesize
+
+    workdir = tempfile.mkdtemp(prefix="titanic-streaming-")
+    try:
+        peaks = []
+        for rows in (args.rows, args.rows * args.growth):
+            data = os.path.join(workdir, f"synthetic-{rows}.csv")
+            synthesize(args.source, data, rows, workers=os.cpu_count() or 1)
+            peak, elapsed = peak_rss_mib(workdir, data, args.sample_rows, args.chunk_rows)
+            os.remove(data)
+            print(f"{rows:>11} rows   peak RSS {peak:8.1f} MiB   {elapsed:6.1f} s")
+            peaks.append(peak)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    growth = peaks[1] / peaks[0] - 1
+    print(f"Peak memory grew {growth:+.1%} for {args.growth}x the rows")
+    if growth > args.tolerance:
+        print(f"FAIL peak memory grew more than --tolerance {args.tolerance:.0%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
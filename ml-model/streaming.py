@@ -0,0 +1,159 @@
+"""
+Building blocks for out-of-core training (``python train.py --streaming``).
+
+- ``iter_chunks`` reads a CSV or Parquet file a chunk at a time
+- ``QuantileSketch`` keeps exact value counts while a column has few distinct
+  values (the real Titanic ages and fares), then collapses into logarithmic
+  buckets with a bounded relative error, so memory stays constant however
+  many rows are added
+- ``Reservoir`` keeps a fixed-size uniform random sample of all rows seen
+
+Everything here works on one chunk at a time; memory depends on the chunk
+size, the sample size and the sketch size, not on the input size.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Distinct values kept exactly before a sketch switches to buckets
+MAX_EXACT_VALUES = 100_000
+# Relative accuracy of bucketed quantiles
+RELATIVE_ACCURACY = 0.005
+ZERO_BUCKET = np.iinfo(np.int64).min
+
+def iter_chunks(path, columns, dtypes, chunk_rows):
+    """DataFrames of at most ``chunk_rows`` rows from a .csv or .parquet file"""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas().astype(dtypes)
+    else:
+        yield from pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunk_rows)
+
+def _merge_counts(keys, counts, new_keys, new_counts):
+    """Add two sorted key/count tables"""
+    merged, inverse = np.unique(np.concatenate([keys, new_keys]), return_inverse=True)
+    return merged, np.bincount(inverse, weights=np.concatenate([counts, new_counts])).astype(np.int64)
+
+class QuantileSketch:
+    """Streaming quantiles of a non-negative column: exact while small, bucketed after"""
+
+    def __init__(self, max_exact_values=MAX_EXACT_VALUES, relative_accuracy=RELATIVE_ACCURACY):
+        self.max_exact_values = max_exact_values
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.exact = True
+        self.keys = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _bucket(self, values):
+        """Bucket i holds (gamma^(i-1), gamma^i]; zeros (free tickets) get the lowest key"""
+        buckets = np.full(len(values), ZERO_BUCKET, dtype=np.int64)
+        positive = values > 0
+        buckets[positive] = np.ceil(np.log(values[positive]) / np.log(self.gamma)).astype(np.int64)
+        return buckets
+
+    def _value(self, buckets):
+        """Representative value of each bucket, within the relative accuracy of every value in it"""
+        values = np.zeros(len(buckets))
+        positive = buckets != ZERO_BUCKET
+        values[positive] = 2 * self.gamma ** buckets[positive] / (self.gamma + 1)
+        return values
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if self.exact:
+            keys, counts = np.unique(values, return_counts=True)
+            self.keys, self.counts = _merge_counts(self.keys, self.counts, keys, counts)
+            if len(self.keys) > self.max_exact_values:
+                self.exact = False
+                self.keys, self.counts = _merge_counts(
+                    np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), self._bucket(self.keys), self.counts,
+                )
+        else:
+            keys, counts = np.unique(self._bucket(values), return_counts=True)
+            self.keys, self.counts = _merge_counts(self.keys, self.counts, keys, counts)
+
+    def add(self, value, count):
+        """Add ``count`` copies of one value"""
+        if count <= 0:
+            return
+        self.count += count
+        self.min = min(self.min, float(value))
+        self.max = max(self.max, float(value))
+        key = np.array([value], dtype=np.float64)
+        self.keys, self.counts = _merge_counts(
+            self.keys, self.counts, key if self.exact else self._bucket(key), np.array([count], dtype=np.int64),
+        )
+
+    def _at_rank(self, ranks):
+        cumulative = np.cumsum(self.counts)
+        keys = self.keys[np.searchsorted(cumulative, ranks, side='right')]
+        return keys if self.exact else self._value(keys)
+
+    def histogram(self, edges):
+        """Counts in the bins ``[edges[i-1], edges[i])``, with everything below ``edges[0]`` first"""
+        values = self.keys if self.exact else self._value(self.keys)
+        bins = np.searchsorted(edges, values, side='right')
+        return np.bincount(bins, weights=self.counts, minlength=len(edges) + 1).astype(np.int64)
+
+    def quantile(self, q):
+        """Linearly interpolated quantile, like ``Series.quantile``; exact until the sketch is bucketed"""
+        if not self.count:
+            return np.nan
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        position = (self.count - 1) * q
+        lower, upper = self._at_rank(np.array([np.floor(position), np.ceil(position)]))
+        value = lower + (upper - lower) * (position - np.floor(position))
+        return float(np.clip(value, self.min, self.max))
+
+class Reservoir:
+    """Uniform random sample of ``capacity`` rows over all chunks (Algorithm R, vectorized per chunk)"""
+
+    def __init__(self, capacity, seed=42):
+        self.capacity = capacity
+        self.rng = np.random.default_rng(seed)
+        self.columns = None
+        self.size = 0
+        self.seen = 0
+
+    def update(self, chunk):
+        if self.columns is None:
+            self.columns = {
+                name: np.empty(self.capacity, dtype=column.dtype if pd.api.types.is_numeric_dtype(column.dtype)
+                               else object)
+                for name, column in chunk.items()
+            }
+        # Rows that still fit are appended; later rows replace a random slot with probability capacity / seen
+        fill = min(self.capacity - self.size, len(chunk))
+        rows = np.arange(fill)
+        slots = np.arange(self.size, self.size + fill)
+        if fill < len(chunk):
+            seen = self.seen + np.arange(fill, len(chunk))
+            candidates = self.rng.integers(0, seen + 1)
+            replace = np.flatnonzero(candidates < self.capacity)
+            # When several rows pick the same slot the last one wins, as in the sequential algorithm
+            last = len(replace) - 1 - np.unique(candidates[replace][::-1], return_index=True)[1]
+            rows = np.concatenate([rows, fill + replace[last]])
+            slots = np.concatenate([slots, candidates[replace][last]])
+        for name, column in chunk.items():
+            self.columns[name][slots] = np.asarray(column, dtype=self.columns[name].dtype)[rows]
+        self.size += fill
+        self.seen += len(chunk)
+
+    def to_frame(self, dtypes):
+        if self.columns is None:
+            return pd.DataFrame(columns=list(dtypes)).astype(dtypes)
+        return pd.DataFrame({name: column[:self.size] for name, column in self.columns.items()}).astype(dtypes)
@@ -0,0 +1,262 @@
+"""
+Synthetic Titanic passenger generator for scale and stress testing.
+
+Learns the joint structure of ``train.csv`` and streams any number of
+realistic rows in the same schema, chunk by chunk, to CSV or Parquet:
+
+- Survived, Pclass, Sex, title, SibSp, Parch and Embarked are drawn together
+  from their empirical joint distribution, so combinations such as "3rd class
+  Master with 4 siblings" keep their real frequency and survival rate
+- Age is resampled from passengers with the same class, title and outcome,
+  and Fare from those with the same class, port, family size and outcome,
+  with kernel noise so values are not copies; sparse groups fall back to a
+  coarser group. Missing Age values keep their per-group rate
+- Ticket and Cabin are resampled within the class, given names within the
+  sex and title, and surnames from all passengers
+
+Each chunk is generated from its own seed derived from ``--seed`` and the
+chunk number, so the output is identical whatever the number of worker
+processes. Chunks are built and formatted in the workers; the main process
+only writes them in order, keeping a bounded number in flight.
+
+Usage:
+    python synthesize.py --rows 10000000 --output data/synthetic.parquet --workers 8
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['PassengerId', 'Survived', 'Pclass', 'Name', 'Sex', 'Age', 'SibSp', 'Parch',
+           'Ticket', 'Fare', 'Cabin', 'Embarked']
+# Columns drawn together from their empirical joint distribution
+DISCRETE_COLUMNS = ['Survived', 'Pclass', 'Sex', 'Title', 'SibSp', 'Parch', 'Embarked']
+# Groups with fewer observed values fall back to a coarser group
+MIN_GROUP_SIZE = 20
+NAME_PATTERN = re.compile(r'^(?P<surname>[^,]*),\s*(?:(?P<title>[A-Za-z]+)\.\s*)?(?P<given>.*)$')
+
+class Pool:
+    """Values to resample for each discrete combination, with per-combination missing rates and noise"""
+
+    def __init__(self, values, offsets, sizes, missing, bandwidth):
+        self.values = values
+        self.offsets = offsets
+        self.sizes = sizes
+        self.missing = missing
+        self.bandwidth = bandwidth
+
+    @classmethod
+    def build(cls, df, combinations, column, keys, numeric=False):
+        """Pick, for every combination, the finest group of ``keys`` with enough observed values"""
+        values = df[column]
+        groups = {}
+        pools = []
+        index = []
+        for combination in combinations.itertuples(index=False):
+            combination = combination._asdict()
+            for depth in range(len(keys), -1, -1):
+                key = tuple(combination[k] for k in keys[:depth])
+                if key not in groups:
+                    mask = np.ones(len(df), dtype=bool)
+                    for k, v in zip(keys[:depth], key):
+                        mask &= (df[k] == v).to_numpy() if v is not None else df[k].isna().to_numpy()
+                    groups[key] = len(pools)
+                    pools.append(values[mask])
+                group = pools[groups[key]]
+                if depth == 0 or group.notna().sum() >= MIN_GROUP_SIZE:
+                    break
+            index.append(groups[key])
+
+        observed = [pool.dropna().to_numpy() if numeric else pool.to_numpy(dtype=object) for pool in pools]
+        sizes = np.array([len(pool) for pool in observed])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        missing = np.array([pool.isna().mean() if numeric else 0.0 for pool in pools])
+        # Silverman's rule of thumb for the kernel noise
+        bandwidth = np.array([
+            1.06 * pool.std() * len(pool) ** -0.2 if numeric and len(pool) > 1 else 0.0
+            for pool in observed
+        ])
+        index = np.array(index)
+        return cls(
+            np.concatenate(observed) if len(observed) else np.empty(0),
+            offsets[index], sizes[index], missing[index], bandwidth[index],
+        )
+
+    def sample(self, rng, combination_index):
+        n = len(combination_index)
+        sizes = self.sizes[combination_index]
+        picks = self.offsets[combination_index] + (rng.random(n) * sizes).astype(np.int64)
+        return self.values[picks]
+
+    def sample_numeric(self, rng, combination_index):
+        values = self.sample(rng, combination_index).astype(np.float64)
+        values += rng.normal(0.0, 1.0, len(values)) * self.bandwidth[combination_index]
+        values[rng.random(len(values)) < self.missing[combination_index]] = np.nan
+        return values
+
+class PassengerSynthesizer:
+    """Joint distribution of the passenger columns learned from a training CSV"""
+
+    def __init__(self, df):
+        df = df.copy()
+        parts = df['Name'].str.extract(NAME_PATTERN)
+        df['Surname'] = parts['surname'].str.strip()
+        df['Title'] = parts['title']
+        df['Given'] = parts['given'].str.strip()
+        df['Family'] = np.minimum(df['SibSp'] + df['Parch'], 3)
+        df['LogFare'] = np.log1p(df['Fare'])
+        df = df.astype({column: object for column in ['Sex', 'Title', 'Embarked']})
+        df[['Title', 'Embarked']] = df[['Title', 'Embarked']].where(df[['Title', 'Embarked']].notna(), None)
+
+        counts = df.groupby(DISCRETE_COLUMNS, dropna=False).size()
+        self.combinations = counts.index.to_frame(index=False)
+        self.combinations = self.combinations.astype(object).where(self.combinations.notna(), None)
+        self.combinations['Family'] = np.minimum(self.combinations['SibSp'] + self.combinations['Parch'], 3)
+        self.probabilities = (counts / counts.sum()).to_numpy()
+
+        self.age = Pool.build(df, self.combinations, 'Age', ['Pclass', 'Title', 'Survived'], numeric=True)
+        self.log_fare = Pool.build(df, self.combinations, 'LogFare', ['Pclass', 'Embarked', 'Family', 'Survived'],
+                                   numeric=True)
+        self.ticket = Pool.build(df, self.combinations, 'Ticket', ['Pclass'])
+        self.cabin = Pool.build(df, self.combinations, 'Cabin', ['Pclass'])
+        self.given = Pool.build(df, self.combinations, 'Given', ['Sex', 'Title'])
+        self.surnames = df['Surname'].dropna().to_numpy(dtype=object)
+        # Kernel noise must not push values outside what was observed
+        self.age_range = (float(df['Age'].min()), float(df['Age'].max()))
+        self.log_fare_range = (float(df['LogFare'].min()), float(df['LogFare'].max()))
+
+        self.discrete = {
+            column: self.combinations[column].to_numpy(dtype=object) for column in DISCRETE_COLUMNS
+        }
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls(pd.read_csv(path))
+
+    def generate(self, rows, seed, chunk_index=0, first_id=1):
+        """One chunk of ``rows`` passengers, reproducible from ``seed`` and ``chunk_index``"""
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+        index = rng.choice(len(self.probabilities), size=rows, p=self.probabilities)
+        discrete = {column: values[index] for column, values in self.discrete.items()}
+
+        age = self.age.sample_numeric(rng, index)
+        age = np.round(np.clip(age, *self.age_range), 2)
+        fare = np.round(np.expm1(np.clip(self.log_fare.sample_numeric(rng, index), *self.log_fare_range)), 4)
+
+        surname = pd.Series(self.surnames[rng.integers(0, len(self.surnames), rows)])
+        title = pd.Series(discrete['Title'])
+        given = pd.Series(self.given.sample(rng, index)).fillna('')
+        name = surname + ', ' + (title + '. ').fillna('') + given
+
+        return pd.DataFrame({
+            'PassengerId': np.arange(first_id, first_id + rows, dtype=np.int64),
+            'Survived': discrete['Survived'].astype(np.int8),
+            'Pclass': discrete['Pclass'].astype(np.int8),
+            'Name': name.to_numpy(dtype=object),
+            'Sex': discrete['Sex'],
+            'Age': age,
+            'SibSp': discrete['SibSp'].astype(np.int8),
+            'Parch': discrete['Parch'].astype(np.int8),
+            'Ticket': self.ticket.sample(rng, index),
+            'Fare': fare,
+            'Cabin': self.cabin.sample(rng, index),
+            'Embarked': discrete['Embarked'],
+        }, columns=COLUMNS)
+
+def parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('PassengerId', pa.int64()), ('Survived', pa.int8()), ('Pclass', pa.int8()), ('Name', pa.string()),
+        ('Sex', pa.string()), ('Age', pa.float64()), ('SibSp', pa.int8()), ('Parch', pa.int8()),
+        ('Ticket', pa.string()), ('Fare', pa.float64()), ('Cabin', pa.string()), ('Embarked', pa.string()),
+    ])
+
+# Worker state, set once per process by _init_worker
+_synthesizer = None
+
+def _init_worker(synthesizer):
+    global _synthesizer
+    _synthesizer = synthesizer
+
+def _build_chunk(task):
+    """Generate and serialize one chunk: CSV text, or an Arrow table for Parquet"""
+    chunk_index, rows, first_id, seed, output_format = task
+    df = _synthesizer.generate(rows, seed, chunk_index, first_id)
+    if output_format == 'parquet':
+        import pyarrow as pa
+
+        return pa.Table.from_pandas(df, schema=parquet_schema(), preserve_index=False)
+    return df.to_csv(index=False, header=chunk_index == 0, lineterminator='\n')
+
+def chunk_tasks(rows, chunk_rows, seed, output_format):
+    for chunk_index, start in enumerate(range(0, rows, chunk_rows)):
+        yield chunk_index, min(chunk_rows, rows - start), start + 1, seed, output_format
+
+def iter_chunks(synthesizer, tasks, workers):
+    """Serialized chunks in order, with at most ``2 * workers`` being generated at once"""
+    if workers <= 1:
+        _init_worker(synthesizer)
+        for task in tasks:
+            yield _build_chunk(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(synthesizer,)) as pool:
+        pending = []
+        for task in tasks:
+            pending.append(pool.submit(_build_chunk, task))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+def synthesize(source, output, rows, seed=42, workers=1, chunk_rows=250_000):
+    """Write ``rows`` synthetic passengers learned from ``source`` to a .csv or .parquet file"""
+    output_format = 'parquet' if output.endswith('.parquet') else 'csv'
+    synthesizer = PassengerSynthesizer.from_csv(source)
+    chunks = iter_chunks(synthesizer, chunk_tasks(rows, chunk_rows, seed, output_format), workers)
+
+    tmp_output = output + '.tmp'
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+
+        with pq.ParquetWriter(tmp_output, parquet_schema()) as writer:
+            for table in chunks:
+                writer.write_table(table)
+    else:
+        with open(tmp_output, 'w', newline='') as f:
+            for text in chunks:
+                f.write(text)
+    os.replace(tmp_output, output)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--output', required=True, help='Output file (.csv or .parquet)')
+    parser.add_argument('--source', default='data/train.csv')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-rows', type=int, default=250_000)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"Source dataset not found: {args.source}")
+        print("Please run: python download_data.py")
+        return 1
+
+    print(f"Generating {args.rows} synthetic passengers from {args.source}...")
+    started = time.perf_counter()
+    synthesize(args.source, args.output, args.rows, args.seed, args.workers, args.chunk_rows)
+    elapsed = time.perf_counter() - started
+    print(f"Synthetic dataset saved to: {args.output}")
+    print(f"{args.rows / elapsed:,.0f} rows/s, {os.path.getsize(args.output) / 2**20:.1f} MiB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
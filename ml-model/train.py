@@ -3,20 +3,68 @@ Titanic Survival Prediction Model Training Script
 This script trains a Random Forest classifier to predict passenger survival.
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import accuracy_score, classification_report
+from sklearn.neighbors import KDTree
 import pickle
 import os
+import shutil
 import matplotlib.pyplot as plt
 import seaborn as sns
+from compact_forest import export_and_validate
+from evaluation import REPORT_FILE, evaluate_model, print_summary, write_report
+from streaming import QuantileSketch, Reservoir, iter_chunks
 
-def load_data():
-    """Load Titanic dataset from CSV file"""
-    train_file = 'data/train.csv'
+# Compact dtypes for the columns training reads; Ticket and Cabin are never used
+CSV_DTYPES = {
+    'PassengerId': 'int32',
+    'Survived': 'int8',
+    'Pclass': 'int8',
+    'Name': 'object',
+    'Sex': 'category',
+    'Age': 'float32',
+    'SibSp': 'int8',
+    'Parch': 'int8',
+    'Fare': 'float32',
+    'Embarked': 'category',
+}
+
+def cache_path(train_file):
+    """Columnar cache written beside the CSV, e.g. data/train.feather"""
+    return os.path.splitext(train_file)[0] + '.feather'
+
+def read_cache(train_file):
+    """Load the Feather cache if it is newer than the CSV and has the expected dtypes"""
+    path = cache_path(train_file)
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(train_file):
+        return None
+    try:
+        df = pd.read_feather(path)
+    except (ImportError, OSError, ValueError) as e:
+        print(f"Ignoring data cache {path}: {e}")
+        return None
+    if {column: str(dtype) for column, dtype in df.dtypes.items()} != CSV_DTYPES:
+        return None
+    return df
+
+def write_cache(df, train_file):
+    """Write the Feather cache; skipped when pyarrow is not installed"""
+    path = cache_path(train_file)
+    tmp_path = path + '.tmp'
+    try:
+        df.to_feather(tmp_path)
+    except ImportError:
+        return
+    os.replace(tmp_path, path)
+    print(f"Data cache written to: {path}")
+
+def load_data(train_file='data/train.csv', use_cache=True):
+    """Load Titanic dataset from CSV file (or its columnar cache) with compact dtypes"""
     
     # Check if data file exists
     if not os.path.exists(train_file):
@@ -25,13 +73,25 @@ def load_data():
         print("Or manually download from Kaggle and place train.csv in data/ directory")
         raise FileNotFoundError(f"Dataset file not found: {train_file}")
     
-    # Load the actual Titanic dataset
-    print(f"Loading Titanic dataset from {train_file}...")
-    df = pd.read_csv(train_file)
+    if train_file.endswith('.parquet'):
+        print(f"Loading Titanic dataset from {train_file}...")
+        df = pd.read_parquet(train_file, columns=list(CSV_DTYPES)).astype(CSV_DTYPES)
+        use_cache = False
+    else:
+        df = read_cache(train_file) if use_cache else None
+    if df is not None:
+        print(f"Loading Titanic dataset from {cache_path(train_file)}...")
+    else:
+        # Load the actual Titanic dataset
+        print(f"Loading Titanic dataset from {train_file}...")
+        df = pd.read_csv(train_file, usecols=list(CSV_DTYPES), dtype=CSV_DTYPES)
+        if use_cache:
+            write_cache(df, train_file)
     
     print(f"Dataset loaded successfully!")
     print(f"Shape: {df.shape}")
     print(f"Columns: {list(df.columns)}")
+    print(f"Memory: {df.memory_usage(deep=True).sum() / 2**20:.1f} MiB")
     print(f"Survival rate: {df['Survived'].mean():.3f}")
     
     return df
@@ -51,7 +111,7 @@ def explore_data(df):
     print(f"\nSurvival Statistics:")
     print(f"Overall survival rate: {df['Survived'].mean():.3f}")
     print(f"Survival by sex:")
-    print(df.groupby('Sex')['Survived'].agg(['count', 'sum', 'mean']))
+    print(df.groupby('Sex', observed=True)['Survived'].agg(['count', 'sum', 'mean']))
     print(f"Survival by class:")
     print(df.groupby('Pclass')['Survived'].agg(['count', 'sum', 'mean']))
     
@@ -103,68 +163,124 @@ def explore_data(df):
     
     print(f"\nExploration plots saved to: data/titanic_exploration.png")
 
-def preprocess_data(df):
-    """Preprocess the dataset for training"""
-    # Create a copy to avoid modifying original data
-    df_processed = df.copy()
+# Rare titles are grouped; French forms map to their English equivalent
+TITLE_GROUPS = {
+    **dict.fromkeys(['Lady', 'Countess', 'Capt', 'Col', 'Don', 'Dr', 'Major', 'Rev', 'Sir', 'Jonkheer', 'Dona'], 'Rare'),
+    'Mlle': 'Miss',
+    'Ms': 'Miss',
+    'Mme': 'Mrs',
+}
+
+FARE_GROUP_LABELS = ['Low', 'Medium', 'High', 'VeryHigh']
+
+def fare_group_edges(quantile, minimum, maximum):
+    """Fare group edges as ``pd.qcut(q=4)`` picks them, or ``pd.cut(bins=4)`` when quartiles coincide"""
+    edges = np.unique([quantile(q) for q in (0, 0.25, 0.5, 0.75, 1)])
+    if len(edges) == len(FARE_GROUP_LABELS) + 1:
+        return edges
+    # Equal-width bins, with the lowest edge moved down by 0.1% of the range as pd.cut does
+    if minimum == maximum:
+        minimum, maximum = minimum - 0.001 * abs(minimum), maximum + 0.001 * abs(maximum)
+    edges = np.linspace(minimum, maximum, len(FARE_GROUP_LABELS) + 1)
+    edges[0] -= (maximum - minimum) * 0.001
+    return edges
+
+def preprocessing_stats(df):
+    """Imputation values and fare group edges of a dataset held in memory"""
+    fare_median = df['Fare'].median()
+    fare = df['Fare'].fillna(fare_median)
+    return {
+        'age_median': float(df['Age'].median()),
+        'fare_median': float(fare_median),
+        'fare_edges': fare_group_edges(fare.quantile, fare.min(), fare.max()),
+    }
+
+def preprocess_data(df, stats=None):
+    """Preprocess the dataset for training
+    
+    ``stats`` are the imputation values and fare group edges; by default they
+    are computed from ``df`` (streaming training computes them over the whole
+    input and passes them in).
+    
+    Returns a new frame that shares the untouched columns with ``df``; only the
+    imputed and engineered columns are allocated, so ``df`` keeps its original
+    (unimputed) values without a full copy.
+    """
+    if stats is None:
+        stats = preprocessing_stats(df)
     
     # Handle missing values
-    df_processed['Age'].fillna(df_processed['Age'].median(), inplace=True)
-    df_processed['Fare'].fillna(df_processed['Fare'].median(), inplace=True)
-    df_processed['Embarked'].fillna('S', inplace=True)
+    embarked = df['Embarked']
+    if isinstance(embarked.dtype, pd.CategoricalDtype) and 'S' not in embarked.cat.categories:
+        embarked = embarked.cat.add_categories('S')
+    columns = {
+        'Age': df['Age'].fillna(stats['age_median']),
+        'Fare': df['Fare'].fillna(stats['fare_median']),
+        'Embarked': embarked.fillna('S'),
+    }
     
     # Feature engineering
-    df_processed['FamilySize'] = df_processed['SibSp'] + df_processed['Parch'] + 1
-    df_processed['IsAlone'] = (df_processed['FamilySize'] == 1).astype(int)
+    family_size = df['SibSp'] + df['Parch'] + 1
+    columns['FamilySize'] = family_size
+    columns['IsAlone'] = (family_size == 1).astype(np.int8)
     
-    # Extract title from name
-    df_processed['Title'] = df_processed['Name'].str.extract(' ([A-Za-z]+)\.', expand=False)
-    df_processed['Title'] = df_processed['Title'].replace(['Lady', 'Countess','Capt', 'Col',
-                                                         'Don', 'Dr', 'Major', 'Rev', 'Sir', 'Jonkheer', 'Dona'], 'Rare')
-    df_processed['Title'] = df_processed['Title'].replace('Mlle', 'Miss')
-    df_processed['Title'] = df_processed['Title'].replace('Ms', 'Miss')
-    df_processed['Title'] = df_processed['Title'].replace('Mme', 'Mrs')
+    # Extract title from name; grouping is applied to the distinct titles only
+    title = df['Name'].str.extract(r' ([A-Za-z]+)\.', expand=False).astype('category')
+    columns['Title'] = title.map({t: TITLE_GROUPS.get(t, t) for t in title.cat.categories}).astype('category')
     
     # Age groups
-    df_processed['AgeGroup'] = pd.cut(df_processed['Age'], bins=[0, 12, 18, 35, 60, 100], 
-                                     labels=['Child', 'Teen', 'Adult', 'Middle', 'Senior'])
+    columns['AgeGroup'] = pd.cut(columns['Age'], bins=[0, 12, 18, 35, 60, 100], 
+                                 labels=['Child', 'Teen', 'Adult', 'Middle', 'Senior'])
     
-    # Fare groups - handle duplicate values
-    try:
-        df_processed['FareGroup'] = pd.qcut(df_processed['Fare'], q=4, labels=['Low', 'Medium', 'High', 'VeryHigh'], duplicates='drop')
-    except ValueError:
-        # If qcut fails due to duplicates, use cut instead
-        df_processed['FareGroup'] = pd.cut(df_processed['Fare'], bins=4, labels=['Low', 'Medium', 'High', 'VeryHigh'])
+    # Fare groups - quartiles, or equal widths when quartiles coincide
+    columns['FareGroup'] = pd.cut(columns['Fare'], bins=stats['fare_edges'], labels=FARE_GROUP_LABELS,
+                                  include_lowest=True)
     
-    return df_processed
+    return replace_columns(df, columns)
+
+def replace_columns(df, columns):
+    """A frame with ``df``'s columns, some replaced or added, without copying the rest"""
+    data = {name: df[name] for name in df.columns}
+    data.update(columns)
+    return pd.DataFrame(data, copy=False)
+
+def label_encode(series):
+    """Fit a LabelEncoder on a column and return the codes with the encoder
+    
+    Equivalent to ``LabelEncoder().fit_transform``, but the encoder is fitted on
+    the distinct values only and the rows are encoded through category codes
+    instead of sorting every value. The codes use the smallest integer dtype
+    that holds every class. Like ``fit_transform``, missing values are refused
+    rather than encoded (category code -1 would train as a class of its own).
+    """
+    series = series.astype('category')
+    encoder = LabelEncoder().fit(np.asarray(series.cat.remove_unused_categories().cat.categories, dtype=object))
+    codes = series.cat.set_categories(encoder.classes_).cat.codes
+    missing = int((codes == -1).sum())
+    if missing:
+        raise ValueError(f"{series.name}: {missing} rows have no value to encode")
+    dtype = next(t for t in (np.int8, np.int16, np.int32) if len(encoder.classes_) <= np.iinfo(t).max + 1)
+    return codes.astype(dtype), encoder
+
+# Categorical columns to label encode: (column, encoder key)
+ENCODED_COLUMNS = [
+    ('Sex', 'sex'),
+    ('Embarked', 'embarked'),
+    ('Title', 'title'),
+    ('AgeGroup', 'age_group'),
+    ('FareGroup', 'fare_group'),
+]
 
 def encode_categorical_features(df):
     """Encode categorical features for machine learning"""
-    df_encoded = df.copy()
-    
     # Label encode categorical variables
-    le_sex = LabelEncoder()
-    le_embarked = LabelEncoder()
-    le_title = LabelEncoder()
-    le_age_group = LabelEncoder()
-    le_fare_group = LabelEncoder()
-    
-    df_encoded['Sex'] = le_sex.fit_transform(df_encoded['Sex'])
-    df_encoded['Embarked'] = le_embarked.fit_transform(df_encoded['Embarked'])
-    df_encoded['Title'] = le_title.fit_transform(df_encoded['Title'])
-    df_encoded['AgeGroup'] = le_age_group.fit_transform(df_encoded['AgeGroup'])
-    df_encoded['FareGroup'] = le_fare_group.fit_transform(df_encoded['FareGroup'])
-    
-    # Save encoders for later use
-    encoders = {
-        'sex': le_sex,
-        'embarked': le_embarked,
-        'title': le_title,
-        'age_group': le_age_group,
-        'fare_group': le_fare_group
-    }
+    columns = {}
+    encoders = {}
+    for column, key in ENCODED_COLUMNS:
+        columns[column], encoders[key] = label_encode(df[column])
     
-    return df_encoded, encoders
+    # Encoders are saved for later use
+    return replace_columns(df, columns), encoders
 
 def train_model(X_train, y_train, X_test, y_test):
     """Train Random Forest model"""
@@ -192,7 +308,191 @@ def train_model(X_train, y_train, X_test, y_test):
     
     return rf_model
 
-def save_model_and_encoders(model, encoders, feature_columns):
+def build_similarity_index(df, df_encoded, feature_columns):
+    """Build a KD-tree over the encoded features for nearest-passenger lookups"""
+    X = df_encoded[feature_columns].to_numpy(dtype=np.float64)
+    
+    # Standardize so that no single feature (e.g. Fare) dominates the distance
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    tree = KDTree((X - mean) / scale, leaf_size=16)
+    
+    # Keep the original (unimputed) values to show alongside each neighbour
+    columns = ['PassengerId', 'Name', 'Pclass', 'Sex', 'Age', 'SibSp', 'Parch', 'Fare', 'Embarked', 'Survived']
+    # float32 columns are rounded back to the CSV's precision (e.g. 71.2833, not 71.28330230712891)
+    shown = df[columns].astype({'Age': np.float64, 'Fare': np.float64}).round({'Age': 2, 'Fare': 4})
+    passengers = shown.astype(object).where(shown.notna(), None).to_dict('records')
+    
+    return {
+        'tree': tree,
+        'mean': mean,
+        'scale': scale,
+        'feature_columns': list(feature_columns),
+        'passengers': passengers
+    }
+
+# Cohort cube dimensions: (column in the processed data, name used by the API)
+COHORT_DIMENSIONS = [
+    ('Sex', 'sex'),
+    ('Pclass', 'pclass'),
+    ('AgeGroup', 'age_group'),
+    ('FareGroup', 'fare_group'),
+    ('Embarked', 'embarked'),
+    ('Title', 'title'),
+]
+
+def build_cohort_cube(df_processed):
+    """Count passengers and survivors for every combination of the cohort dimensions"""
+    labels = {}
+    codes = []
+    for column, name in COHORT_DIMENSIONS:
+        series = df_processed[column]
+        # Keep the natural order of binned columns (Child, Teen, ...); sort the rest
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = [str(label) for label in series.cat.categories]
+        else:
+            categories = sorted(str(label) for label in series.dropna().unique())
+        if series.isna().any():
+            categories.append('Unknown')
+        values = series.astype(object).where(series.notna(), 'Unknown').astype(str)
+        labels[name] = categories
+        codes.append(pd.Categorical(values, categories=categories).codes)
+    
+    shape = tuple(len(labels[name]) for _, name in COHORT_DIMENSIONS)
+    flat = np.ravel_multi_index(codes, shape)
+    size = int(np.prod(shape))
+    counts = np.bincount(flat, minlength=size).reshape(shape)
+    survivors = np.bincount(flat, weights=df_processed['Survived'].to_numpy(), minlength=size).reshape(shape)
+    
+    return {
+        'dimensions': [name for _, name in COHORT_DIMENSIONS],
+        'labels': labels,
+        'counts': counts.astype(np.int64),
+        'survivors': survivors.astype(np.int64)
+    }
+
+def merge_cohort_cubes(a, b):
+    """Add two cohort cubes whose dimensions may have different labels"""
+    labels = {}
+    for name in a['dimensions']:
+        known_a = [label for label in a['labels'][name] if label != 'Unknown']
+        known_b = [label for label in b['labels'][name] if label != 'Unknown']
+        # Binned dimensions always list every category; others are sorted
+        merged = known_a if known_a == known_b else sorted(set(known_a) | set(known_b))
+        if 'Unknown' in a['labels'][name] or 'Unknown' in b['labels'][name]:
+            merged.append('Unknown')
+        labels[name] = merged
+    
+    shape = tuple(len(labels[name]) for name in a['dimensions'])
+    counts = np.zeros(shape, dtype=np.int64)
+    survivors = np.zeros(shape, dtype=np.int64)
+    for cube in (a, b):
+        index = np.ix_(*[[labels[name].index(label) for label in cube['labels'][name]] for name in a['dimensions']])
+        counts[index] += cube['counts']
+        survivors[index] += cube['survivors']
+    return {'dimensions': list(a['dimensions']), 'labels': labels, 'counts': counts, 'survivors': survivors}
+
+# Age and Fare are binned at these quantiles of the training data for the backend's drift monitor
+DRIFT_QUANTILES = np.linspace(0.01, 0.99, 99)
+# Categorical inputs the drift monitor compares: cohort dimension -> label type
+DRIFT_CATEGORICAL = {'pclass': int, 'sex': str, 'embarked': str, 'title': str}
+
+def numeric_reference(sketch, rows):
+    """Histogram of one column over its percentiles, with missing values counted apart
+
+    Age and Fare are read as float32, so each edge is moved down halfway to the
+    next smaller float32: a served float64 value then falls in the bin its
+    float32 rounding would, and a fare of 8.05 is binned like the 8.05s of the
+    training data.
+    """
+    if not sketch.count:
+        return {'edges': np.empty(0), 'counts': np.zeros(1, dtype=np.int64), 'missing': int(rows)}
+    edges = np.unique(np.array([sketch.quantile(q) for q in DRIFT_QUANTILES], dtype=np.float32))
+    edges = (edges.astype(np.float64) + np.nextafter(edges, np.float32(-np.inf)).astype(np.float64)) / 2
+    return {'edges': edges, 'counts': sketch.histogram(edges), 'missing': int(rows - sketch.count)}
+
+def numeric_sketches(df):
+    """Exact Age and Fare sketches of a dataset held in memory"""
+    sketches = {}
+    for column, field in [('Age', 'age'), ('Fare', 'fare')]:
+        sketches[field] = QuantileSketch()
+        sketches[field].update(df[column].to_numpy())
+    return sketches
+
+def build_drift_reference(numeric, cohort_cube):
+    """Reference distributions of the inputs, for the backend's drift monitor
+
+    ``numeric`` holds the histograms of Age and Fare; class, sex, port and
+    title counts are the cohort cube's marginals. A name without a title is
+    served as "Mr", so the cube's "Unknown" titles are counted as "Mr" too.
+    """
+    categorical = {}
+    for name, label_type in DRIFT_CATEGORICAL.items():
+        axis = cohort_cube['dimensions'].index(name)
+        other_axes = tuple(i for i in range(cohort_cube['counts'].ndim) if i != axis)
+        counts = dict(zip(cohort_cube['labels'][name], cohort_cube['counts'].sum(axis=other_axes).tolist()))
+        unknown = counts.pop('Unknown', 0)
+        if unknown and name == 'title':
+            counts['Mr'] = counts.get('Mr', 0) + unknown
+        categorical[name] = {
+            'labels': [label_type(label) for label in counts],
+            'counts': np.array(list(counts.values()), dtype=np.int64),
+        }
+    return {
+        'rows': int(cohort_cube['counts'].sum()),
+        'numeric': numeric,
+        'categorical': categorical,
+    }
+
+def streaming_pass(train_file, sample_rows, chunk_rows):
+    """One pass over the input: preprocessing statistics from sketches, a uniform sample of rows,
+    and the Age and Fare histograms of the drift reference"""
+    if not os.path.exists(train_file):
+        raise FileNotFoundError(f"Dataset file not found: {train_file}")
+    
+    print(f"Streaming {train_file} in chunks of {chunk_rows} rows...")
+    age, fare = QuantileSketch(), QuantileSketch()
+    reservoir = Reservoir(sample_rows)
+    rows = survivors = missing_fares = 0
+    for chunk in iter_chunks(train_file, list(CSV_DTYPES), CSV_DTYPES, chunk_rows):
+        age.update(chunk['Age'].to_numpy())
+        fare.update(chunk['Fare'].to_numpy())
+        missing_fares += int(chunk['Fare'].isna().sum())
+        reservoir.update(chunk)
+        rows += len(chunk)
+        survivors += int(chunk['Survived'].sum())
+    
+    # The drift reference counts missing fares as missing, so take it before imputing
+    drift_numeric = {'age': numeric_reference(age, rows), 'fare': numeric_reference(fare, rows)}
+    
+    # Imputed fares take part in the fare groups, as they do in memory
+    fare_median = fare.quantile(0.5)
+    fare.add(fare_median, missing_fares)
+    stats = {
+        'age_median': age.quantile(0.5),
+        'fare_median': fare_median,
+        'fare_edges': fare_group_edges(fare.quantile, fare.min, fare.max),
+    }
+    
+    print(f"Rows: {rows}")
+    print(f"Survival rate: {survivors / max(rows, 1):.3f}")
+    print(f"Age median: {stats['age_median']:.2f}, Fare median: {stats['fare_median']:.4f}"
+          f"{'' if age.exact and fare.exact else ' (approximate)'}")
+    print(f"Fare group edges: {np.round(stats['fare_edges'], 4).tolist()}")
+    print(f"Training sample: {reservoir.size} rows")
+    return stats, reservoir.to_frame(CSV_DTYPES), drift_numeric
+
+def streaming_cohort_cube(train_file, stats, chunk_rows):
+    """Exact cohort counts over the whole input, one chunk at a time"""
+    cube = None
+    for chunk in iter_chunks(train_file, list(CSV_DTYPES), CSV_DTYPES, chunk_rows):
+        chunk_cube = build_cohort_cube(preprocess_data(chunk, stats))
+        cube = chunk_cube if cube is None else merge_cohort_cubes(cube, chunk_cube)
+    return cube
+
+def save_model_and_encoders(model, encoders, feature_columns, similarity_index=None, cohort_cube=None,
+                            drift_reference=None):
     """Save the trained model and encoders"""
     # Create models directory if it doesn't exist
     os.makedirs('models', exist_ok=True)
@@ -209,18 +509,87 @@ def save_model_and_encoders(model, encoders, feature_columns):
     with open('models/feature_columns.pkl', 'wb') as f:
         pickle.dump(feature_columns, f)
     
+    # Save the nearest-passenger index
+    if similarity_index is not None:
+        with open('models/similarity_index.pkl', 'wb') as f:
+            pickle.dump(similarity_index, f)
+    
+    # Save the cohort statistics cube
+    if cohort_cube is not None:
+        with open('models/cohort_cube.pkl', 'wb') as f:
+            pickle.dump(cohort_cube, f)
+    
+    # Save the input distributions the drift monitor compares against
+    if drift_reference is not None:
+        with open('models/drift_reference.pkl', 'wb') as f:
+            pickle.dump(drift_reference, f)
+    
     print("Model and encoders saved successfully!")
 
+# Artifacts a model version needs to be served next to the current model
+VERSION_ARTIFACTS = ['titanic_model.pkl', 'encoders.pkl', 'feature_columns.pkl', 'evaluation_report.json']
+
+def save_version(name, include_compact=True):
+    """Copy the saved model into models/versions/<name>/ for A/B or shadow serving"""
+    if not name or os.sep in name or name.startswith('.') or name == 'current':
+        raise ValueError(f"Invalid model version name: {name!r}")
+    path = os.path.join('models', 'versions', name)
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for artifact in VERSION_ARTIFACTS + (['titanic_model_compact'] if include_compact else []):
+        source = os.path.join('models', artifact)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(tmp_path, artifact))
+        elif os.path.exists(source):
+            shutil.copy2(source, tmp_path)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+# The nearest-passenger index of a streaming run covers at most this many sampled passengers
+SIMILARITY_INDEX_ROWS = 50_000
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the Titanic survival model")
+    parser.add_argument('--data', default='data/train.csv', help="Training data (.csv or .parquet)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Out-of-core mode for inputs larger than memory: one chunked pass computes the "
+                             "preprocessing statistics and a uniform sample to train on")
+    parser.add_argument('--sample-rows', type=int, default=500_000,
+                        help="Rows in the training sample (--streaming)")
+    parser.add_argument('--chunk-rows', type=int, default=100_000,
+                        help="Rows read at a time (--streaming)")
+    parser.add_argument('--version',
+                        help="Also keep a copy of the model as models/versions/VERSION, so the backend can "
+                             "serve it as a candidate or shadow next to the current model")
+    parser.add_argument('--eval-repeats', type=int, default=10,
+                        help="Shuffles per feature for permutation importance")
+    parser.add_argument('--bootstrap', type=int, default=1000,
+                        help="Bootstrap resamples of the test set for the metric confidence intervals")
+    parser.add_argument('--eval-jobs', type=int, default=-1,
+                        help="Threads for the evaluation (-1: all cores)")
+    parser.add_argument('--no-eval', action='store_true',
+                        help="Skip the evaluation report")
+    return parser.parse_args()
+
 def main():
     """Main training pipeline"""
-    print("Loading Titanic dataset...")
-    df = load_data()
-    
-    print("Exploring dataset...")
-    explore_data(df)
+    args = parse_args()
+    
+    if args.streaming:
+        print("Computing statistics and sampling the dataset...")
+        stats, df, drift_numeric = streaming_pass(args.data, args.sample_rows, args.chunk_rows)
+    else:
+        print("Loading Titanic dataset...")
+        df = load_data(args.data)
+        stats = None
+        
+        print("Exploring dataset...")
+        explore_data(df)
     
     print("Preprocessing data...")
-    df_processed = preprocess_data(df)
+    df_processed = preprocess_data(df, stats)
     
     print("Encoding categorical features...")
     df_encoded, encoders = encode_categorical_features(df_processed)
@@ -238,13 +607,50 @@ def main():
     print("Training Random Forest model...")
     model = train_model(X_train, y_train, X_test, y_test)
     
+    if not args.no_eval:
+        print("Evaluating model...")
+        report = evaluate_model(model, X_test, y_test, args.eval_repeats, args.bootstrap, n_jobs=args.eval_jobs)
+        print_summary(report)
+    
+    print("Building nearest-passenger index...")
+    if args.streaming:
+        similarity_index = build_similarity_index(df.iloc[:SIMILARITY_INDEX_ROWS],
+                                                  df_encoded.iloc[:SIMILARITY_INDEX_ROWS], feature_columns)
+    else:
+        similarity_index = build_similarity_index(df, df_encoded, feature_columns)
+    
+    print("Building cohort statistics cube...")
+    if args.streaming:
+        cohort_cube = streaming_cohort_cube(args.data, stats, args.chunk_rows)
+    else:
+        cohort_cube = build_cohort_cube(df_processed)
+    
+    print("Building drift reference...")
+    if not args.streaming:
+        drift_numeric = {field: numeric_reference(sketch, len(df)) for field, sketch in numeric_sketches(df).items()}
+    drift_reference = build_drift_reference(drift_numeric, cohort_cube)
+    
     print("Saving model and encoders...")
-    save_model_and_encoders(model, encoders, feature_columns)
+    save_model_and_encoders(model, encoders, feature_columns, similarity_index, cohort_cube, drift_reference)
+    if not args.no_eval:
+        write_report(report)
+    
+    print("Exporting compact forest...")
+    compact_saved = export_and_validate(model, X)
     
     print("\nTraining completed successfully!")
     print("Model saved to: models/titanic_model.pkl")
     print("Encoders saved to: models/encoders.pkl")
     print("Feature columns saved to: models/feature_columns.pkl")
+    print("Similarity index saved to: models/similarity_index.pkl")
+    print("Cohort cube saved to: models/cohort_cube.pkl")
+    print("Drift reference saved to: models/drift_reference.pkl")
+    if not args.no_eval:
+        print(f"Evaluation report saved to: {REPORT_FILE}")
+    if compact_saved:
+        print("Compact forest saved to: models/titanic_model_compact/")
+    if args.version:
+        print(f"Model version saved to: {save_version(args.version, compact_saved)}/")
 
 if __name__ == "__main__":
     main()